@@ -1,13 +1,44 @@
 import asyncio
 import logging
 import os
+import signal
 from aiogram import Bot, Dispatcher
 from aiogram.client.default import DefaultBotProperties
 from aiogram.enums import ParseMode
+from aiogram.fsm.storage.base import BaseStorage
+from aiogram.fsm.storage.memory import MemoryStorage
 
-from config import TELEGRAM_BOT_TOKEN, DEBUG
-from handlers import start, help, menu, edit, publish, create, common, stats, language
+from config import (
+    TELEGRAM_BOT_TOKEN,
+    DEBUG,
+    BOT_MODE,
+    BOT_WORKERS,
+    STORAGE_BACKEND,
+    REDIS_URL,
+    REDIS_PREFIX,
+)
+from handlers import (
+    start,
+    help,
+    menu,
+    edit,
+    publish,
+    schedule,
+    create,
+    common,
+    stats,
+    language,
+)
 from handlers.publish import init_channel_service
+from middlewares.preload import UserPreloadMiddleware
+from middlewares.sharding import ShardingMiddleware
+from services.ai_service import GeminiService
+from services.language_service import LanguageService
+from services.saved_channels import SavedChannelsService
+from services.scheduler import PublishScheduler
+from services.storage import SQLiteStorage, RedisConnection
+from utils.supervisor import Supervisor, ShardWorker
+from utils.webhook import run_webhook
 
 log_level = logging.DEBUG if DEBUG else logging.INFO
 logging.basicConfig(
@@ -16,18 +47,27 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
-async def main():
-    """Главная функция запуска бота"""
-    if not os.path.exists("data"):
-        os.makedirs("data")
-    bot = Bot(
+def create_fsm_storage() -> BaseStorage:
+    """Хранилище состояний FSM: в Redis для нескольких процессов, иначе в памяти"""
+    if STORAGE_BACKEND == "redis":
+        from aiogram.fsm.storage.redis import DefaultKeyBuilder, RedisStorage
+
+        return RedisStorage.from_url(
+            REDIS_URL, key_builder=DefaultKeyBuilder(prefix=f"{REDIS_PREFIX}:fsm")
+        )
+    return MemoryStorage()
+
+
+def create_bot() -> Bot:
+    return Bot(
         token=TELEGRAM_BOT_TOKEN,
         default=DefaultBotProperties(parse_mode=ParseMode.HTML),
     )
 
-    dp = Dispatcher()
 
-    init_channel_service(bot)
+def create_dispatcher() -> Dispatcher:
+    """Создает диспетчер со всеми обработчиками"""
+    dp = Dispatcher(storage=create_fsm_storage())
 
     dp.include_router(start.router)
     dp.include_router(language.router)
@@ -37,18 +77,107 @@ async def main():
     dp.include_router(menu.router)
     dp.include_router(edit.router)
     dp.include_router(publish.router)
+    dp.include_router(schedule.router)
     dp.include_router(common.router)
 
+    return dp
+
+
+async def start_services(scheduler_timer: bool = True):
+    """Загружает данные сервисов перед обработкой обновлений.
+
+    scheduler_timer - публиковать отложенные посты из этого процесса;
+    из нескольких процессов-обработчиков это делает только первый.
+    """
+    await GeminiService().start()
+    await LanguageService().start()
+    await SavedChannelsService().start()
+    await PublishScheduler().start(timer=scheduler_timer)
+
+
+async def close_storage():
+    """Закрывает подключение к общему хранилищу"""
+    if STORAGE_BACKEND == "redis":
+        await RedisConnection().close()
+    else:
+        await SQLiteStorage().close()
+
+
+async def close_services():
+    """Сохраняет данные сервисов и закрывает хранилища"""
+    await PublishScheduler().close()
+    await GeminiService().close()
+    await LanguageService().close()
+    await SavedChannelsService().close()
+    await close_storage()
+
+
+async def prepare_storage():
+    """Создает схему хранилища и переносит данные из JSON до запуска
+    процессов-обработчиков, чтобы они не делали этого наперегонки"""
+    await GeminiService().rate_limiter.start()
+    await LanguageService().start()
+    await SavedChannelsService().start()
+    await PublishScheduler().store.start()
+    await close_storage()
+
+
+async def run_worker(index: int, inbox, status):
+    """Процесс-обработчик: обрабатывает обновления, полученные от супервизора"""
+    bot = create_bot()
+    dp = create_dispatcher()
+    dp.update.outer_middleware(UserPreloadMiddleware())
+    init_channel_service(bot)
+    await start_services(scheduler_timer=index == 0)
+
     try:
-        logger.info("🚀 Запуск AI-редактора Telegram-постов...")
+        await ShardWorker(index, dp, bot, inbox, status).run()
+    finally:
+        await close_services()
+        await bot.session.close()
+
+
+def worker_main(index: int, inbox, status):
+    """Точка входа процесса-обработчика"""
+    # Остановкой обработчиков управляет супервизор
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    asyncio.run(run_worker(index, inbox, status))
 
-        await bot.delete_webhook(drop_pending_updates=True)
 
-        await dp.start_polling(bot)
+async def main():
+    """Главная функция запуска бота"""
+    if not os.path.exists("data"):
+        os.makedirs("data")
+    bot = create_bot()
+    dp = create_dispatcher()
+    supervisor = None
+
+    if BOT_WORKERS > 1:
+        await prepare_storage()
+        supervisor = Supervisor(BOT_WORKERS, worker_main)
+        dp.update.outer_middleware(ShardingMiddleware(supervisor))
+        await supervisor.start()
+    else:
+        dp.update.outer_middleware(UserPreloadMiddleware())
+        init_channel_service(bot)
+        await start_services()
+
+    try:
+        logger.info("🚀 Запуск AI-редактора Telegram-постов...")
+
+        if BOT_MODE == "webhook":
+            await run_webhook(bot, dp)
+        else:
+            await bot.delete_webhook(drop_pending_updates=False)
+            await dp.start_polling(bot)
 
     except Exception as e:
         logger.error(f"Ошибка при запуске бота: {e}")
     finally:
+        if supervisor is not None:
+            await supervisor.stop()
+        else:
+            await close_services()
         await bot.session.close()
 
 
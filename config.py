@@ -1,4 +1,5 @@
 import os
+import re
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -13,6 +14,84 @@ GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 if not GEMINI_API_KEY:
     raise ValueError("GEMINI_API_KEY не найден в переменных окружения")
 
+BOT_MODE = os.getenv("BOT_MODE", "polling")
+WEBHOOK_URL = os.getenv("WEBHOOK_URL")
+if BOT_MODE == "webhook" and not WEBHOOK_URL:
+    raise ValueError("WEBHOOK_URL не найден в переменных окружения")
+
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+# Общий для всех экземпляров: секрет, сгенерированный при запуске, у каждого
+# экземпляра был бы свой, и обновления принимал бы только последний из них
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET")
+if BOT_MODE == "webhook" and not WEBHOOK_SECRET:
+    raise ValueError("WEBHOOK_SECRET не найден в переменных окружения")
+if WEBHOOK_SECRET and not re.fullmatch(r"[A-Za-z0-9_-]{1,256}", WEBHOOK_SECRET):
+    raise ValueError("WEBHOOK_SECRET может содержать только 1-256 символов A-Z, a-z, 0-9, _ и -")
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8080"))
+WEBHOOK_MAX_CONNECTIONS = int(os.getenv("WEBHOOK_MAX_CONNECTIONS", "40"))
+WEBHOOK_MAX_WORKERS = int(os.getenv("WEBHOOK_MAX_WORKERS", "100"))
+WEBHOOK_KEEPALIVE = float(os.getenv("WEBHOOK_KEEPALIVE", "75"))
+WEBHOOK_DRAIN_TIMEOUT = float(os.getenv("WEBHOOK_DRAIN_TIMEOUT", "30"))
+
 MAX_MESSAGE_LENGTH = 4096
 GEMINI_MODEL = "gemini-2.0-flash-exp"
 DAILY_REQUESTS_LIMIT = 25
+QUOTA_POLICY = os.getenv("QUOTA_POLICY", "fixed")
+QUOTA_TIMEZONE = os.getenv("QUOTA_TIMEZONE")
+QUOTA_WINDOW = float(os.getenv("QUOTA_WINDOW", "86400"))
+QUOTA_BURST = int(os.getenv("QUOTA_BURST", "0"))
+ADMIN_IDS = {
+    int(admin_id) for admin_id in os.getenv("ADMIN_IDS", "").split(",") if admin_id.strip()
+}
+
+GEMINI_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", "20"))
+GEMINI_REQUEST_TIMEOUT = float(os.getenv("GEMINI_REQUEST_TIMEOUT", "60"))
+GEMINI_RPM = int(os.getenv("GEMINI_RPM", "60"))
+GEMINI_TPM = int(os.getenv("GEMINI_TPM", "1000000"))
+GEMINI_MAX_QUEUE = int(os.getenv("GEMINI_MAX_QUEUE", "200"))
+GEMINI_MAX_RETRIES = int(os.getenv("GEMINI_MAX_RETRIES", "3"))
+GEMINI_RETRY_BASE_DELAY = float(os.getenv("GEMINI_RETRY_BASE_DELAY", "1.0"))
+GEMINI_OUTPUT_TOKENS_ESTIMATE = int(os.getenv("GEMINI_OUTPUT_TOKENS_ESTIMATE", "1000"))
+QUEUE_NOTIFY_INTERVAL = float(os.getenv("QUEUE_NOTIFY_INTERVAL", "10"))
+QUEUE_NOTIFY_CONCURRENCY = int(os.getenv("QUEUE_NOTIFY_CONCURRENCY", "5"))
+PROMPTS_FILE = os.getenv("PROMPTS_FILE", "data/prompts.json")
+STREAM_EDIT_INTERVAL = float(os.getenv("STREAM_EDIT_INTERVAL", "1.5"))
+RATE_LIMIT_FLUSH_INTERVAL = float(os.getenv("RATE_LIMIT_FLUSH_INTERVAL", "1.0"))
+RATE_LIMIT_COMPACT_EVERY = int(os.getenv("RATE_LIMIT_COMPACT_EVERY", "10000"))
+
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(16 * 1024 * 1024)))
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "86400"))
+RESPONSE_CACHE_DISK = os.getenv("RESPONSE_CACHE_DISK", "False").lower() == "true"
+RESPONSE_CACHE_DIR = os.getenv("RESPONSE_CACHE_DIR", "data/response_cache")
+RESPONSE_CACHE_DISK_MAX_BYTES = int(
+    os.getenv("RESPONSE_CACHE_DISK_MAX_BYTES", str(256 * 1024 * 1024))
+)
+
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "sqlite")
+SQLITE_PATH = os.getenv("SQLITE_PATH", "data/bot.db")
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+REDIS_PREFIX = os.getenv("REDIS_PREFIX", "ai_editor")
+JSON_FLUSH_DELAY = float(os.getenv("JSON_FLUSH_DELAY", "1.0"))
+
+BOT_WORKERS = int(os.getenv("BOT_WORKERS", "1"))
+if BOT_WORKERS > 1 and STORAGE_BACKEND == "json":
+    raise ValueError("Для BOT_WORKERS > 1 нужно хранилище sqlite или redis")
+
+WORKER_HEARTBEAT_INTERVAL = float(os.getenv("WORKER_HEARTBEAT_INTERVAL", "5"))
+WORKER_HEARTBEAT_TIMEOUT = float(os.getenv("WORKER_HEARTBEAT_TIMEOUT", "30"))
+WORKER_SHUTDOWN_TIMEOUT = float(os.getenv("WORKER_SHUTDOWN_TIMEOUT", "30"))
+SUPERVISOR_HEALTH_PORT = int(os.getenv("SUPERVISOR_HEALTH_PORT", "8081"))
+LANGUAGE_CACHE_SIZE = int(os.getenv("LANGUAGE_CACHE_SIZE", "10000"))
+LOCALES_DIR = os.getenv("LOCALES_DIR", "locales")
+CHANNEL_CACHE_TTL = float(os.getenv("CHANNEL_CACHE_TTL", "600"))
+SAVED_CHANNELS_LIMIT = int(os.getenv("SAVED_CHANNELS_LIMIT", "20"))
+PUBLISH_CONCURRENCY = int(os.getenv("PUBLISH_CONCURRENCY", "10"))
+PUBLISH_GLOBAL_RATE = int(os.getenv("PUBLISH_GLOBAL_RATE", "25"))
+PUBLISH_CHAT_INTERVAL = float(os.getenv("PUBLISH_CHAT_INTERVAL", "1.0"))
+PUBLISH_MAX_RETRIES = int(os.getenv("PUBLISH_MAX_RETRIES", "3"))
+PUBLISH_MAX_RETRY_AFTER = float(os.getenv("PUBLISH_MAX_RETRY_AFTER", "60"))
+SCHEDULE_TIMEZONE = os.getenv("SCHEDULE_TIMEZONE", QUOTA_TIMEZONE)
+SCHEDULE_CLAIM_TIMEOUT = float(os.getenv("SCHEDULE_CLAIM_TIMEOUT", "300"))
+SCHEDULE_MAX_SLEEP = float(os.getenv("SCHEDULE_MAX_SLEEP", "3600"))
+SCHEDULE_POLL_INTERVAL = float(os.getenv("SCHEDULE_POLL_INTERVAL", "30"))
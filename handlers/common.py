@@ -3,15 +3,19 @@ from aiogram.types import Message, CallbackQuery
 from aiogram.fsm.context import FSMContext
 from keyboards import get_main_menu, get_result_menu, get_processing_menu
 from services.ai_service import GeminiService
-from services.language_service import LanguageService
+from services.user_context import UserContext
+from utils.streaming import queue_position_notifier
+from utils.telegram_html import to_telegram_html
+from utils.html_splitter import split_html, send_html_chunks
 
 router = Router()
 gemini_service = GeminiService()
-language_service = LanguageService()
 
 
 @router.callback_query(F.data == "process_again")
-async def process_again(callback: CallbackQuery, state: FSMContext):
+async def process_again(
+    callback: CallbackQuery, state: FSMContext, user_context: UserContext
+):
     """Повторная обработка поста"""
     user_id = callback.from_user.id
     data = await state.get_data()
@@ -22,7 +26,7 @@ async def process_again(callback: CallbackQuery, state: FSMContext):
         await callback.answer("❌ Нет исходных данных для повторной обработки")
         return
 
-    processing_text = language_service.get_text(user_id, "processing")
+    processing_text = user_context.text("processing")
     await callback.message.edit_text(
         processing_text,
         parse_mode="HTML",
@@ -30,36 +34,62 @@ async def process_again(callback: CallbackQuery, state: FSMContext):
     )
 
     try:
-        new_result = await gemini_service.improve_post(
-            original_text,
-            task_type,
+        new_result = await gemini_service.run_generation(
             user_id,
-            language_code=language_service.get_user_language(user_id),
+            gemini_service.improve_post(
+                original_text,
+                task_type,
+                user_id,
+                language_code=user_context.language,
+                user_context=user_context,
+                on_queue_position=queue_position_notifier(
+                    callback.message,
+                    lambda position: user_context.text("queue_position", position),
+                    reply_markup=get_processing_menu(user_id),
+                ),
+                fresh=True,
+            ),
         )
     except Exception:
-        error_text = language_service.get_text(user_id, "error_processing")
+        error_text = user_context.text("error_processing")
         await callback.message.edit_text(
             error_text, reply_markup=get_main_menu(user_id)
         )
         return
 
+    if new_result is None:
+        return
+
+    new_result = to_telegram_html(new_result)
+
     await state.update_data(processed_text=new_result)
 
-    result_prefix = language_service.get_text(user_id, "result_processing")
-    await callback.message.edit_text(
-        f"🔁 {result_prefix}{new_result}",
-        reply_markup=get_result_menu(user_id),
-        parse_mode="HTML",
-    )
+    result_prefix = user_context.text("result_processing")
+    result_text = f"🔁 {result_prefix}{new_result}"
+
+    if len(split_html(result_text)) == 1:
+        await callback.message.edit_text(
+            result_text,
+            reply_markup=get_result_menu(user_id),
+            parse_mode="HTML",
+        )
+    else:
+        await callback.message.delete()
+        await send_html_chunks(
+            callback.message, result_text, reply_markup=get_result_menu(user_id)
+        )
 
 
 @router.callback_query(F.data == "cancel")
-async def cancel_processing(callback: CallbackQuery, state: FSMContext):
+async def cancel_processing(
+    callback: CallbackQuery, state: FSMContext, user_context: UserContext
+):
     """Отмена обработки"""
     user_id = callback.from_user.id
+    gemini_service.cancel_generation(user_id)
     await state.clear()
 
-    cancelled_text = language_service.get_text(user_id, "processing_cancelled")
+    cancelled_text = user_context.text("processing_cancelled")
     await callback.message.edit_text(
         cancelled_text,
         reply_markup=get_main_menu(user_id),
@@ -4,24 +4,27 @@ from aiogram.fsm.context import FSMContext
 from keyboards import get_back_menu, get_main_menu, get_processing_menu, get_result_menu
 from models.states import EditStates
 from services.ai_service import GeminiService
-from config import MAX_MESSAGE_LENGTH
-from services.language_service import LanguageService
+from services.user_context import UserContext
+from utils.streaming import stream_to_message, queue_position_notifier
+from utils.telegram_html import to_telegram_html
+from utils.html_splitter import send_html_chunks
 import logging
 
 router = Router()
 gemini_service = GeminiService()
-language_service = LanguageService()
 logger = logging.getLogger(__name__)
 
 
 @router.callback_query(F.data == "create")
-async def create_post_selected(callback: CallbackQuery, state: FSMContext):
+async def create_post_selected(
+    callback: CallbackQuery, state: FSMContext, user_context: UserContext
+):
     """Обработчик выбора создания поста"""
     user_id = callback.from_user.id
     await state.update_data(task_type="create")
     await state.set_state(EditStates.waiting_for_topic)
 
-    create_text = language_service.get_text(user_id, "task_create")
+    create_text = user_context.text("task_create")
 
     await callback.message.edit_text(
         create_text, reply_markup=get_back_menu(user_id), parse_mode="HTML"
@@ -30,23 +33,21 @@ async def create_post_selected(callback: CallbackQuery, state: FSMContext):
 
 
 @router.message(EditStates.waiting_for_topic)
-async def process_topic(message: Message, state: FSMContext):
+async def process_topic(message: Message, state: FSMContext, user_context: UserContext):
     """Обработка темы для создания поста"""
     user_id = message.from_user.id
 
     if not message.text:
-        error_text = language_service.get_text(user_id, "error_text_only")
+        error_text = user_context.text("error_text_only")
         await message.answer(error_text)
         return
 
     if len(message.text) > 500:
-        error_text = language_service.get_text(
-            user_id, "error_topic_too_long", len(message.text)
-        )
+        error_text = user_context.text("error_topic_too_long", len(message.text))
         await message.answer(error_text)
         return
 
-    processing_text = language_service.get_text(user_id, "creating_post")
+    processing_text = user_context.text("creating_post")
     processing_msg = await message.answer(
         processing_text,
         parse_mode="HTML",
@@ -57,37 +58,45 @@ async def process_topic(message: Message, state: FSMContext):
     await state.update_data(processing_msg_id=processing_msg.message_id)
 
     try:
-        result = await gemini_service.improve_post(
+        chunks = gemini_service.stream_post(
             message.text,
             "create",
             user_id,
-            language_code=language_service.get_user_language(user_id),
+            language_code=user_context.language,
+            user_context=user_context,
+            on_queue_position=queue_position_notifier(
+                processing_msg,
+                lambda position: user_context.text("queue_position", position),
+                reply_markup=get_processing_menu(user_id),
+            ),
+        )
+        result = await gemini_service.run_generation(
+            user_id,
+            stream_to_message(
+                processing_msg, chunks, reply_markup=get_processing_menu(user_id)
+            ),
         )
 
+        if result is None:
+            return
+
+        result = to_telegram_html(result)
+
         try:
             await processing_msg.delete()
         except:
             pass
 
-        result_prefix = language_service.get_text(user_id, "result_created")
+        result_prefix = user_context.text("result_created")
         result_text = f"{result_prefix}{result}"
 
-        if len(result_text) > MAX_MESSAGE_LENGTH:
-            parts = [
-                result_text[i : i + MAX_MESSAGE_LENGTH]
-                for i in range(0, len(result_text), MAX_MESSAGE_LENGTH)
-            ]
-
-            for part in parts:
-                await message.answer(part, parse_mode="HTML")
-        else:
-            await message.answer(result_text, parse_mode="HTML")
+        await send_html_chunks(message, result_text)
 
         await state.update_data(
             original_text=message.text, processed_text=result, task_type="create"
         )
 
-        what_next = language_service.get_text(user_id, "what_next")
+        what_next = user_context.text("what_next")
         await message.answer(what_next, reply_markup=get_result_menu(user_id))
 
     except Exception as e:
@@ -98,7 +107,7 @@ async def process_topic(message: Message, state: FSMContext):
         except:
             pass
 
-        error_text = language_service.get_text(user_id, "error_creating")
+        error_text = user_context.text("error_creating")
         await message.answer(
             error_text,
             parse_mode="HTML",
@@ -10,28 +10,30 @@ from keyboards import (
     get_back_menu,
 )
 from config import MAX_MESSAGE_LENGTH
-from services.language_service import LanguageService
+from services.user_context import UserContext
+from utils.streaming import stream_to_message, queue_position_notifier
+from utils.telegram_html import to_telegram_html
+from utils.html_splitter import send_html_chunks
 import logging
 
 router = Router()
 logger = logging.getLogger(__name__)
 gemini_service = GeminiService()
-language_service = LanguageService()
 
 
 @router.message(EditStates.waiting_for_text)
-async def process_text(message: Message, state: FSMContext):
+async def process_text(message: Message, state: FSMContext, user_context: UserContext):
     """Обработка отправленного текста"""
     user_id = message.from_user.id
 
     if not message.text:
-        error_text = language_service.get_text(user_id, "error_text_only")
+        error_text = user_context.text("error_text_only")
         await message.answer(error_text)
         return
 
     if len(message.text) > MAX_MESSAGE_LENGTH:
-        error_text = language_service.get_text(
-            user_id, "error_text_too_long", MAX_MESSAGE_LENGTH, len(message.text)
+        error_text = user_context.text(
+            "error_text_too_long", MAX_MESSAGE_LENGTH, len(message.text)
         )
         await message.answer(error_text)
         return
@@ -39,7 +41,7 @@ async def process_text(message: Message, state: FSMContext):
     data = await state.get_data()
     task_type = data.get("task_type", "improve")
 
-    processing_text = language_service.get_text(user_id, "processing")
+    processing_text = user_context.text("processing")
     processing_msg = await message.answer(
         processing_text,
         parse_mode="HTML",
@@ -50,12 +52,29 @@ async def process_text(message: Message, state: FSMContext):
     await state.update_data(processing_msg_id=processing_msg.message_id)
 
     try:
-        result = await gemini_service.improve_post(
+        chunks = gemini_service.stream_post(
             message.text,
             task_type,
             user_id,
-            language_code=language_service.get_user_language(user_id),
+            language_code=user_context.language,
+            user_context=user_context,
+            on_queue_position=queue_position_notifier(
+                processing_msg,
+                lambda position: user_context.text("queue_position", position),
+                reply_markup=get_processing_menu(user_id),
+            ),
         )
+        result = await gemini_service.run_generation(
+            user_id,
+            stream_to_message(
+                processing_msg, chunks, reply_markup=get_processing_menu(user_id)
+            ),
+        )
+
+        if result is None:
+            return
+
+        result = to_telegram_html(result)
 
         try:
             await processing_msg.delete()
@@ -63,32 +82,23 @@ async def process_text(message: Message, state: FSMContext):
             pass
 
         if task_type == "analyze":
-            result_prefix = language_service.get_text(user_id, "result_analysis")
+            result_prefix = user_context.text("result_analysis")
         else:
-            result_prefix = language_service.get_text(user_id, "result_processing")
+            result_prefix = user_context.text("result_processing")
 
         result_text = f"{result_prefix}{result}"
 
-        if len(result_text) > MAX_MESSAGE_LENGTH:
-            parts = [
-                result_text[i : i + MAX_MESSAGE_LENGTH]
-                for i in range(0, len(result_text), MAX_MESSAGE_LENGTH)
-            ]
-
-            for part in parts:
-                await message.answer(part, parse_mode="HTML")
-        else:
-            await message.answer(result_text, parse_mode="HTML")
+        await send_html_chunks(message, result_text)
 
         await state.update_data(
             original_text=message.text, processed_text=result, task_type=task_type
         )
 
         if task_type != "analyze":
-            what_next = language_service.get_text(user_id, "what_next")
+            what_next = user_context.text("what_next")
             await message.answer(what_next, reply_markup=get_result_menu(user_id))
         else:
-            process_another = language_service.get_text(user_id, "process_another")
+            process_another = user_context.text("process_another")
             await message.answer(process_another, reply_markup=get_main_menu(user_id))
             await state.clear()
 
@@ -100,7 +110,7 @@ async def process_text(message: Message, state: FSMContext):
         except:
             pass
 
-        error_text = language_service.get_text(user_id, "error_processing")
+        error_text = user_context.text("error_processing")
         await message.answer(
             error_text,
             parse_mode="HTML",
@@ -109,14 +119,14 @@ async def process_text(message: Message, state: FSMContext):
 
 
 @router.callback_query(F.data == "edit_result")
-async def handle_manual_edit(callback: CallbackQuery, state: FSMContext):
+async def handle_manual_edit(
+    callback: CallbackQuery, state: FSMContext, user_context: UserContext
+):
     """Обработка ручного редактирования поста"""
     user_id = callback.from_user.id
 
-    edit_text = language_service.get_text(user_id, "btn_edit_result")
-    max_length_info = language_service.get_text(
-        user_id, "max_length_info", MAX_MESSAGE_LENGTH
-    )
+    edit_text = user_context.text("btn_edit_result")
+    max_length_info = user_context.text("max_length_info", MAX_MESSAGE_LENGTH)
 
     await callback.message.edit_text(
         f"✍️ <b>{edit_text}:</b>\n\n{max_length_info}",
@@ -1,22 +1,24 @@
 from aiogram import Router, F
 from aiogram.types import Message, CallbackQuery
 from keyboards import get_back_menu
-from services.language_service import LanguageService
-from config import DAILY_REQUESTS_LIMIT
+from services.ai_service import GeminiService
+from services.user_context import UserContext
 
 router = Router()
-language_service = LanguageService()
+gemini_service = GeminiService()
 
 
 @router.message(F.text == "/help")
-async def help_handler(message: Message):
-    user_id = message.from_user.id
+async def help_handler(message: Message, user_context: UserContext):
+    user_id = user_context.user_id
 
-    title = language_service.get_text(user_id, "help_title")
-    abilities = language_service.get_text(user_id, "help_abilities")
-    limits = language_service.get_text(user_id, "help_limits", DAILY_REQUESTS_LIMIT)
-    usage = language_service.get_text(user_id, "help_usage")
-    commands = language_service.get_text(user_id, "help_commands")
+    title = user_context.text("help_title")
+    abilities = user_context.text("help_abilities")
+    limits = user_context.text(
+        "help_limits", gemini_service.rate_limiter.daily_limit
+    )
+    usage = user_context.text("help_usage")
+    commands = user_context.text("help_commands")
 
     help_text = f"{title}\n\n{abilities}\n\n{limits}\n\n{usage}\n\n{commands}"
 
@@ -26,6 +28,6 @@ async def help_handler(message: Message):
 
 
 @router.callback_query(F.data == "help")
-async def help_callback(callback: CallbackQuery):
-    await help_handler(callback.message)
+async def help_callback(callback: CallbackQuery, user_context: UserContext):
+    await help_handler(callback.message, user_context)
     await callback.answer()
@@ -2,6 +2,7 @@ from aiogram import Router, F
 from aiogram.types import CallbackQuery
 from aiogram.fsm.context import FSMContext
 from services.language_service import LanguageService
+from services.user_context import UserContext
 from keyboards import get_language_selection_menu, get_main_menu
 
 router = Router()
@@ -9,10 +10,12 @@ language_service = LanguageService()
 
 
 @router.callback_query(F.data == "language")
-async def show_language_menu(callback: CallbackQuery, state: FSMContext):
+async def show_language_menu(
+    callback: CallbackQuery, state: FSMContext, user_context: UserContext
+):
     """Показывает меню выбора языка"""
     await callback.message.edit_text(
-        language_service.get_text(callback.from_user.id, "language_selection"),
+        user_context.text("language_selection"),
         reply_markup=get_language_selection_menu(),
         parse_mode="HTML",
     )
@@ -20,17 +23,24 @@ async def show_language_menu(callback: CallbackQuery, state: FSMContext):
 
 
 @router.callback_query(F.data.startswith("lang_"))
-async def set_language(callback: CallbackQuery, state: FSMContext):
+async def set_language(
+    callback: CallbackQuery, state: FSMContext, user_context: UserContext
+):
     """Устанавливает выбранный язык"""
-    language_code = callback.data.split("_")[1]  # lang_ru -> ru
+    language_code = callback.data.split("_", 1)[1]  # lang_ru -> ru
     user_id = callback.from_user.id
 
-    language_service.set_user_language(user_id, language_code)
+    if language_code not in language_service.catalogs:
+        await callback.answer()
+        return
 
-    confirmation_text = language_service.get_text(user_id, "language_changed")
+    # В хранилище язык сохранит UserPreloadMiddleware после обработки
+    user_context.set_language(language_code)
+
+    confirmation_text = user_context.text("language_changed")
     await callback.answer(confirmation_text)
 
-    main_menu_text = language_service.get_text(user_id, "main_menu_title")
+    main_menu_text = user_context.text("main_menu_title")
     await callback.message.edit_text(
         main_menu_text,
         reply_markup=get_main_menu(user_id),
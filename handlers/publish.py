@@ -1,49 +1,72 @@
+import asyncio
+import html
+from functools import partial
 from aiogram import Router, F
-from aiogram.types import Message, CallbackQuery
+from aiogram.types import Message, CallbackQuery, ChatMemberUpdated
 from aiogram.fsm.context import FSMContext
 from services.channel_service import ChannelService
+from services.scheduler import PublishScheduler
+from handlers.schedule import notify_schedule_result
 from models.states import PublishStates
 from keyboards import (
     get_main_menu,
     get_back_menu,
     get_publish_confirm_menu,
     get_publish_success_menu,
+    get_saved_channels_menu,
+    get_channels_selection_menu,
 )
-from services.language_service import LanguageService
+from services.user_context import UserContext
 
 router = Router()
 channel_service = None
-language_service = LanguageService()
 
 
 def init_channel_service(bot):
     global channel_service
     channel_service = ChannelService(bot)
+    PublishScheduler().attach(channel_service, partial(notify_schedule_result, bot))
+
+
+@router.my_chat_member()
+async def bot_membership_changed(event: ChatMemberUpdated):
+    """Сбрасывает кэш канала, когда бота добавили, удалили или изменили его права"""
+    if channel_service is not None:
+        channel_service.invalidate(event.chat.id, event.chat.username)
 
 
 @router.callback_query(F.data == "publish")
-async def start_publish(callback: CallbackQuery, state: FSMContext):
+async def start_publish(
+    callback: CallbackQuery, state: FSMContext, user_context: UserContext
+):
     """Начало процесса публикации"""
     user_id = callback.from_user.id
     data = await state.get_data()
     processed_text = data.get("processed_text")
 
     if not processed_text:
-        await callback.answer(language_service.get_text(user_id, "publish_no_text"))
+        await callback.answer(user_context.text("publish_no_text"))
         return
 
     await state.set_state(PublishStates.waiting_for_channel)
 
-    publish_text = language_service.get_text(user_id, "publish_start")
+    publish_text = user_context.text("publish_start")
+    channels = await user_context.saved_channels()
+    if channels:
+        publish_text += user_context.text("publish_saved_channels")
 
     await callback.message.edit_text(
-        publish_text, reply_markup=get_back_menu(user_id), parse_mode="HTML"
+        publish_text,
+        reply_markup=get_saved_channels_menu(user_id, channels),
+        parse_mode="HTML",
     )
     await callback.answer()
 
 
 @router.message(PublishStates.waiting_for_channel)
-async def process_channel_input(message: Message, state: FSMContext):
+async def process_channel_input(
+    message: Message, state: FSMContext, user_context: UserContext
+):
     """Обработка ввода канала для публикации"""
     user_id = message.from_user.id
     channel_id = None
@@ -57,15 +80,13 @@ async def process_channel_input(message: Message, state: FSMContext):
         elif channel_input.startswith("-") or channel_input.isdigit():
             channel_id = channel_input
         else:
-            await message.answer(
-                language_service.get_text(user_id, "publish_invalid_format")
-            )
+            await message.answer(user_context.text("publish_invalid_format"))
             return
     else:
-        await message.answer(language_service.get_text(user_id, "publish_send_channel"))
+        await message.answer(user_context.text("publish_send_channel"))
         return
 
-    checking_text = language_service.get_text(user_id, "publish_checking")
+    checking_text = user_context.text("publish_checking")
     checking_msg = await message.answer(checking_text)
 
     validation_result = await channel_service.validate_channel_access(channel_id)
@@ -74,7 +95,7 @@ async def process_channel_input(message: Message, state: FSMContext):
 
     if not validation_result["valid"]:
         error_msg = validation_result["error"] or "Неизвестная ошибка"
-        error_text = language_service.get_text(user_id, "publish_error", error_msg)
+        error_text = user_context.text("publish_error", error_msg)
         await message.answer(
             error_text,
             parse_mode="HTML",
@@ -83,6 +104,7 @@ async def process_channel_input(message: Message, state: FSMContext):
         return
 
     chat_info = validation_result["chat_info"]
+    await user_context.save_channel(chat_info)
     await state.update_data(channel_id=channel_id, channel_info=chat_info)
 
     data = await state.get_data()
@@ -91,8 +113,7 @@ async def process_channel_input(message: Message, state: FSMContext):
     username_info = (
         f"<b>Username:</b> @{chat_info['username']}" if chat_info["username"] else ""
     )
-    preview_text = language_service.get_text(
-        user_id,
+    preview_text = user_context.text(
         "publish_preview",
         chat_info["title"],
         chat_info["type"],
@@ -110,22 +131,183 @@ async def process_channel_input(message: Message, state: FSMContext):
 
 
 @router.callback_query(F.data == "confirm_publish")
-async def confirm_publish(callback: CallbackQuery, state: FSMContext):
+async def confirm_publish(
+    callback: CallbackQuery, state: FSMContext, user_context: UserContext
+):
     """Подтверждение и выполнение публикации"""
-    user_id = callback.from_user.id
     data = await state.get_data()
     channel_id = data.get("channel_id")
     processed_text = data.get("processed_text")
     channel_info = data.get("channel_info", {})
 
     if not channel_id or not processed_text:
-        await callback.answer(language_service.get_text(user_id, "publish_no_data"))
+        await callback.answer(user_context.text("publish_no_data"))
+        return
+
+    await _publish(
+        callback, state, user_context, channel_id, channel_info, processed_text
+    )
+
+
+@router.callback_query(F.data.startswith("publish_to:"))
+async def publish_to_saved_channel(
+    callback: CallbackQuery, state: FSMContext, user_context: UserContext
+):
+    """Публикация в сохраненный канал в одно касание"""
+    user_id = callback.from_user.id
+    channel_id = callback.data.split(":", 1)[1]
+    data = await state.get_data()
+    processed_text = data.get("processed_text")
+
+    if not processed_text:
+        await callback.answer(user_context.text("publish_no_data"))
         return
 
+    # Для известного канала проверка берется из кэша ChannelService
+    validation_result = await channel_service.validate_channel_access(channel_id)
+
+    if not validation_result["valid"]:
+        # Канал забывается, только если Telegram ответил, что его нет
+        if validation_result["gone"]:
+            await user_context.remove_channel(channel_id)
+
+        error_msg = validation_result["error"] or "Неизвестная ошибка"
+        error_text = user_context.text("publish_error", error_msg)
+        await callback.message.edit_text(
+            error_text,
+            parse_mode="HTML",
+            reply_markup=get_back_menu(user_id),
+        )
+        await callback.answer()
+        return
+
+    await _publish(
+        callback,
+        state,
+        user_context,
+        channel_id,
+        validation_result["chat_info"],
+        processed_text,
+    )
+
+
+@router.callback_query(F.data == "publish_multi")
+async def start_multi_publish(
+    callback: CallbackQuery, state: FSMContext, user_context: UserContext
+):
+    """Выбор нескольких сохраненных каналов для публикации"""
+    user_id = callback.from_user.id
+    channels = await user_context.saved_channels()
+    await state.update_data(multi_channels=channels, selected_channels=[])
+
+    await callback.message.edit_text(
+        user_context.text("publish_multi_select"),
+        reply_markup=get_channels_selection_menu(user_id, channels, []),
+        parse_mode="HTML",
+    )
+    await callback.answer()
+
+
+@router.callback_query(F.data.startswith("publish_toggle:"))
+async def toggle_channel(
+    callback: CallbackQuery, state: FSMContext, user_context: UserContext
+):
+    """Отмечает канал для публикации или снимает отметку"""
+    user_id = callback.from_user.id
+    channel_id = callback.data.split(":", 1)[1]
+    data = await state.get_data()
+    selected = data.get("selected_channels", [])
+
+    if channel_id in selected:
+        selected.remove(channel_id)
+    else:
+        selected.append(channel_id)
+    await state.update_data(selected_channels=selected)
+
+    await callback.message.edit_reply_markup(
+        reply_markup=get_channels_selection_menu(
+            user_id, data.get("multi_channels", []), selected
+        )
+    )
+    await callback.answer()
+
+
+@router.callback_query(F.data == "publish_selected")
+async def publish_selected(
+    callback: CallbackQuery, state: FSMContext, user_context: UserContext
+):
+    """Публикация во все отмеченные каналы с итогом в одном сообщении"""
+    user_id = callback.from_user.id
+    data = await state.get_data()
+    processed_text = data.get("processed_text")
+    selected = data.get("selected_channels", [])
+
+    if not processed_text:
+        await callback.answer(user_context.text("publish_no_data"))
+        return
+    if not selected:
+        await callback.answer(user_context.text("publish_multi_none"))
+        return
+
+    await state.set_state(PublishStates.publishing)
+    await callback.answer()
+    progress_msg = await callback.message.edit_text(
+        user_context.text("publish_multi_progress", len(selected)),
+        parse_mode="HTML",
+    )
+
+    # Известные каналы проверяются по кэшу ChannelService без запросов к API
+    validations = await asyncio.gather(
+        *(channel_service.validate_channel_access(channel_id) for channel_id in selected)
+    )
+    titles = {}
+    errors = {}
+    for channel_id, validation in zip(selected, validations):
+        chat_info = validation["chat_info"] or {}
+        titles[channel_id] = chat_info.get("title") or channel_id
+        if not validation["valid"]:
+            errors[channel_id] = validation["error"] or "Неизвестная ошибка"
+
+    valid = [channel_id for channel_id in selected if channel_id not in errors]
+    errors.update(await channel_service.publish_many(valid, processed_text, "HTML"))
+
+    for channel_id, validation in zip(selected, validations):
+        if errors.get(channel_id) is None:
+            await user_context.save_channel(validation["chat_info"])
+
+    lines = [
+        f"✅ {html.escape(titles[channel_id])}"
+        if errors.get(channel_id) is None
+        else f"❌ {html.escape(titles[channel_id])}: {html.escape(errors[channel_id])}"
+        for channel_id in selected
+    ]
+    published = sum(1 for channel_id in selected if errors.get(channel_id) is None)
+    summary_text = user_context.text(
+        "publish_multi_summary", published, len(selected), "\n".join(lines)
+    )
+
+    await progress_msg.edit_text(
+        summary_text,
+        reply_markup=get_publish_success_menu(user_id) if published else get_main_menu(user_id),
+        parse_mode="HTML",
+    )
+    await state.clear()
+
+
+async def _publish(
+    callback: CallbackQuery,
+    state: FSMContext,
+    user_context: UserContext,
+    channel_id: str,
+    channel_info: dict,
+    processed_text: str,
+):
+    """Публикует пост и показывает результат"""
+    user_id = callback.from_user.id
     await state.set_state(PublishStates.publishing)
 
-    publishing_text = language_service.get_text(
-        user_id, "publish_publishing", channel_info.get("title", "Unknown")
+    publishing_text = user_context.text(
+        "publish_publishing", channel_info.get("title", "Unknown")
     )
     publishing_msg = await callback.message.edit_text(
         publishing_text,
@@ -135,13 +317,14 @@ async def confirm_publish(callback: CallbackQuery, state: FSMContext):
     success = await channel_service.publish_post(channel_id, processed_text, "HTML")
 
     if success:
+        if channel_info.get("id") is not None:
+            await user_context.save_channel(channel_info)
         username_info = (
             f"Username: @{channel_info['username']}"
             if channel_info.get("username")
             else ""
         )
-        success_text = language_service.get_text(
-            user_id,
+        success_text = user_context.text(
             "publish_success",
             channel_info.get("title", "Unknown"),
             username_info,
@@ -152,7 +335,7 @@ async def confirm_publish(callback: CallbackQuery, state: FSMContext):
             parse_mode="HTML",
         )
     else:
-        error_text = language_service.get_text(user_id, "publish_error_final")
+        error_text = user_context.text("publish_error_final")
         await publishing_msg.edit_text(
             error_text,
             reply_markup=get_main_menu(user_id),
@@ -164,15 +347,17 @@ async def confirm_publish(callback: CallbackQuery, state: FSMContext):
 
 
 @router.callback_query(F.data == "cancel_publish")
-async def cancel_publish(callback: CallbackQuery, state: FSMContext):
+async def cancel_publish(
+    callback: CallbackQuery, state: FSMContext, user_context: UserContext
+):
     """Отмена публикации"""
     user_id = callback.from_user.id
     await state.clear()
 
-    cancelled_text = language_service.get_text(user_id, "publish_cancelled")
+    cancelled_text = user_context.text("publish_cancelled")
     await callback.message.edit_text(
         cancelled_text,
         reply_markup=get_main_menu(user_id),
         parse_mode="HTML",
     )
-    await callback.answer(language_service.get_text(user_id, "publish_cancelled_short"))
+    await callback.answer(user_context.text("publish_cancelled_short"))
@@ -0,0 +1,177 @@
+import html
+import re
+from datetime import datetime, timedelta
+from typing import Optional
+from zoneinfo import ZoneInfo
+from aiogram import Bot, Router, F
+from aiogram.types import Message, CallbackQuery
+from aiogram.fsm.context import FSMContext
+from models.states import PublishStates
+from keyboards import get_main_menu, get_back_menu, get_scheduled_posts_menu
+from services.language_service import LanguageService
+from services.scheduler import PublishScheduler
+from services.user_context import UserContext
+from config import SCHEDULE_TIMEZONE
+
+router = Router()
+language_service = LanguageService()
+scheduler = PublishScheduler()
+
+SCHEDULE_TZ = ZoneInfo(SCHEDULE_TIMEZONE) if SCHEDULE_TIMEZONE else None
+
+_DELAY = re.compile(r"^\+\s*(\d+)\s*([mhd])$", re.IGNORECASE)
+_DELAY_UNITS = {"m": "minutes", "h": "hours", "d": "days"}
+_FORMATS = ("%d.%m.%Y %H:%M", "%H:%M")
+_DAY_MONTH = "%d.%m %H:%M %Y"
+# 29.02 может подойти только через несколько лет
+_DAY_MONTH_YEARS = 5
+MAX_LISTED_JOBS = 50
+
+
+def parse_schedule_time(text: str, now: datetime) -> Optional[datetime]:
+    """Разбирает время публикации: дату со временем, только время или задержку +30m"""
+    text = " ".join(text.split())
+    delay = _DELAY.match(text)
+    if delay:
+        try:
+            return now + timedelta(**{_DELAY_UNITS[delay.group(2).lower()]: int(delay.group(1))})
+        except (OverflowError, ValueError):
+            # Задержка больше, чем помещается в datetime
+            return None
+
+    for fmt in _FORMATS:
+        try:
+            parsed = datetime.strptime(text, fmt)
+        except ValueError:
+            continue
+
+        if fmt == "%H:%M":
+            moment = now.replace(hour=parsed.hour, minute=parsed.minute, second=0, microsecond=0)
+            # Уже прошедшее сегодня время означает завтра
+            return moment if moment > now else moment + timedelta(days=1)
+        return parsed.replace(tzinfo=now.tzinfo)
+
+    # Дата без года - ближайшая будущая: прошедшая в этом году означает
+    # следующий год, а 29.02 - ближайший високосный
+    for year in range(now.year, now.year + _DAY_MONTH_YEARS):
+        try:
+            moment = datetime.strptime(f"{text} {year}", _DAY_MONTH)
+        except ValueError:
+            continue
+        moment = moment.replace(tzinfo=now.tzinfo)
+        if moment > now:
+            return moment
+
+    return None
+
+
+def format_schedule_time(timestamp: float) -> str:
+    return datetime.fromtimestamp(timestamp, SCHEDULE_TZ).strftime("%d.%m.%Y %H:%M")
+
+
+async def notify_schedule_result(bot: Bot, job: dict, error: Optional[str]):
+    """Сообщает автору, чем закончилась запланированная публикация"""
+    user_id = job["user_id"]
+    # Уведомление идет не из обработчика обновления, поэтому UserContext нет
+    await language_service.load_user(user_id)
+    _ = language_service.for_user(user_id)
+    title = html.escape(job["chat_title"] or job["chat_id"])
+
+    if error is None:
+        text = _("schedule_published", title)
+    else:
+        text = _("schedule_failed", title, html.escape(error))
+    await bot.send_message(user_id, text, parse_mode="HTML")
+
+
+async def _scheduled_posts_view(user_context: UserContext):
+    user_id = user_context.user_id
+    # Число кнопок в сообщении ограничено Telegram
+    jobs = (await scheduler.get_user_jobs(user_id))[:MAX_LISTED_JOBS]
+    if not jobs:
+        return user_context.text("schedule_list_empty"), get_back_menu(user_id)
+
+    entries = [
+        (job["id"], f"{format_schedule_time(job['run_at'])} {job['chat_title'] or job['chat_id']}")
+        for job in jobs
+    ]
+    return (
+        user_context.text("schedule_list_title"),
+        get_scheduled_posts_menu(user_id, entries),
+    )
+
+
+@router.message(F.text == "/scheduled")
+async def scheduled_posts_command(message: Message, user_context: UserContext):
+    """Список запланированных публикаций"""
+    text, keyboard = await _scheduled_posts_view(user_context)
+    await message.answer(text, reply_markup=keyboard, parse_mode="HTML")
+
+
+@router.callback_query(F.data == "schedule_publish")
+async def ask_schedule_time(
+    callback: CallbackQuery, state: FSMContext, user_context: UserContext
+):
+    """Запрос времени отложенной публикации"""
+    user_id = callback.from_user.id
+    data = await state.get_data()
+
+    if not data.get("channel_id") or not data.get("processed_text"):
+        await callback.answer(user_context.text("publish_no_data"))
+        return
+
+    await state.set_state(PublishStates.waiting_for_schedule_time)
+    await callback.message.edit_text(
+        user_context.text("schedule_ask_time"),
+        reply_markup=get_back_menu(user_id),
+        parse_mode="HTML",
+    )
+    await callback.answer()
+
+
+@router.message(PublishStates.waiting_for_schedule_time)
+async def receive_schedule_time(
+    message: Message, state: FSMContext, user_context: UserContext
+):
+    """Планирование публикации на указанное время"""
+    user_id = message.from_user.id
+    now = datetime.now().astimezone(SCHEDULE_TZ)
+    run_at = parse_schedule_time(message.text or "", now)
+
+    if run_at is None:
+        await message.answer(user_context.text("schedule_invalid_time"), parse_mode="HTML")
+        return
+    if run_at <= now:
+        await message.answer(user_context.text("schedule_past_time"))
+        return
+
+    data = await state.get_data()
+    channel_info = data.get("channel_info", {})
+    await scheduler.schedule(
+        user_id,
+        data["channel_id"],
+        channel_info.get("title"),
+        data["processed_text"],
+        run_at.timestamp(),
+    )
+    await state.clear()
+
+    await message.answer(
+        user_context.text(
+            "schedule_created",
+            html.escape(channel_info.get("title") or data["channel_id"]),
+            format_schedule_time(run_at.timestamp()),
+        ),
+        reply_markup=get_main_menu(user_id),
+        parse_mode="HTML",
+    )
+
+
+@router.callback_query(F.data.startswith("schedule_cancel:"))
+async def cancel_scheduled_post(callback: CallbackQuery, user_context: UserContext):
+    """Отмена запланированной публикации"""
+    await scheduler.cancel(callback.data.split(":", 1)[1], user_context.user_id)
+
+    text, keyboard = await _scheduled_posts_view(user_context)
+    await callback.message.edit_text(text, reply_markup=keyboard, parse_mode="HTML")
+    await callback.answer(user_context.text("schedule_cancelled"))
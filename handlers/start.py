@@ -3,27 +3,26 @@ from aiogram.types import Message
 from aiogram.filters import CommandStart
 from aiogram.fsm.context import FSMContext
 from keyboards import get_main_menu, get_language_selection_menu
-from services.language_service import LanguageService
+from services.user_context import UserContext
 from models.states import LanguageStates
 
 router = Router()
-language_service = LanguageService()
 
 
 @router.message(CommandStart())
-async def start_handler(message: Message, state: FSMContext):
+async def start_handler(message: Message, state: FSMContext, user_context: UserContext):
     await state.clear()
     user_id = message.from_user.id
 
-    if not language_service.has_language_set(user_id):
+    if not user_context.has_language:
         await message.answer(
-            language_service.get_text(user_id, "language_selection"),
+            user_context.text("language_selection"),
             reply_markup=get_language_selection_menu(),
             parse_mode="HTML",
         )
         await state.set_state(LanguageStates.selecting_language)
     else:
-        welcome_text = language_service.get_text(user_id, "welcome_text")
+        welcome_text = user_context.text("welcome_text")
         await message.answer(
             welcome_text, reply_markup=get_main_menu(user_id), parse_mode="HTML"
         )
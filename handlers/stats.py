@@ -2,36 +2,31 @@ from aiogram import Router, F
 from aiogram.types import Message, CallbackQuery
 from keyboards import get_back_menu
 from services.ai_service import GeminiService
-from services.language_service import LanguageService
+from services.user_context import UserContext
+from config import ADMIN_IDS
 
 router = Router()
 gemini_service = GeminiService()
-language_service = LanguageService()
 
 
 @router.callback_query(F.data == "stats")
-async def show_stats(callback: CallbackQuery):
+async def show_stats(callback: CallbackQuery, user_context: UserContext):
     """Показывает статистику использования API"""
     user_id = callback.from_user.id
-    stats = gemini_service.get_user_usage_stats(user_id)
+    stats = await user_context.usage_stats()
 
-    title = language_service.get_text(user_id, "stats_title")
-    today_stats = language_service.get_text(
-        user_id,
+    title = user_context.text("stats_title")
+    today_stats = user_context.text(
         "stats_today",
         stats["requests_today"],
         stats["daily_limit"],
         stats["remaining_requests"],
     )
-    total_stats = language_service.get_text(
-        user_id, "stats_total", stats["total_requests"]
-    )
-    reset_info = language_service.get_text(
-        user_id, "stats_reset", stats["reset_time"].strftime("%d.%m.%Y в %H:%M")
-    )
-    limit_info = language_service.get_text(
-        user_id, "stats_limit_info", stats["daily_limit"]
+    total_stats = user_context.text("stats_total", stats["total_requests"])
+    reset_info = user_context.text(
+        "stats_reset", stats["reset_time"].strftime("%d.%m.%Y в %H:%M")
     )
+    limit_info = user_context.text("stats_limit_info", stats["daily_limit"])
 
     stats_text = (
         f"{title}\n\n{today_stats}\n\n{total_stats}\n\n{reset_info}\n\n{limit_info}"
@@ -44,28 +39,23 @@ async def show_stats(callback: CallbackQuery):
 
 
 @router.message(F.text == "/stats")
-async def stats_command(message: Message):
+async def stats_command(message: Message, user_context: UserContext):
     """Команда для просмотра статистики"""
     user_id = message.from_user.id
-    stats = gemini_service.get_user_usage_stats(user_id)
+    stats = await user_context.usage_stats()
 
-    title = language_service.get_text(user_id, "stats_title")
-    today_stats = language_service.get_text(
-        user_id,
+    title = user_context.text("stats_title")
+    today_stats = user_context.text(
         "stats_today",
         stats["requests_today"],
         stats["daily_limit"],
         stats["remaining_requests"],
     )
-    total_stats = language_service.get_text(
-        user_id, "stats_total", stats["total_requests"]
-    )
-    reset_info = language_service.get_text(
-        user_id, "stats_reset", stats["reset_time"].strftime("%d.%m.%Y в %H:%M")
-    )
-    limit_info = language_service.get_text(
-        user_id, "stats_limit_info", stats["daily_limit"]
+    total_stats = user_context.text("stats_total", stats["total_requests"])
+    reset_info = user_context.text(
+        "stats_reset", stats["reset_time"].strftime("%d.%m.%Y в %H:%M")
     )
+    limit_info = user_context.text("stats_limit_info", stats["daily_limit"])
 
     stats_text = (
         f"{title}\n\n{today_stats}\n\n{total_stats}\n\n{reset_info}\n\n{limit_info}"
@@ -74,3 +64,32 @@ async def stats_command(message: Message):
     await message.answer(
         stats_text, reply_markup=get_back_menu(user_id), parse_mode="HTML"
     )
+
+
+@router.message(F.text == "/admin_stats", F.from_user.id.in_(ADMIN_IDS))
+async def admin_stats_command(message: Message, user_context: UserContext):
+    """Глобальная статистика использования для администраторов"""
+    user_id = message.from_user.id
+    stats = await gemini_service.get_global_usage_stats()
+
+    title = user_context.text("admin_stats_title")
+    body = user_context.text(
+        "admin_stats_body",
+        stats["total_users"],
+        stats["requests_today_all_users"],
+        stats["total_requests_all_time"],
+        stats["daily_limit_per_user"],
+    )
+    cache = stats["cache"]
+    cache_info = user_context.text(
+        "admin_cache_stats",
+        cache["hits"],
+        cache["misses"],
+        f"{cache['hit_rate']:.0%}",
+        cache["entries"],
+        cache["bytes"] // 1024,
+    )
+
+    await message.answer(
+        f"{title}\n\n{body}\n\n{cache_info}", reply_markup=get_back_menu(user_id), parse_mode="HTML"
+    )
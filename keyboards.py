@@ -1,26 +1,28 @@
+from collections import OrderedDict
+from typing import Tuple
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
+from services.i18n import Catalog
 from services.language_service import LanguageService
 
 language_service = LanguageService()
 
+CONFIRM_MENU_CACHE_SIZE = 1000
 
-def get_language_selection_menu() -> InlineKeyboardMarkup:
-    """Меню выбора языка"""
+
+def _language_selection_menu() -> InlineKeyboardMarkup:
+    buttons = [
+        InlineKeyboardButton(
+            text=catalog("language_name"), callback_data=f"lang_{language}"
+        )
+        for language, catalog in language_service.catalogs.items()
+    ]
     keyboard = InlineKeyboardMarkup(
-        inline_keyboard=[
-            [
-                InlineKeyboardButton(text="🇷🇺 Русский", callback_data="lang_ru"),
-                InlineKeyboardButton(text="🇺🇸 English", callback_data="lang_en"),
-            ]
-        ]
+        inline_keyboard=[buttons[i : i + 2] for i in range(0, len(buttons), 2)]
     )
     return keyboard
 
 
-def get_main_menu(user_id: int) -> InlineKeyboardMarkup:
-    """Главное меню бота"""
-    _ = lambda key: language_service.get_text(user_id, key)
-
+def _main_menu(_: Catalog) -> InlineKeyboardMarkup:
     keyboard = InlineKeyboardMarkup(
         inline_keyboard=[
             [
@@ -52,10 +54,7 @@ def get_main_menu(user_id: int) -> InlineKeyboardMarkup:
     return keyboard
 
 
-def get_back_menu(user_id: int) -> InlineKeyboardMarkup:
-    """Кнопка возврата в главное меню"""
-    _ = lambda key: language_service.get_text(user_id, key)
-
+def _back_menu(_: Catalog) -> InlineKeyboardMarkup:
     keyboard = InlineKeyboardMarkup(
         inline_keyboard=[
             [InlineKeyboardButton(text=_("btn_back"), callback_data="main_menu")]
@@ -64,10 +63,7 @@ def get_back_menu(user_id: int) -> InlineKeyboardMarkup:
     return keyboard
 
 
-def get_processing_menu(user_id: int) -> InlineKeyboardMarkup:
-    """Меню во время обработки"""
-    _ = lambda key: language_service.get_text(user_id, key)
-
+def _processing_menu(_: Catalog) -> InlineKeyboardMarkup:
     keyboard = InlineKeyboardMarkup(
         inline_keyboard=[
             [InlineKeyboardButton(text=_("btn_cancel"), callback_data="cancel")]
@@ -76,10 +72,7 @@ def get_processing_menu(user_id: int) -> InlineKeyboardMarkup:
     return keyboard
 
 
-def get_result_menu(user_id: int) -> InlineKeyboardMarkup:
-    """Меню с результатом обработки"""
-    _ = lambda key: language_service.get_text(user_id, key)
-
+def _result_menu(_: Catalog) -> InlineKeyboardMarkup:
     keyboard = InlineKeyboardMarkup(
         inline_keyboard=[
             [
@@ -99,37 +92,190 @@ def get_result_menu(user_id: int) -> InlineKeyboardMarkup:
     return keyboard
 
 
-def get_publish_confirm_menu(user_id: int, channel_name: str) -> InlineKeyboardMarkup:
-    """Меню подтверждения публикации"""
-    _ = lambda key: language_service.get_text(user_id, key)
+def _publish_success_menu(_: Catalog) -> InlineKeyboardMarkup:
+    keyboard = InlineKeyboardMarkup(
+        inline_keyboard=[
+            [
+                InlineKeyboardButton(
+                    text=_("btn_process_again"), callback_data="process_again"
+                )
+            ]
+        ]
+    )
+    return keyboard
+
 
+def _publish_confirm_menu(_: Catalog, channel_name: str) -> InlineKeyboardMarkup:
     keyboard = InlineKeyboardMarkup(
         inline_keyboard=[
             [
                 InlineKeyboardButton(
-                    text=_("publish_confirm").format(channel_name),
+                    text=_("publish_confirm", channel_name),
                     callback_data="confirm_publish",
                 ),
                 InlineKeyboardButton(
                     text=_("publish_cancel"), callback_data="cancel_publish"
                 ),
             ],
+            [InlineKeyboardButton(text=_("btn_schedule"), callback_data="schedule_publish")],
             [InlineKeyboardButton(text=_("btn_back"), callback_data="main_menu")],
         ]
     )
     return keyboard
 
 
+_STATIC_MENUS = {
+    "main": _main_menu,
+    "back": _back_menu,
+    "processing": _processing_menu,
+    "result": _result_menu,
+    "publish_success": _publish_success_menu,
+}
+
+
+class KeyboardCache:
+    """Готовые клавиатуры для каждого языка.
+
+    Разметка aiogram неизменяема, поэтому один экземпляр можно отдавать
+    во все ответы. Клавиатуры, зависящие только от языка, собираются
+    при запуске; меню подтверждения зависит еще и от названия канала и
+    хранится в LRU на CONFIRM_MENU_CACHE_SIZE записей.
+    """
+
+    def __init__(self):
+        self.language_selection = _language_selection_menu()
+        self._static = {
+            (language, name): build(catalog)
+            for language, catalog in language_service.catalogs.items()
+            for name, build in _STATIC_MENUS.items()
+        }
+        self._confirm: "OrderedDict[Tuple[str, str], InlineKeyboardMarkup]" = OrderedDict()
+
+    def get(self, name: str, user_id: int) -> InlineKeyboardMarkup:
+        """Клавиатура name на языке пользователя"""
+        return self._static[(language_service.for_user(user_id).language, name)]
+
+    def publish_confirm(self, user_id: int, channel_name: str) -> InlineKeyboardMarkup:
+        """Меню подтверждения публикации в канал channel_name"""
+        catalog = language_service.for_user(user_id)
+        key = (catalog.language, channel_name)
+
+        keyboard = self._confirm.get(key)
+        if keyboard is not None:
+            self._confirm.move_to_end(key)
+            return keyboard
+
+        keyboard = self._confirm[key] = _publish_confirm_menu(catalog, channel_name)
+        if len(self._confirm) > CONFIRM_MENU_CACHE_SIZE:
+            self._confirm.popitem(last=False)
+        return keyboard
+
+
+keyboard_cache = KeyboardCache()
+
+
+def get_language_selection_menu() -> InlineKeyboardMarkup:
+    """Меню выбора языка"""
+    return keyboard_cache.language_selection
+
+
+def get_main_menu(user_id: int) -> InlineKeyboardMarkup:
+    """Главное меню бота"""
+    return keyboard_cache.get("main", user_id)
+
+
+def get_back_menu(user_id: int) -> InlineKeyboardMarkup:
+    """Кнопка возврата в главное меню"""
+    return keyboard_cache.get("back", user_id)
+
+
+def get_processing_menu(user_id: int) -> InlineKeyboardMarkup:
+    """Меню во время обработки"""
+    return keyboard_cache.get("processing", user_id)
+
+
+def get_result_menu(user_id: int) -> InlineKeyboardMarkup:
+    """Меню с результатом обработки"""
+    return keyboard_cache.get("result", user_id)
+
+
+def get_publish_confirm_menu(user_id: int, channel_name: str) -> InlineKeyboardMarkup:
+    """Меню подтверждения публикации"""
+    return keyboard_cache.publish_confirm(user_id, channel_name)
+
+
 def get_publish_success_menu(user_id: int) -> InlineKeyboardMarkup:
     """Меню после успешной публикации"""
-    _ = lambda key: language_service.get_text(user_id, key)
+    return keyboard_cache.get("publish_success", user_id)
+
+
+def get_saved_channels_menu(user_id: int, channels: list) -> InlineKeyboardMarkup:
+    """Недавние каналы для публикации в одно касание"""
+    _ = language_service.for_user(user_id)
 
     keyboard = InlineKeyboardMarkup(
         inline_keyboard=[
             [
                 InlineKeyboardButton(
-                    text=_("btn_process_again"), callback_data="process_again"
+                    text=f"📢 {channel['title'] or channel['username'] or channel['id']}",
+                    callback_data=f"publish_to:{channel['id']}",
                 )
             ]
+            for channel in channels
         ]
+        + (
+            [[InlineKeyboardButton(text=_("btn_publish_multi"), callback_data="publish_multi")]]
+            if len(channels) > 1
+            else []
+        )
+        + [[InlineKeyboardButton(text=_("btn_back"), callback_data="main_menu")]]
     )
+    return keyboard
+
+
+def get_channels_selection_menu(
+    user_id: int, channels: list, selected: list
+) -> InlineKeyboardMarkup:
+    """Выбор нескольких каналов для публикации"""
+    _ = language_service.for_user(user_id)
+
+    keyboard = InlineKeyboardMarkup(
+        inline_keyboard=[
+            [
+                InlineKeyboardButton(
+                    text=f"{'✅' if str(channel['id']) in selected else '⬜'} "
+                    f"{channel['title'] or channel['username'] or channel['id']}",
+                    callback_data=f"publish_toggle:{channel['id']}",
+                )
+            ]
+            for channel in channels
+        ]
+        + [
+            [
+                InlineKeyboardButton(
+                    text=_("btn_publish_selected", len(selected)),
+                    callback_data="publish_selected",
+                )
+            ],
+            [InlineKeyboardButton(text=_("btn_back"), callback_data="main_menu")],
+        ]
+    )
+    return keyboard
+
+
+def get_scheduled_posts_menu(user_id: int, entries: list) -> InlineKeyboardMarkup:
+    """Запланированные публикации с кнопками отмены"""
+    _ = language_service.for_user(user_id)
+
+    keyboard = InlineKeyboardMarkup(
+        inline_keyboard=[
+            [
+                InlineKeyboardButton(
+                    text=f"🗑 {title}", callback_data=f"schedule_cancel:{job_id}"
+                )
+            ]
+            for job_id, title in entries
+        ]
+        + [[InlineKeyboardButton(text=_("btn_back"), callback_data="main_menu")]]
+    )
+    return keyboard
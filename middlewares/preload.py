@@ -0,0 +1,37 @@
+from typing import Any, Awaitable, Callable, Dict
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, User
+from services.ai_service import GeminiService
+from services.language_service import LanguageService
+from services.user_context import UserContext
+
+language_service = LanguageService()
+gemini_service = GeminiService()
+
+
+class UserPreloadMiddleware(BaseMiddleware):
+    """Загружает данные пользователя из хранилища до вызова обработчиков,
+    чтобы синхронные get_text и клавиатуры работали из памяти.
+
+    Обработчики получают UserContext аргументом user_context; измененные
+    в нем поля сохраняются после обработки обновления.
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        user: User = data.get("event_from_user")
+        if user is None:
+            return await handler(event, data)
+
+        await language_service.load_user(user.id)
+        context = UserContext(user.id, gemini_service.rate_limiter)
+        data["user_context"] = context
+
+        try:
+            return await handler(event, data)
+        finally:
+            await context.save()
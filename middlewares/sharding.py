@@ -0,0 +1,35 @@
+from typing import Any, Awaitable, Callable, Dict
+from aiogram import BaseMiddleware
+from aiogram.types import Chat, TelegramObject, Update, User
+from utils.supervisor import Supervisor
+
+
+class ShardingMiddleware(BaseMiddleware):
+    """Передает обновления процессам-обработчикам вместо локальной обработки.
+
+    Ключ распределения - пользователь, а для обновлений без пользователя -
+    чат, так что все обновления одного пользователя попадают в один процесс.
+    """
+
+    def __init__(self, supervisor: Supervisor):
+        self.supervisor = supervisor
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: Dict[str, Any],
+    ) -> Any:
+        user: User = data.get("event_from_user")
+        chat: Chat = data.get("event_chat")
+
+        if user is not None:
+            shard_key = user.id
+        elif chat is not None:
+            shard_key = chat.id
+        else:
+            shard_key = event.update_id
+
+        self.supervisor.dispatch(
+            shard_key, event.model_dump(mode="json", exclude_unset=True)
+        )
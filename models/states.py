@@ -15,6 +15,7 @@ class EditStates(StatesGroup):
 class PublishStates(StatesGroup):
     waiting_for_channel = State()
     confirming_publish = State()
+    waiting_for_schedule_time = State()
     publishing = State()
 
 
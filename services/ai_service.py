@@ -1,10 +1,313 @@
+import asyncio
+import heapq
+import itertools
+import random
+import time
+from contextlib import asynccontextmanager
 import google.generativeai as genai
-from config import GEMINI_API_KEY, GEMINI_MODEL, DAILY_REQUESTS_LIMIT
+from google.api_core import exceptions as google_exceptions
+from config import (
+    GEMINI_API_KEY,
+    GEMINI_MODEL,
+    DAILY_REQUESTS_LIMIT,
+    GEMINI_MAX_CONCURRENCY,
+    GEMINI_REQUEST_TIMEOUT,
+    GEMINI_RPM,
+    GEMINI_TPM,
+    GEMINI_MAX_QUEUE,
+    GEMINI_MAX_RETRIES,
+    GEMINI_RETRY_BASE_DELAY,
+    GEMINI_OUTPUT_TOKENS_ESTIMATE,
+    QUEUE_NOTIFY_INTERVAL,
+    QUEUE_NOTIFY_CONCURRENCY,
+    ADMIN_IDS,
+)
 import logging
-from .rate_limiter import RateLimiter
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, TypeVar
+from .rate_limiter import QuotaReservation, RateLimiter
+from .response_cache import ResponseCache, cache_key
+from .prompts import prompt_registry
+from .user_context import UserContext
 
 logger = logging.getLogger(__name__)
 
+T = TypeVar("T")
+
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 1
+PRIORITY_LOW = 2
+
+# Ошибки Gemini, после которых запрос имеет смысл повторить
+RETRYABLE_ERRORS = (
+    google_exceptions.ResourceExhausted,
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.InternalServerError,
+    google_exceptions.DeadlineExceeded,
+)
+
+QueuePositionCallback = Callable[[int], Awaitable[None]]
+
+BUSY_MESSAGE = "⏳ Сервис AI сейчас перегружен. Попробуйте через минуту."
+
+
+class QueueFullError(Exception):
+    """Очередь запросов к Gemini переполнена"""
+
+
+class _RateBucket:
+    """Корзина токенов для ограничения частоты в минуту"""
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.level = self.capacity
+        self.stamp = time.monotonic()
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Через сколько секунд в корзине будет amount токенов"""
+        self.level = min(self.capacity, self.level + (now - self.stamp) * self.rate)
+        self.stamp = now
+        amount = min(amount, self.capacity)
+        return 0.0 if self.level >= amount else (amount - self.level) / self.rate
+
+    def take(self, amount: float):
+        self.level -= min(amount, self.capacity)
+
+    def give_back(self, amount: float):
+        self.level = min(self.capacity, self.level + amount)
+
+
+class _Ticket:
+    """Допуск к Gemini; used_tokens уточняется по ответу модели"""
+
+    __slots__ = ("tokens", "used_tokens")
+
+    def __init__(self, tokens: int):
+        self.tokens = tokens
+        self.used_tokens: Optional[int] = None
+
+
+class _Waiter:
+    __slots__ = ("future", "tokens", "on_position", "position", "shown", "notify_at", "notifier")
+
+    def __init__(self, future, tokens: int, on_position: Optional[QueuePositionCallback]):
+        self.future = future
+        self.tokens = tokens
+        self.on_position = on_position
+        self.position = 0
+        # Последняя показанная позиция и когда можно показать следующую
+        self.shown = 0
+        self.notify_at = 0.0
+        self.notifier: Optional[asyncio.Task] = None
+
+
+class GeminiAdmission:
+    """Глобальный контроль нагрузки на Gemini.
+
+    Запрос допускается, когда есть свободный слот параллелизма и хватает
+    запросов и токенов в минутных корзинах (RPM/TPM). Остальные ждут в
+    очереди по приоритету и получают свою позицию через on_position.
+
+    Позиция показывается одному ожидающему не чаще notify_interval секунд
+    (в промежутке копится последняя), одновременно идет не больше
+    notify_concurrency уведомлений, а после RetryAfter от Telegram
+    уведомления приостанавливаются для всех.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int,
+        rpm: int,
+        tpm: int,
+        max_queue: int,
+        notify_interval: float = QUEUE_NOTIFY_INTERVAL,
+        notify_concurrency: int = QUEUE_NOTIFY_CONCURRENCY,
+    ):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.notify_interval = notify_interval
+        self._rpm = _RateBucket(rpm) if rpm > 0 else None
+        self._tpm = _RateBucket(tpm) if tpm > 0 else None
+        self._active = 0
+        self._waiters: List[tuple] = []
+        self._seq = itertools.count()
+        self._paused_until = 0.0
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._notify_slots = asyncio.Semaphore(max(1, notify_concurrency))
+        self._notify_paused_until = 0.0
+
+    def _wait_time(self, tokens: int, now: float) -> float:
+        delay = self._paused_until - now
+        if self._rpm is not None:
+            delay = max(delay, self._rpm.wait_time(1, now))
+        if self._tpm is not None:
+            delay = max(delay, self._tpm.wait_time(tokens, now))
+        return delay
+
+    def _dispatch(self):
+        """Допускает ожидающих, пока позволяют слоты и корзины"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        while self._waiters and self._active < self.max_concurrency:
+            waiter = self._waiters[0][2]
+            if waiter.future.done():
+                heapq.heappop(self._waiters)
+                continue
+
+            delay = self._wait_time(waiter.tokens, time.monotonic())
+            if delay > 0:
+                loop = asyncio.get_running_loop()
+                self._timer = loop.call_later(delay, self._dispatch)
+                break
+
+            heapq.heappop(self._waiters)
+            if self._rpm is not None:
+                self._rpm.take(1)
+            if self._tpm is not None:
+                self._tpm.take(waiter.tokens)
+            self._active += 1
+            waiter.future.set_result(None)
+
+        self._notify_positions()
+
+    def _notify_positions(self):
+        """Запоминает новые позиции ожидающих и планирует их показ"""
+        position = 0
+        for _, _, waiter in sorted(self._waiters):
+            if waiter.future.done():
+                continue
+            position += 1
+            waiter.position = position
+            if (
+                waiter.on_position is not None
+                and waiter.shown != position
+                and waiter.notifier is None
+            ):
+                waiter.notifier = asyncio.create_task(self._notify_waiter(waiter))
+
+    async def _notify_waiter(self, waiter: _Waiter):
+        """Показывает ожидающему последнюю позицию с учетом ограничений частоты"""
+        try:
+            while not waiter.future.done() and waiter.shown != waiter.position:
+                delay = max(waiter.notify_at, self._notify_paused_until) - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                    continue
+
+                async with self._notify_slots:
+                    # Пока ждали слот, запрос могли допустить или приостановить показ
+                    if waiter.future.done() or self._notify_paused_until > time.monotonic():
+                        continue
+
+                    position = waiter.position
+                    waiter.shown = position
+                    waiter.notify_at = time.monotonic() + self.notify_interval
+                    try:
+                        await waiter.on_position(position)
+                    except Exception as e:
+                        retry_after = getattr(e, "retry_after", None)
+                        if retry_after:
+                            waiter.shown = 0
+                            self._notify_paused_until = time.monotonic() + retry_after
+                            logger.warning(
+                                f"Telegram ограничил частоту, позиции в очереди "
+                                f"не показываются {retry_after} с"
+                            )
+                        else:
+                            logger.debug(f"Не удалось сообщить позицию в очереди: {e}")
+        finally:
+            waiter.notifier = None
+
+    @property
+    def queue_size(self) -> int:
+        return sum(1 for _, _, waiter in self._waiters if not waiter.future.done())
+
+    def pause(self, delay: float):
+        """Приостанавливает допуск новых запросов (после 429 от Gemini)"""
+        self._paused_until = max(self._paused_until, time.monotonic() + delay)
+
+    @asynccontextmanager
+    async def slot(
+        self,
+        tokens: int,
+        priority: int = PRIORITY_NORMAL,
+        on_position: Optional[QueuePositionCallback] = None,
+    ):
+        """Ждет допуска к Gemini и удерживает слот на время запроса"""
+        if self.queue_size >= self.max_queue:
+            raise QueueFullError()
+
+        future = asyncio.get_running_loop().create_future()
+        waiter = _Waiter(future, tokens, on_position)
+        heapq.heappush(self._waiters, (priority, next(self._seq), waiter))
+        self._dispatch()
+
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self._release(tokens, None)
+            else:
+                self._dispatch()
+            raise
+
+        ticket = _Ticket(tokens)
+        try:
+            yield ticket
+        finally:
+            self._release(ticket.tokens, ticket.used_tokens)
+
+    def _release(self, tokens: int, used_tokens: Optional[int]):
+        self._active -= 1
+        if self._tpm is not None and used_tokens is not None:
+            self._tpm.give_back(tokens - used_tokens)
+        self._dispatch()
+
+
+class _Flight:
+    """Идущая генерация, ответ которой разделяют одинаковые запросы"""
+
+    __slots__ = ("parts", "done", "error", "task", "subscribers", "changed")
+
+    def __init__(self):
+        self.parts: List[str] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.task: Optional[asyncio.Task] = None
+        self.subscribers = 0
+        self.changed = asyncio.Event()
+
+    def _wake(self):
+        changed, self.changed = self.changed, asyncio.Event()
+        changed.set()
+
+    def publish(self, part: str):
+        self.parts.append(part)
+        self._wake()
+
+    def finish(self, error: Optional[BaseException]):
+        self.done = True
+        self.error = error
+        self._wake()
+
+
+def _estimate_tokens(prompt: str) -> int:
+    """Грубая оценка токенов запроса вместе с ответом"""
+    return len(prompt) // 4 + GEMINI_OUTPUT_TOKENS_ESTIMATE
+
+
+def _used_tokens(response) -> Optional[int]:
+    """Фактический расход токенов по метаданным ответа"""
+    usage = getattr(response, "usage_metadata", None)
+    return getattr(usage, "total_token_count", None) or None
+
+
+def _backoff_delay(attempt: int) -> float:
+    """Экспоненциальная задержка с полным джиттером"""
+    return random.uniform(0, GEMINI_RETRY_BASE_DELAY * 2**attempt)
+
 
 class GeminiService:
     _instance = None
@@ -21,169 +324,377 @@ class GeminiService:
         genai.configure(api_key=GEMINI_API_KEY)
         self.model = genai.GenerativeModel(GEMINI_MODEL)
         self.rate_limiter = RateLimiter(daily_limit=DAILY_REQUESTS_LIMIT)
+        self.admission = GeminiAdmission(
+            GEMINI_MAX_CONCURRENCY, GEMINI_RPM, GEMINI_TPM, GEMINI_MAX_QUEUE
+        )
+        self.cache = ResponseCache()
+        self._generations: Dict[int, asyncio.Task] = {}
+        self._flights: Dict[str, _Flight] = {}
         self._initialized = True
 
+    async def start(self):
+        """Загружает счетчики запросов и кэш ответов"""
+        await self.rate_limiter.start()
+        await self.cache.start()
+
+    async def close(self):
+        """Сохраняет счетчики запросов"""
+        await self.rate_limiter.close()
+
+    @staticmethod
+    def _priority(user_id: int) -> int:
+        return PRIORITY_HIGH if user_id in ADMIN_IDS else PRIORITY_NORMAL
+
+    def _on_retryable_error(self, error: Exception, attempt: int) -> float:
+        """Логирует ошибку Gemini и возвращает задержку перед повтором"""
+        delay = _backoff_delay(attempt)
+        if isinstance(error, google_exceptions.ResourceExhausted):
+            self.admission.pause(delay)
+
+        logger.warning(
+            f"Gemini вернул ошибку ({error}), повтор {attempt + 1}/{GEMINI_MAX_RETRIES} через {delay:.1f} с"
+        )
+        return delay
+
+    async def _generate(
+        self,
+        prompt: str,
+        priority: int = PRIORITY_NORMAL,
+        on_position: Optional[QueuePositionCallback] = None,
+    ):
+        """Асинхронный запрос к Gemini через контроль нагрузки с повторами"""
+        tokens = _estimate_tokens(prompt)
+
+        for attempt in itertools.count():
+            try:
+                async with self.admission.slot(tokens, priority, on_position) as ticket:
+                    response = await asyncio.wait_for(
+                        self.model.generate_content_async(prompt),
+                        timeout=GEMINI_REQUEST_TIMEOUT,
+                    )
+                    ticket.used_tokens = _used_tokens(response)
+                    return response
+
+            except RETRYABLE_ERRORS as e:
+                if attempt >= GEMINI_MAX_RETRIES:
+                    raise
+                await asyncio.sleep(self._on_retryable_error(e, attempt))
+
+    def _limit_exceeded_message(self, user_data: Dict[str, Any]) -> str:
+        """Формирует сообщение о превышении дневного лимита"""
+        remaining_time = self.rate_limiter.reset_time(user_data)
+        remaining_requests = self.rate_limiter.remaining(user_data)
+        return (
+            f"❌ Превышен ваш лимит запросов к AI ({self.rate_limiter.daily_limit} запросов).\n\n"
+            f"Лимит обновится: {remaining_time.strftime('%d.%m.%Y в %H:%M')}\n\n"
+            f"Осталось запросов: {remaining_requests}"
+        )
+
+    async def _complete_upstream(
+        self,
+        prompt: str,
+        user_id: int,
+        on_queue_position: Optional[QueuePositionCallback],
+    ) -> AsyncIterator[str]:
+        """Обычный запрос к Gemini, ответ отдается одной частью"""
+        response = await self._generate(
+            prompt, self._priority(user_id), on_queue_position
+        )
+
+        if response.text:
+            yield response.text.strip()
+
+    async def _stream_upstream(
+        self,
+        prompt: str,
+        user_id: int,
+        on_queue_position: Optional[QueuePositionCallback],
+    ) -> AsyncIterator[str]:
+        """Потоковый запрос к Gemini с повторами до получения первой части"""
+        tokens = _estimate_tokens(prompt)
+        priority = self._priority(user_id)
+        received = False
+
+        for attempt in itertools.count():
+            try:
+                async with self.admission.slot(
+                    tokens, priority, on_queue_position
+                ) as ticket:
+                    response = await asyncio.wait_for(
+                        self.model.generate_content_async(prompt, stream=True),
+                        timeout=GEMINI_REQUEST_TIMEOUT,
+                    )
+                    chunks = response.__aiter__()
+
+                    while True:
+                        try:
+                            chunk = await asyncio.wait_for(
+                                anext(chunks), timeout=GEMINI_REQUEST_TIMEOUT
+                            )
+                        except StopAsyncIteration:
+                            break
+
+                        if chunk.text:
+                            received = True
+                            yield chunk.text
+
+                    ticket.used_tokens = _used_tokens(response)
+                break
+
+            except RETRYABLE_ERRORS as e:
+                # После начала вывода повторять запрос уже нельзя
+                if received or attempt >= GEMINI_MAX_RETRIES:
+                    raise
+                await asyncio.sleep(self._on_retryable_error(e, attempt))
+
+    async def _join_flight(
+        self,
+        text: str,
+        task_type: str,
+        user_id: int,
+        language_code: str,
+        on_queue_position: Optional[QueuePositionCallback],
+        fresh: bool,
+        stream: bool,
+        user_context: Optional[UserContext] = None,
+    ) -> AsyncIterator[str]:
+        """Отдает ответ из кэша, из уже идущей генерации или запускает новую.
+
+        Одинаковые одновременные запросы разделяют одну генерацию и не
+        расходуют квоту повторно. Генерация, которую больше никто не ждет,
+        отменяется. Если квота исчерпана, отдает сообщение об этом.
+        """
+        template = prompt_registry.get(task_type, language_code, user_id)
+        key = cache_key(text, template.tag, template.language)
+        if not fresh:
+            cached = await self.cache.get(key)
+            if cached is not None:
+                yield cached
+                return
+
+        flight_key = f"{key}:fresh" if fresh else key
+        flight = self._flights.get(flight_key)
+
+        if flight is None:
+            # Слот квоты занят до конца генерации: параллельные запросы
+            # пользователя не превысят лимит, а неудачный будет возвращен
+            reservation = await self.rate_limiter.reserve(user_id)
+            if user_context is not None:
+                user_context.update_usage(reservation.user_data)
+            if not reservation:
+                yield self._limit_exceeded_message(reservation.user_data)
+                return
+
+            # Пока шло резервирование, такую же генерацию мог запустить другой запрос
+            flight = self._flights.get(flight_key)
+            if flight is None:
+                prompt = template.render(text)
+                logger.debug(f"Генерация для пользователя {user_id} по промпту {template.tag}")
+                upstream = self._stream_upstream if stream else self._complete_upstream
+                flight = _Flight()
+                flight.task = asyncio.create_task(
+                    self._drive_flight(
+                        flight_key,
+                        flight,
+                        key,
+                        upstream(prompt, user_id, on_queue_position),
+                        reservation,
+                    )
+                )
+                self._flights[flight_key] = flight
+            else:
+                await reservation.release()
+                logger.info(f"Запрос пользователя {user_id} присоединен к идущей генерации")
+        else:
+            logger.info(f"Запрос пользователя {user_id} присоединен к идущей генерации")
+
+        flight.subscribers += 1
+        try:
+            index = 0
+            while True:
+                while index < len(flight.parts):
+                    yield flight.parts[index]
+                    index += 1
+                if flight.done:
+                    break
+                await flight.changed.wait()
+
+            if flight.error is not None:
+                raise flight.error
+        finally:
+            flight.subscribers -= 1
+            if flight.subscribers == 0 and not flight.done:
+                logger.info("Генерацию больше никто не ждет, она отменяется")
+                if self._flights.get(flight_key) is flight:
+                    del self._flights[flight_key]
+                flight.task.cancel()
+
+    async def _drive_flight(
+        self,
+        flight_key: str,
+        flight: "_Flight",
+        key: str,
+        chunks: AsyncIterator[str],
+        reservation: QuotaReservation,
+    ):
+        """Получает ответ Gemini и раздает его части всем ожидающим.
+
+        Слот квоты подтверждается, если модель успела что-то ответить
+        (частичный ответ тоже оплачен), иначе возвращается пользователю.
+        """
+        try:
+            async for chunk in chunks:
+                flight.publish(chunk)
+        except asyncio.CancelledError:
+            flight.finish(None)
+            raise
+        except Exception as e:
+            flight.finish(e)
+        else:
+            flight.finish(None)
+            if flight.parts:
+                await self.cache.set(key, "".join(flight.parts).strip())
+        finally:
+            if self._flights.get(flight_key) is flight:
+                del self._flights[flight_key]
+            if flight.parts:
+                reservation.commit()
+            else:
+                await reservation.release()
+
     async def improve_post(
         self,
         text: str,
         task_type: str = "improve",
         user_id: int = None,
         language_code: str = "ru",
+        on_queue_position: Optional[QueuePositionCallback] = None,
+        fresh: bool = False,
+        user_context: Optional[UserContext] = None,
     ) -> str:
-        """Создает/Улучшает пост с помощью Gemini AI"""
+        """Создает/Улучшает пост с помощью Gemini AI.
+
+        Готовый ответ на такой же запрос берется из кэша и не расходует
+        квоту; fresh=True запрашивает у модели новый вариант.
+        """
 
         if user_id is None:
             return "❌ Ошибка: не указан ID пользователя"
 
-        if not self.rate_limiter.can_make_request(user_id):
-            remaining_time = self.rate_limiter.get_reset_time()
-            remaining_requests = self.rate_limiter.get_remaining_requests(user_id)
-            return (
-                f"❌ Превышен ваш дневной лимит запросов к AI ({DAILY_REQUESTS_LIMIT} запросов в сутки).\n\n"
-                f"Лимит обновится: {remaining_time.strftime('%d.%m.%Y в %H:%M')}\n\n"
-                f"Осталось запросов: {remaining_requests}"
-            )
-
         try:
-            prompts_ru = {
-                "improve": """Ты - профессиональный редактор контента для Telegram. 
-                Улучши этот пост:
-                - Исправь грамматические и орфографические ошибки
-                - Улучши структуру и читаемость
-                - Добавь эмодзи где уместно
-                - Сохрани основную идею и тон
-                - Адаптируй под формат Telegram
-                
-                Исходный текст:""",
-                "fix_errors": """Исправь все ошибки в этом тексте:
-                - Орфографические ошибки
-                - Грамматические ошибки  
-                - Пунктуационные ошибки
-                - Стилистические неточности
-                
-                Текст для исправления:""",
-                "make_engaging": """Сделай этот пост более вовлекающим:
-                - Добавь призыв к действию
-                - Используй эмодзи для привлечения внимания
-                - Сделай текст более эмоциональным
-                - Добавь интригу или вопросы к аудитории
-                
-                Исходный пост:""",
-                "shorten": """Сократи этот текст, сохранив главную мысль:
-                - Убери лишние слова и повторы
-                - Сделай текст более лаконичным
-                - Сохрани ключевую информацию
-                
-                Текст для сокращения:""",
-                "expand": """Расширь этот текст, добавив полезные детали:
-                - Добавь больше информации по теме
-                - Приведи примеры или факты
-                - Сделай контент более информативным
-                
-                Текст для расширения:""",
-                "create": """Создай интересный и вовлекающий пост для Telegram на заданную тему:
-                - Сделай пост информативным и полезным
-                - Добавь эмодзи для привлечения внимания
-                - Используй структуру с заголовком, основным текстом и призывом к действию
-                - Адаптируй под формат Telegram (короткие абзацы, читаемость)
-                - Добавь хештеги если уместно
-                
-                Тема для поста:""",
-                "analyze": """Проанализируй этот Telegram-пост и дай рекомендации по улучшению:
-                - Оцени читаемость и структуру
-                - Предложи улучшения для вовлечения
-                - Укажи на возможные ошибки
-                - Дай советы по оформлению для Telegram
-                
-                Пост для анализа:""",
-            }
-
-            prompts_en = {
-                "improve": """You are a professional content editor for Telegram.
-            Improve this post:
-            - Correct grammar and spelling mistakes
-            - Improve structure and readability
-            - Add emojis where appropriate
-            - Preserve the main idea and tone
-            - Adapt to Telegram format
-
-            Original text:""",
-                "fix_errors": """Correct all errors in this text:
-            - Spelling errors
-            - Grammar errors
-            - Punctuation errors
-            - Stylistic inconsistencies
-
-            Text to correct:""",
-                "make_engaging": """Make this post more engaging:
-            - Add a call to action
-            - Use emojis to attract attention
-            - Make the text more emotional
-            - Add intrigue or questions for the audience
-
-            Original post:""",
-                "shorten": """Shorten this text while keeping the main idea:
-            - Remove unnecessary words and repetitions
-            - Make the text more concise
-            - Preserve key information
-
-            Text to shorten:""",
-                "expand": """Expand this text by adding useful details:
-            - Add more information on the topic
-            - Provide examples or facts
-            - Make the content more informative
-
-            Text to expand:""",
-                "create": """Create an interesting and engaging Telegram post on the given topic:
-            - Make the post informative and useful
-            - Add emojis to attract attention
-            - Use a structure with a headline, main text, and call to action
-            - Adapt to Telegram format (short paragraphs, readability)
-            - Add hashtags if appropriate
-
-            Topic for the post:""",
-                "analyze": """Analyze this Telegram post and provide recommendations for improvement:
-            - Assess readability and structure
-            - Suggest improvements for engagement
-            - Point out possible mistakes
-            - Give tips on formatting for Telegram
-
-            Post for analysis:""",
-            }
-
-            prompts = prompts_ru if language_code.startswith("ru") else prompts_en
-
-            if language_code.startswith("ru"):
-                html_instructions = """
-                - Не используй Markdown-заголовки (##, ###, **, * и т.д.)
-                - Просто выдай обычный текст без спецформатирования
-                """
-            else:
-                html_instructions = """
-                - Do not use Markdown headers (##, ###, **, *, etc.)
-                - Just provide plain text without special formatting
-                """
-
-            prompt = prompts.get(task_type, prompts["improve"])
-            full_prompt = f"{prompt}\n\n{text}\n{html_instructions}"
+            parts = [
+                part
+                async for part in self._join_flight(
+                    text,
+                    task_type,
+                    user_id,
+                    language_code,
+                    on_queue_position,
+                    fresh,
+                    stream=False,
+                    user_context=user_context,
+                )
+            ]
 
-            response = self.model.generate_content(full_prompt)
-
-            self.rate_limiter.increment_request_count(user_id)
-
-            if response.text:
-                return response.text.strip()
+            if parts:
+                return "".join(parts).strip()
             else:
                 return "Извините, не удалось обработать ваш запрос. Попробуйте еще раз."
 
+        except asyncio.TimeoutError:
+            logger.error(
+                f"Превышено время ожидания ответа Gemini ({GEMINI_REQUEST_TIMEOUT} с)"
+            )
+            return "Сервис AI не ответил вовремя. Попробуйте позже."
+
+        except (QueueFullError, google_exceptions.ResourceExhausted):
+            logger.error("Gemini перегружен, запрос отклонен")
+            return BUSY_MESSAGE
+
         except Exception as e:
             logger.error(f"Ошибка при обращении к Gemini API: {e}")
             return "Произошла ошибка при обработке текста. Попробуйте позже."
 
-    def get_user_usage_stats(self, user_id: int) -> dict:
+    async def stream_post(
+        self,
+        text: str,
+        task_type: str = "improve",
+        user_id: int = None,
+        language_code: str = "ru",
+        on_queue_position: Optional[QueuePositionCallback] = None,
+        fresh: bool = False,
+        user_context: Optional[UserContext] = None,
+    ) -> AsyncIterator[str]:
+        """Создает/Улучшает пост, отдавая текст частями по мере генерации"""
+
+        if user_id is None:
+            yield "❌ Ошибка: не указан ID пользователя"
+            return
+
+        received = False
+
+        try:
+            async for part in self._join_flight(
+                text,
+                task_type,
+                user_id,
+                language_code,
+                on_queue_position,
+                fresh,
+                stream=True,
+                user_context=user_context,
+            ):
+                received = True
+                yield part
+
+        except (QueueFullError, google_exceptions.ResourceExhausted):
+            if received:
+                raise
+            logger.error("Gemini перегружен, запрос отклонен")
+            yield BUSY_MESSAGE
+            return
+
+        except Exception as e:
+            logger.error(f"Ошибка потоковой генерации Gemini: {e}")
+            raise
+
+        if not received:
+            yield "Извините, не удалось обработать ваш запрос. Попробуйте еще раз."
+
+    async def run_generation(self, user_id: int, coro: Awaitable[T]) -> Optional[T]:
+        """Выполняет генерацию как задачу, которую пользователь может отменить.
+
+        Возвращает None, если генерация была отменена через cancel_generation.
+        """
+        task = asyncio.ensure_future(coro)
+        self._generations[user_id] = task
+
+        try:
+            return await task
+        except asyncio.CancelledError:
+            if task.cancelled() and not asyncio.current_task().cancelling():
+                logger.info(f"Генерация для пользователя {user_id} отменена")
+                return None
+            raise
+        finally:
+            if self._generations.get(user_id) is task:
+                del self._generations[user_id]
+
+    def cancel_generation(self, user_id: int) -> bool:
+        """Отменяет текущую генерацию пользователя, если она есть"""
+        task = self._generations.get(user_id)
+        if task is None or task.done():
+            return False
+
+        task.cancel()
+        return True
+
+    async def get_user_usage_stats(self, user_id: int) -> dict:
         """Возвращает статистику использования API для пользователя"""
-        return self.rate_limiter.get_user_stats(user_id)
+        return await self.rate_limiter.get_user_stats(user_id)
 
-    def get_global_usage_stats(self) -> dict:
+    async def get_global_usage_stats(self) -> dict:
         """Возвращает глобальную статистику использования API"""
-        return self.rate_limiter.get_global_stats()
+        stats = await self.rate_limiter.get_global_stats()
+        stats["cache"] = self.cache.get_stats()
+        return stats
@@ -1,16 +1,120 @@
+import asyncio
 import logging
-from typing import Optional, Dict, Any
+import time
+from typing import Optional, Dict, Any, List, Tuple, Union
 from aiogram import Bot
-from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError
+from aiogram.exceptions import (
+    TelegramAPIError,
+    TelegramBadRequest,
+    TelegramForbiddenError,
+    TelegramNetworkError,
+    TelegramRetryAfter,
+)
+from config import (
+    CHANNEL_CACHE_TTL,
+    PUBLISH_CONCURRENCY,
+    PUBLISH_GLOBAL_RATE,
+    PUBLISH_CHAT_INTERVAL,
+    PUBLISH_MAX_RETRIES,
+    PUBLISH_MAX_RETRY_AFTER,
+)
 
 logger = logging.getLogger(__name__)
 
 
+def _cache_key(chat_id: Union[str, int]) -> str:
+    """Ключ кэша: числовой id или @username без учета регистра"""
+    chat_id = str(chat_id).strip()
+    return chat_id.lower() if chat_id.startswith("@") else chat_id
+
+
+class FloodControl:
+    """Темп отправки сообщений с учетом ограничений Telegram.
+
+    В сумме не больше global_rate сообщений в секунду и не чаще одного
+    сообщения в chat_interval секунд в каждый чат. После RetryAfter чат
+    откладывается на указанное Telegram время.
+    """
+
+    def __init__(self, global_rate: float, chat_interval: float):
+        self.global_interval = 1 / global_rate if global_rate > 0 else 0.0
+        self.chat_interval = chat_interval
+        self._next_global = 0.0
+        self._next_chat: Dict[str, float] = {}
+
+    async def wait(self, chat_id: str):
+        """Дожидается момента, когда в чат можно отправить сообщение"""
+        loop = asyncio.get_running_loop()
+        key = _cache_key(chat_id)
+
+        while True:
+            delay = self._next_chat.get(key, 0.0) - loop.time()
+            if delay <= 0:
+                break
+            await asyncio.sleep(delay)
+
+        # Время отправки резервируется сразу, без ожидания между проверкой и записью
+        now = loop.time()
+        slot = max(now, self._next_global)
+        self._next_global = slot + self.global_interval
+        self._next_chat[key] = slot + self.chat_interval
+        self._forget_expired(now)
+
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+    def penalize(self, chat_id: str, delay: float):
+        """Откладывает отправку в чат после RetryAfter"""
+        key = _cache_key(chat_id)
+        until = asyncio.get_running_loop().time() + delay
+        self._next_chat[key] = max(self._next_chat.get(key, 0.0), until)
+
+    def _forget_expired(self, now: float):
+        if len(self._next_chat) > 1000:
+            self._next_chat = {
+                key: until for key, until in self._next_chat.items() if until > now
+            }
+
+
 class ChannelService:
-    def __init__(self, bot: Bot):
+    def __init__(self, bot: Bot, ttl: float = CHANNEL_CACHE_TTL):
         self.bot = bot
+        self.ttl = ttl
+        self.flood_control = FloodControl(PUBLISH_GLOBAL_RATE, PUBLISH_CHAT_INTERVAL)
+        self._senders = asyncio.Semaphore(PUBLISH_CONCURRENCY)
+        # Ключ -> (истекает, информация о чате, может ли бот публиковать)
+        self._cache: Dict[str, Tuple[float, Dict[str, Any], bool]] = {}
+
+    def _remember(self, chat_id: str, chat_info: Dict[str, Any], can_post: bool):
+        entry = (time.monotonic() + self.ttl, chat_info, can_post)
+        self._cache[_cache_key(chat_id)] = entry
+        self._cache[_cache_key(chat_info["id"])] = entry
+        if chat_info["username"]:
+            self._cache[_cache_key(f"@{chat_info['username']}")] = entry
+
+    def _cached(self, chat_id: str) -> Optional[Tuple[Dict[str, Any], bool]]:
+        entry = self._cache.get(_cache_key(chat_id))
+        if entry is None:
+            return None
+        if entry[0] <= time.monotonic():
+            self.invalidate(chat_id)
+            return None
+        return entry[1], entry[2]
+
+    def invalidate(self, chat_id: Union[str, int], username: Optional[str] = None):
+        """Забывает сохраненные данные канала под всеми его ключами"""
+        entry = self._cache.pop(_cache_key(chat_id), None)
+        keys = {_cache_key(f"@{username}")} if username else set()
+        if entry is not None:
+            keys.add(_cache_key(entry[1]["id"]))
+            if entry[1]["username"]:
+                keys.add(_cache_key(f"@{entry[1]['username']}"))
+        for key in keys:
+            self._cache.pop(key, None)
 
-    async def check_bot_permissions(self, chat_id: str) -> bool:
+    async def check_bot_permissions(
+        self, chat_id: str, chat_type: Optional[str] = None
+    ) -> bool:
         """Проверяет права бота в канале/группе"""
         try:
 
@@ -19,8 +123,9 @@ class ChannelService:
             if bot_member.status in ["administrator", "creator"]:
                 return True
             elif bot_member.status == "member":
-                chat = await self.bot.get_chat(chat_id)
-                return chat.type != "channel"
+                if chat_type is None:
+                    chat_type = (await self.bot.get_chat(chat_id)).type
+                return chat_type != "channel"
 
             return False
 
@@ -28,59 +133,132 @@ class ChannelService:
             logger.error(f"Ошибка проверки прав в канале {chat_id}: {e}")
             return False
 
-    async def get_chat_info(self, chat_id: str) -> Optional[Dict[str, Any]]:
-        """Получает информацию о канале/группе"""
-        try:
+    async def _fetch_chat_info(self, chat_id: str) -> Dict[str, Any]:
+        """Запрашивает информацию о канале/группе у Telegram"""
+        chat = await self.bot.get_chat(chat_id)
 
-            chat = await self.bot.get_chat(chat_id)
+        return {
+            "id": chat.id,
+            "title": chat.title,
+            "username": chat.username,
+            "type": chat.type,
+            "description": chat.description,
+        }
 
-            return {
-                "id": chat.id,
-                "title": chat.title,
-                "username": chat.username,
-                "type": chat.type,
-                "description": chat.description,
-            }
+    async def get_chat_info(self, chat_id: str) -> Optional[Dict[str, Any]]:
+        """Получает информацию о канале/группе"""
+        cached = self._cached(chat_id)
+        if cached is not None:
+            return cached[0]
 
+        try:
+            return await self._fetch_chat_info(chat_id)
         except (TelegramBadRequest, TelegramForbiddenError) as e:
             logger.error(f"Ошибка получения информации о канале {chat_id}: {e}")
             return None
 
+    async def _send(self, chat_id: str, text: str, parse_mode: str) -> Optional[str]:
+        """Отправляет сообщение с учетом лимитов; возвращает текст ошибки или None"""
+        for attempt in range(PUBLISH_MAX_RETRIES + 1):
+            await self.flood_control.wait(chat_id)
+
+            try:
+                async with self._senders:
+                    await self.bot.send_message(
+                        chat_id=chat_id, text=text, parse_mode=parse_mode
+                    )
+                logger.info(f"Пост успешно опубликован в {chat_id}")
+                return None
+
+            except TelegramRetryAfter as e:
+                if e.retry_after > PUBLISH_MAX_RETRY_AFTER or attempt == PUBLISH_MAX_RETRIES:
+                    logger.error(f"Превышен лимит отправки в {chat_id}: {e}")
+                    return str(e.message)
+                logger.warning(f"Лимит отправки в {chat_id}, повтор через {e.retry_after} с")
+                self.flood_control.penalize(chat_id, e.retry_after)
+
+            except TelegramNetworkError as e:
+                if attempt == PUBLISH_MAX_RETRIES:
+                    logger.error(f"Ошибка сети при публикации в {chat_id}: {e}")
+                    return str(e.message)
+                self.flood_control.penalize(chat_id, 2**attempt)
+
+            except (TelegramBadRequest, TelegramForbiddenError) as e:
+                logger.error(f"Ошибка публикации в канале {chat_id}: {e}")
+                # Права или сам канал могли измениться - следующая проверка пойдет в API
+                self.invalidate(chat_id)
+                return str(e.message)
+
+            except TelegramAPIError as e:
+                logger.error(f"Ошибка Telegram при публикации в {chat_id}: {e}")
+                return str(e.message)
+
     async def publish_post(
         self, chat_id: str, text: str, parse_mode: str = "HTML"
     ) -> bool:
         """Публикует пост в канал/группу"""
-        try:
+        return await self._send(chat_id, text, parse_mode) is None
 
-            await self.bot.send_message(
-                chat_id=chat_id, text=text, parse_mode=parse_mode
-            )
+    async def publish_many(
+        self, chat_ids: List[str], text: str, parse_mode: str = "HTML"
+    ) -> Dict[str, Optional[str]]:
+        """Публикует пост сразу в несколько каналов.
 
-            logger.info(f"Пост успешно опубликован в {chat_id}")
-            return True
+        Отправка идет параллельно, но не больше PUBLISH_CONCURRENCY
+        одновременно и в темпе FloodControl. Возвращает для каждого канала
+        текст ошибки или None при успехе; ошибка одного канала не прерывает
+        отправку в остальные.
+        """
+        results = await asyncio.gather(
+            *(self._send(chat_id, text, parse_mode) for chat_id in chat_ids),
+            return_exceptions=True,
+        )
 
-        except (TelegramBadRequest, TelegramForbiddenError) as e:
-            logger.error(f"Ошибка публикации в канале {chat_id}: {e}")
-            return False
+        errors: Dict[str, Optional[str]] = {}
+        for chat_id, result in zip(chat_ids, results):
+            if isinstance(result, BaseException):
+                logger.error(f"Непредвиденная ошибка публикации в {chat_id}: {result}")
+                result = str(result) or type(result).__name__
+            errors[chat_id] = result
+        return errors
 
     async def validate_channel_access(self, chat_id: str) -> Dict[str, Any]:
-        """Валидирует доступ к каналу и возвращает подробную информацию"""
+        """Валидирует доступ к каналу и возвращает подробную информацию.
+
+        Результат проверки известного канала берется из кэша без запросов
+        к API, пока не истек CHANNEL_CACHE_TTL или не пришло обновление
+        my_chat_member.
+
+        gone - Telegram точно ответил, что канала нет или бот в нем
+        недоступен; при сетевых и прочих ошибках он остается False.
+        """
         result = {
             "valid": False,
             "chat_info": None,
             "bot_can_post": False,
             "error": None,
+            "gone": False,
         }
 
         try:
-            chat_info = await self.get_chat_info(chat_id)
-            if not chat_info:
-                result["error"] = "Канал не найден или бот не имеет доступа"
-                return result
+            cached = self._cached(chat_id)
+            if cached is not None:
+                chat_info, can_post = cached
+            else:
+                try:
+                    chat_info = await self._fetch_chat_info(chat_id)
+                except (TelegramBadRequest, TelegramForbiddenError) as e:
+                    logger.error(f"Ошибка получения информации о канале {chat_id}: {e}")
+                    result["error"] = "Канал не найден или бот не имеет доступа"
+                    result["gone"] = isinstance(e, TelegramForbiddenError) or (
+                        "chat not found" in e.message.lower()
+                    )
+                    return result
 
-            result["chat_info"] = chat_info
+                can_post = await self.check_bot_permissions(chat_id, chat_info["type"])
+                self._remember(chat_id, chat_info, can_post)
 
-            can_post = await self.check_bot_permissions(chat_id)
+            result["chat_info"] = chat_info
             result["bot_can_post"] = can_post
 
             if not can_post:
@@ -0,0 +1,126 @@
+import json
+import logging
+import os
+from string import Formatter
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LANGUAGE = "ru"
+
+
+def _arity(text: str) -> Optional[int]:
+    """Сколько позиционных аргументов нужно строке; None - строка не шаблон"""
+    auto = 0
+    arity = 0
+
+    try:
+        for _, name, spec, _ in Formatter().parse(text):
+            if name is None:
+                continue
+            if name == "":
+                index, auto = auto, auto + 1
+            elif name.isdigit():
+                index = int(name)
+            else:
+                return None
+            # Вложенные поля в формате не поддерживаются
+            if spec and "{" in spec:
+                return None
+            arity = max(arity, index + 1)
+    except ValueError:
+        return None
+
+    return arity
+
+
+class Message:
+    """Строка перевода, разобранная при загрузке: заранее известно, сколько
+    аргументов ей нужно, поэтому форматирование не может упасть"""
+
+    __slots__ = ("text", "_arity")
+
+    def __init__(self, text: str):
+        self.text = text
+        self._arity = _arity(text)
+
+    def format(self, *args) -> str:
+        # Как раньше str.format с перехватом ошибок: без нужных аргументов - исходный текст
+        if self._arity is None or len(args) < self._arity:
+            return self.text
+        return self.text.format(*args)
+
+
+class Catalog:
+    """Переводы одного языка, уже дополненные языком по умолчанию.
+
+    Вызывается как функция: _("key", *args). Неизвестный ключ
+    возвращается как есть.
+    """
+
+    __slots__ = ("language", "_messages")
+
+    def __init__(self, language: str, messages: Dict[str, Message]):
+        self.language = language
+        self._messages = messages
+
+    def __call__(self, key: str, *args) -> str:
+        message = self._messages.get(key)
+        if message is None:
+            return key
+        return message.format(*args) if args else message.text
+
+
+def _read_sources(directory: str) -> Dict[str, Dict[str, str]]:
+    """Читает файлы <язык>.json из каталога переводов"""
+    sources: Dict[str, Dict[str, str]] = {}
+    if not os.path.isdir(directory):
+        return sources
+
+    for name in sorted(os.listdir(directory)):
+        language, extension = os.path.splitext(name)
+        if extension != ".json":
+            continue
+
+        try:
+            with open(os.path.join(directory, name), "r", encoding="utf-8") as f:
+                sources[language] = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.error(f"Ошибка загрузки переводов {name}: {e}")
+
+    return sources
+
+
+def load_catalogs(
+    directory: str, default: str = DEFAULT_LANGUAGE
+) -> Dict[str, Catalog]:
+    """Загружает и компилирует переводы всех языков из каталога.
+
+    Отсутствующие в языке ключи берутся из языка по умолчанию заранее,
+    поэтому поиск строки - одно обращение к словарю, сколько бы языков
+    ни было. Язык по умолчанию идет первым.
+    """
+    sources = _read_sources(directory)
+    if default not in sources:
+        raise ValueError(f"Не найдены переводы языка по умолчанию: {directory}/{default}.json")
+
+    base = {key: Message(text) for key, text in sources[default].items()}
+    catalogs = {default: Catalog(default, base)}
+
+    for language, texts in sources.items():
+        if language == default:
+            continue
+
+        missing = base.keys() - texts.keys()
+        if missing:
+            logger.warning(
+                f"В переводе {language} нет {len(missing)} строк, "
+                f"используется {default}: {', '.join(sorted(missing))}"
+            )
+
+        messages = dict(base)
+        messages.update((key, Message(text)) for key, text in texts.items())
+        catalogs[language] = Catalog(language, messages)
+
+    logger.info(f"Загружены переводы: {', '.join(catalogs)}")
+    return catalogs
@@ -0,0 +1,260 @@
+import json
+import logging
+import os
+import zlib
+from textwrap import dedent
+from typing import Dict, List, Tuple
+from config import PROMPTS_FILE
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LANGUAGE = "en"
+DEFAULT_TASK = "improve"
+DEFAULT_VERSION = "v1"
+
+BUILTIN_PROMPTS = {
+    "ru": {
+        "instructions": """
+            - Не используй Markdown-заголовки (##, ###, **, * и т.д.)
+            - Просто выдай обычный текст без спецформатирования
+            """,
+        "tasks": {
+            "improve": """Ты - профессиональный редактор контента для Telegram.
+                Улучши этот пост:
+                - Исправь грамматические и орфографические ошибки
+                - Улучши структуру и читаемость
+                - Добавь эмодзи где уместно
+                - Сохрани основную идею и тон
+                - Адаптируй под формат Telegram
+
+                Исходный текст:""",
+            "fix_errors": """Исправь все ошибки в этом тексте:
+                - Орфографические ошибки
+                - Грамматические ошибки
+                - Пунктуационные ошибки
+                - Стилистические неточности
+
+                Текст для исправления:""",
+            "make_engaging": """Сделай этот пост более вовлекающим:
+                - Добавь призыв к действию
+                - Используй эмодзи для привлечения внимания
+                - Сделай текст более эмоциональным
+                - Добавь интригу или вопросы к аудитории
+
+                Исходный пост:""",
+            "shorten": """Сократи этот текст, сохранив главную мысль:
+                - Убери лишние слова и повторы
+                - Сделай текст более лаконичным
+                - Сохрани ключевую информацию
+
+                Текст для сокращения:""",
+            "expand": """Расширь этот текст, добавив полезные детали:
+                - Добавь больше информации по теме
+                - Приведи примеры или факты
+                - Сделай контент более информативным
+
+                Текст для расширения:""",
+            "create": """Создай интересный и вовлекающий пост для Telegram на заданную тему:
+                - Сделай пост информативным и полезным
+                - Добавь эмодзи для привлечения внимания
+                - Используй структуру с заголовком, основным текстом и призывом к действию
+                - Адаптируй под формат Telegram (короткие абзацы, читаемость)
+                - Добавь хештеги если уместно
+
+                Тема для поста:""",
+            "analyze": """Проанализируй этот Telegram-пост и дай рекомендации по улучшению:
+                - Оцени читаемость и структуру
+                - Предложи улучшения для вовлечения
+                - Укажи на возможные ошибки
+                - Дай советы по оформлению для Telegram
+
+                Пост для анализа:""",
+        },
+    },
+    "en": {
+        "instructions": """
+            - Do not use Markdown headers (##, ###, **, *, etc.)
+            - Just provide plain text without special formatting
+            """,
+        "tasks": {
+            "improve": """You are a professional content editor for Telegram.
+                Improve this post:
+                - Correct grammar and spelling mistakes
+                - Improve structure and readability
+                - Add emojis where appropriate
+                - Preserve the main idea and tone
+                - Adapt to Telegram format
+
+                Original text:""",
+            "fix_errors": """Correct all errors in this text:
+                - Spelling errors
+                - Grammar errors
+                - Punctuation errors
+                - Stylistic inconsistencies
+
+                Text to correct:""",
+            "make_engaging": """Make this post more engaging:
+                - Add a call to action
+                - Use emojis to attract attention
+                - Make the text more emotional
+                - Add intrigue or questions for the audience
+
+                Original post:""",
+            "shorten": """Shorten this text while keeping the main idea:
+                - Remove unnecessary words and repetitions
+                - Make the text more concise
+                - Preserve key information
+
+                Text to shorten:""",
+            "expand": """Expand this text by adding useful details:
+                - Add more information on the topic
+                - Provide examples or facts
+                - Make the content more informative
+
+                Text to expand:""",
+            "create": """Create an interesting and engaging Telegram post on the given topic:
+                - Make the post informative and useful
+                - Add emojis to attract attention
+                - Use a structure with a headline, main text, and call to action
+                - Adapt to Telegram format (short paragraphs, readability)
+                - Add hashtags if appropriate
+
+                Topic for the post:""",
+            "analyze": """Analyze this Telegram post and provide recommendations for improvement:
+                - Assess readability and structure
+                - Suggest improvements for engagement
+                - Point out possible mistakes
+                - Give tips on formatting for Telegram
+
+                Post for analysis:""",
+        },
+    },
+}
+
+
+def _clean(text: str) -> str:
+    """Убирает отступы, оставшиеся от записи шаблона в коде"""
+    first, _, rest = text.strip("\n").partition("\n")
+    return f"{first.strip()}\n{dedent(rest)}".strip()
+
+
+class PromptTemplate:
+    """Скомпилированный шаблон промпта: текст пользователя вставляется
+    между готовыми префиксом и суффиксом"""
+
+    __slots__ = ("task_type", "language", "version", "weight", "_prefix", "_suffix")
+
+    def __init__(
+        self,
+        task_type: str,
+        language: str,
+        version: str,
+        text: str,
+        instructions: str,
+        weight: int = 1,
+    ):
+        self.task_type = task_type
+        self.language = language
+        self.version = version
+        self.weight = weight
+        self._prefix = f"{_clean(text)}\n\n"
+        self._suffix = f"\n\n{_clean(instructions)}" if instructions.strip() else ""
+
+    @property
+    def tag(self) -> str:
+        """Идентификатор варианта, например improve/ru@v1"""
+        return f"{self.task_type}/{self.language}@{self.version}"
+
+    def render(self, text: str) -> str:
+        return f"{self._prefix}{text}{self._suffix}"
+
+
+class PromptRegistry:
+    """Шаблоны промптов по паре (тип задачи, язык).
+
+    У пары может быть несколько вариантов с весами: пользователь
+    стабильно получает один из них, что позволяет проводить A/B-тесты.
+    """
+
+    def __init__(self):
+        self._variants: Dict[Tuple[str, str], List[PromptTemplate]] = {}
+        self._instructions: Dict[str, str] = {}
+
+    def load(self, prompts: dict):
+        """Добавляет языки и задачи из описания в формате BUILTIN_PROMPTS.
+
+        Задача задается строкой, объектом {"text", "version", "weight"} или
+        списком таких объектов (варианты для A/B-теста).
+        """
+        for language, spec in prompts.items():
+            instructions = spec.get(
+                "instructions", self._instructions.get(language, "")
+            )
+            self._instructions[language] = instructions
+
+            for task_type, variants in spec.get("tasks", {}).items():
+                if isinstance(variants, (str, dict)):
+                    variants = [variants]
+
+                compiled = []
+                for variant in variants:
+                    if isinstance(variant, str):
+                        variant = {"text": variant}
+                    compiled.append(
+                        PromptTemplate(
+                            task_type,
+                            language,
+                            str(variant.get("version", DEFAULT_VERSION)),
+                            variant["text"],
+                            variant.get("instructions", instructions),
+                            int(variant.get("weight", 1)),
+                        )
+                    )
+
+                self._variants[(task_type, language)] = compiled
+
+    def load_file(self, path: str):
+        """Загружает дополнительные промпты из JSON-файла, если он есть"""
+        if not os.path.exists(path):
+            return
+
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                self.load(json.load(f))
+            logger.info(f"Загружены промпты из {path}")
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.error(f"Ошибка загрузки промптов из {path}: {e}")
+
+    def _language(self, language_code: str) -> str:
+        if language_code in self._instructions:
+            return language_code
+
+        base = language_code.split("-")[0]
+        return base if base in self._instructions else DEFAULT_LANGUAGE
+
+    def get(self, task_type: str, language_code: str, user_id: int = 0) -> PromptTemplate:
+        """Возвращает шаблон для задачи и языка с откатом на improve/en"""
+        language = self._language(language_code)
+        variants = (
+            self._variants.get((task_type, language))
+            or self._variants.get((task_type, DEFAULT_LANGUAGE))
+            or self._variants.get((DEFAULT_TASK, language))
+            or self._variants[(DEFAULT_TASK, DEFAULT_LANGUAGE)]
+        )
+
+        total = sum(variant.weight for variant in variants)
+        if len(variants) == 1 or total <= 0:
+            return variants[0]
+
+        point = zlib.crc32(str(user_id).encode()) % total
+        for variant in variants:
+            point -= variant.weight
+            if point < 0:
+                return variant
+
+        return variants[-1]
+
+
+prompt_registry = PromptRegistry()
+prompt_registry.load(BUILTIN_PROMPTS)
+prompt_registry.load_file(PROMPTS_FILE)
@@ -0,0 +1,200 @@
+import math
+from datetime import datetime, timedelta
+from typing import List, Optional
+from zoneinfo import ZoneInfo
+from config import (
+    QUOTA_POLICY,
+    QUOTA_TIMEZONE,
+    QUOTA_BURST,
+    QUOTA_WINDOW,
+)
+
+QUOTA_TZ = ZoneInfo(QUOTA_TIMEZONE) if QUOTA_TIMEZONE else None
+
+
+def local_datetime(now: float) -> datetime:
+    """Момент времени в часовом поясе квот (локальном, если пояс не задан)"""
+    return datetime.fromtimestamp(now, QUOTA_TZ)
+
+
+def usage_day(now: float) -> str:
+    """Календарный день для счетчиков статистики"""
+    return local_datetime(now).strftime("%Y-%m-%d")
+
+
+def day_start(now: float, days_ahead: int = 0) -> float:
+    """Начало суток (полночь) в часовом поясе квот"""
+    day = local_datetime(now).date() + timedelta(days=days_ahead)
+    return datetime(day.year, day.month, day.day, tzinfo=QUOTA_TZ).timestamp()
+
+
+class QuotaState:
+    """Компактное состояние квоты пользователя.
+
+    Смысл полей зависит от политики: level - израсходовано в текущем окне
+    или остаток токенов, stamp - начало окна или время последнего
+    пополнения, prev - расход в предыдущем окне.
+    """
+
+    __slots__ = ("level", "stamp", "prev")
+
+    def __init__(self, level: float, stamp: float, prev: float = 0.0):
+        self.level = level
+        self.stamp = stamp
+        self.prev = prev
+
+    @classmethod
+    def from_list(cls, values: Optional[List[float]]) -> Optional["QuotaState"]:
+        return cls(*values) if values else None
+
+    def to_list(self) -> List[float]:
+        return [round(self.level, 6), round(self.stamp, 3), round(self.prev, 6)]
+
+    def copy(self) -> "QuotaState":
+        return QuotaState(self.level, self.stamp, self.prev)
+
+
+class QuotaPolicy:
+    """Базовая политика квот. Пополнение вычисляется лениво в refresh,
+    только когда пользователь обращается к боту"""
+
+    name = ""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        # Сколько запросов можно сделать подряд; у корзины токенов это burst
+        self.capacity = limit
+
+    def new_state(self, now: float, used: int = 0) -> QuotaState:
+        """Состояние нового пользователя, израсходовавшего used запросов"""
+        raise NotImplementedError
+
+    def refresh(self, state: QuotaState, now: float):
+        """Приводит состояние к моменту now"""
+        raise NotImplementedError
+
+    def used(self, state: QuotaState, now: float) -> float:
+        """Израсходованная часть квоты на момент now"""
+        raise NotImplementedError
+
+    def reset_at(self, state: QuotaState, now: float) -> float:
+        """Момент полного восстановления квоты"""
+        raise NotImplementedError
+
+    def consume(self, state: QuotaState, now: float, amount: int):
+        """Списывает amount запросов (отрицательное значение - возврат)"""
+        self.refresh(state, now)
+        state.level = max(0.0, state.level + amount)
+
+    def remaining(self, state: QuotaState, now: float) -> int:
+        """Сколько запросов доступно на момент now"""
+        state = state.copy()
+        self.refresh(state, now)
+        return max(0, math.floor(self.capacity - self.used(state, now) + 1e-9))
+
+
+class FixedDailyPolicy(QuotaPolicy):
+    """Календарные сутки в часовом поясе QUOTA_TIMEZONE"""
+
+    name = "fixed"
+
+    def new_state(self, now: float, used: int = 0) -> QuotaState:
+        return QuotaState(float(used), day_start(now))
+
+    def refresh(self, state: QuotaState, now: float):
+        window_start = day_start(now)
+        if state.stamp != window_start:
+            state.level = 0.0
+            state.stamp = window_start
+
+    def used(self, state: QuotaState, now: float) -> float:
+        return state.level
+
+    def reset_at(self, state: QuotaState, now: float) -> float:
+        return day_start(now, days_ahead=1)
+
+
+class SlidingWindowPolicy(QuotaPolicy):
+    """Скользящее окно: расход прошлого окна учитывается пропорционально
+    его перекрытию с последними window секундами"""
+
+    name = "sliding"
+
+    def __init__(self, limit: int, window: float):
+        super().__init__(limit)
+        self.window = window
+
+    def _window_start(self, now: float) -> float:
+        return now - now % self.window
+
+    def new_state(self, now: float, used: int = 0) -> QuotaState:
+        return QuotaState(float(used), self._window_start(now))
+
+    def refresh(self, state: QuotaState, now: float):
+        elapsed_windows = int((now - state.stamp) // self.window)
+        if elapsed_windows == 1:
+            state.prev = state.level
+        elif elapsed_windows > 1:
+            state.prev = 0.0
+        if elapsed_windows >= 1:
+            state.level = 0.0
+            state.stamp = self._window_start(now)
+
+    def used(self, state: QuotaState, now: float) -> float:
+        overlap = max(0.0, 1.0 - (now - state.stamp) / self.window)
+        return state.prev * overlap + state.level
+
+    def reset_at(self, state: QuotaState, now: float) -> float:
+        state = state.copy()
+        self.refresh(state, now)
+        if state.level > 0:
+            return state.stamp + 2 * self.window
+        if state.prev > 0:
+            return state.stamp + self.window
+        return now
+
+
+class TokenBucketPolicy(QuotaPolicy):
+    """Корзина токенов: до burst запросов подряд, затем limit запросов за
+    window секунд с равномерным пополнением"""
+
+    name = "token_bucket"
+
+    def __init__(self, limit: int, window: float, burst: int):
+        super().__init__(limit)
+        self.capacity = burst
+        self.rate = limit / window
+
+    def new_state(self, now: float, used: int = 0) -> QuotaState:
+        return QuotaState(float(max(0, self.capacity - used)), now)
+
+    def refresh(self, state: QuotaState, now: float):
+        if now > state.stamp:
+            state.level = min(
+                float(self.capacity), state.level + (now - state.stamp) * self.rate
+            )
+            state.stamp = now
+
+    def used(self, state: QuotaState, now: float) -> float:
+        return self.capacity - state.level
+
+    def consume(self, state: QuotaState, now: float, amount: int):
+        self.refresh(state, now)
+        state.level = min(float(self.capacity), state.level - amount)
+
+    def reset_at(self, state: QuotaState, now: float) -> float:
+        state = state.copy()
+        self.refresh(state, now)
+        return now + (self.capacity - state.level) / self.rate
+
+
+def create_quota_policy(limit: int, name: str = QUOTA_POLICY) -> QuotaPolicy:
+    """Создает политику квот согласно QUOTA_POLICY"""
+    if name == FixedDailyPolicy.name:
+        return FixedDailyPolicy(limit)
+    if name == SlidingWindowPolicy.name:
+        return SlidingWindowPolicy(limit, QUOTA_WINDOW)
+    if name == TokenBucketPolicy.name:
+        return TokenBucketPolicy(limit, QUOTA_WINDOW, QUOTA_BURST or limit)
+
+    raise ValueError(f"Неизвестная политика квот: {name}")
@@ -1,124 +1,901 @@
+import asyncio
 import json
 import os
-from datetime import datetime, timedelta
-from typing import Dict, Any
+import time
+from datetime import datetime
+from contextlib import asynccontextmanager
+from typing import Dict, Any, Iterable, List, Optional, Tuple
 import logging
+from config import (
+    RATE_LIMIT_FLUSH_INTERVAL,
+    RATE_LIMIT_COMPACT_EVERY,
+    STORAGE_BACKEND,
+    REDIS_PREFIX,
+)
+from .quota import (
+    QuotaPolicy,
+    QuotaState,
+    create_quota_policy,
+    day_start,
+    local_datetime,
+    usage_day,
+)
+from .storage import SQLiteStorage, RedisConnection
 
 logger = logging.getLogger(__name__)
 
 
-class RateLimiter:
+class JsonRateLimitStore:
+    """Хранилище лимитов в JSON-файлах.
+
+    Состояние хранится в памяти. На диск пишется снимок (storage_file) и
+    журнал приращений счетчиков (journal_file): каждое событие добавляет в
+    журнал одну строку, журнал сбрасывается на диск пачками по таймеру и
+    периодически сворачивается в новый снимок. Данные в памяти считаются
+    основными; внешние изменения файлов обнаруживаются по размеру и времени
+    изменения и подхватываются без лишнего перечитывания.
+    """
+
     def __init__(
-        self, daily_limit: int, storage_file: str = "data/rate_limit_data.json"
+        self,
+        policy: QuotaPolicy,
+        storage_file: str = "data/rate_limit_data.json",
+        journal_file: str = "data/rate_limit_journal.jsonl",
     ):
-        self.daily_limit = daily_limit
+        self.policy = policy
         self.storage_file = storage_file
+        self.journal_file = journal_file
+        self._seq = 0
+        self._journal_entries = 0
+        self._pending: List[str] = []
+        self._lock = asyncio.Lock()
+        self._flush_task: Optional[asyncio.Task] = None
+        self._signature = None
         self.data = self._load_data()
 
     def _load_data(self) -> Dict[str, Any]:
-        """Загружает данные о лимитах из файла"""
+        """Загружает снимок лимитов и применяет к нему журнал"""
+        data = {"users": {}}
         if os.path.exists(self.storage_file):
             try:
                 with open(self.storage_file, "r", encoding="utf-8") as f:
-                    return json.load(f)
+                    data = json.load(f)
             except (json.JSONDecodeError, IOError) as e:
                 logger.error(f"Ошибка загрузки данных лимитов: {e}")
 
-        return {"users": {}}
+        snapshot_seq = data.pop("seq", 0)
+        self._seq = max(self._seq, snapshot_seq)
+
+        journal = []
+        if os.path.exists(self.journal_file):
+            try:
+                with open(self.journal_file, "r", encoding="utf-8") as f:
+                    journal = f.readlines()
+            except IOError as e:
+                logger.error(f"Ошибка чтения журнала лимитов: {e}")
+
+        self._journal_entries = len(journal)
+        self._replay(data, journal, snapshot_seq)
+        self._replay(data, self._pending, snapshot_seq)
+        self._signature = self._file_signature()
+        self._totals = self._compute_totals(data)
+        return data
+
+    @staticmethod
+    def _compute_totals(data: Dict[str, Any]) -> Dict[str, Any]:
+        """Считает суммарные показатели (один раз при загрузке)"""
+        today = usage_day(time.time())
+        users = data["users"].values()
+        return {
+            "total_users": len(data["users"]),
+            "total_requests": sum(user_data["total_requests"] for user_data in users),
+            "day": today,
+            "requests_today": sum(
+                user_data["requests_today"]
+                for user_data in users
+                if user_data["last_reset_date"] == today
+            ),
+        }
+
+    def _file_signature(self) -> tuple:
+        """Размер и время изменения файлов снимка и журнала"""
+        signature = []
+        for path in (self.storage_file, self.journal_file):
+            try:
+                stat = os.stat(path)
+                signature.append((stat.st_mtime_ns, stat.st_size))
+            except FileNotFoundError:
+                signature.append(None)
+        return tuple(signature)
+
+    def _replay(self, data: Dict[str, Any], lines: Iterable[str], after_seq: int):
+        """Применяет записи журнала с номером больше after_seq"""
+        for line in lines:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                # Оборванная при сбое последняя строка журнала
+                logger.warning("Пропущена поврежденная запись журнала лимитов")
+                continue
+
+            if entry["s"] <= after_seq:
+                continue
+
+            if "t" in entry:
+                now = entry["t"]
+            else:
+                # Записи старого формата хранили только дату
+                now = day_start(datetime.fromisoformat(entry["d"]).timestamp())
+
+            self._seq = max(self._seq, entry["s"])
+            user_data = data["users"].setdefault(entry["u"], new_user_data(now))
+            apply_usage(user_data, self.policy, now, entry["n"])
+
+    def _journal(self, user_id: int, now: float, count: int):
+        """Добавляет событие расхода квоты в очередь записи журнала"""
+        self._seq += 1
+        entry = {"s": self._seq, "u": str(user_id), "t": round(now, 3), "n": count}
+        self._pending.append(json.dumps(entry, separators=(",", ":")) + "\n")
+
+    def _write_journal(self, lines: List[str]) -> tuple:
+        """Дописывает строки в журнал и дожидается записи на диск"""
+        with open(self.journal_file, "a", encoding="utf-8") as f:
+            f.writelines(lines)
+            f.flush()
+            os.fsync(f.fileno())
+        return self._file_signature()
+
+    def _write_snapshot(self, payload: str) -> tuple:
+        """Атомарно заменяет снимок и очищает журнал"""
+        tmp_file = f"{self.storage_file}.tmp"
+        with open(tmp_file, "w", encoding="utf-8") as f:
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_file, self.storage_file)
+
+        with open(self.journal_file, "w", encoding="utf-8"):
+            pass
+        return self._file_signature()
+
+    async def get(self, user_id: int) -> Optional[Dict[str, Any]]:
+        """Возвращает запись пользователя"""
+        return self.data["users"].get(str(user_id))
 
-    def _save_data(self):
-        """Сохраняет данные о лимитах в файл"""
+    async def add(self, user_id: int, now: float, count: int) -> Dict[str, Any]:
+        """Списывает квоту и ставит событие в журнал"""
+        users = self.data["users"]
+        user_data = users.get(str(user_id))
+        if user_data is None:
+            user_data = users[str(user_id)] = new_user_data(now)
+            self._totals["total_users"] += 1
+
+        day = usage_day(now)
+        today_before = requests_on(user_data, day)
+        apply_usage(user_data, self.policy, now, count)
+        apply_increment_to_totals(
+            self._totals, day, count, requests_on(user_data, day) - today_before
+        )
+        self._journal(user_id, now, count)
+        return user_data
+
+    async def reserve(
+        self, user_id: int, now: float, count: int
+    ) -> Tuple[bool, Dict[str, Any]]:
+        """Списывает квоту, только если ее хватает; между проверкой и
+        списанием нет ожиданий, поэтому они атомарны в пределах процесса"""
+        user_data = self.data["users"].get(str(user_id)) or new_user_data(now)
+        if not has_quota(user_data, self.policy, now, count):
+            return False, dict(user_data)
+        return True, dict(await self.add(user_id, now, count))
+
+    async def refresh(self):
+        """Перечитывает данные, только если файлы были изменены извне"""
+        async with self._lock:
+            if self._file_signature() != self._signature:
+                self.data = self._load_data()
+                logger.info("Файлы лимитов изменены извне, данные перечитаны")
+
+    async def get_global_stats(self, today: str) -> Dict[str, int]:
+        """Возвращает суммарные показатели по всем пользователям"""
+        return totals_for_day(self._totals, today)
+
+    async def flush(self):
+        """Сбрасывает накопленные записи журнала на диск одной операцией"""
+        async with self._lock:
+            await self._flush_pending()
+
+    async def _flush_pending(self):
+        if not self._pending:
+            return
+
+        lines, self._pending = self._pending, []
         try:
-            with open(self.storage_file, "w", encoding="utf-8") as f:
-                json.dump(self.data, f, ensure_ascii=False, indent=2)
-        except IOError as e:
-            logger.error(f"Ошибка сохранения данных лимитов: {e}")
-
-    def _get_user_data(self, user_id: int) -> Dict[str, Any]:
-        """Получает данные пользователя, создает если не существует"""
-        user_id_str = str(user_id)
-
-        if user_id_str not in self.data["users"]:
-            self.data["users"][user_id_str] = {
-                "requests_today": 0,
-                "last_reset_date": datetime.now().strftime("%Y-%m-%d"),
-                "total_requests": 0,
-            }
-            self._save_data()
-
-        return self.data["users"][user_id_str]
-
-    def _reset_daily_counter_if_needed(self, user_id: int):
-        """Сбрасывает счетчик пользователя если прошли сутки"""
-        user_data = self._get_user_data(user_id)
-        today = datetime.now().strftime("%Y-%m-%d")
-
-        if user_data["last_reset_date"] != today:
+            self._signature = await asyncio.to_thread(self._write_journal, lines)
+            self._journal_entries += len(lines)
+        except OSError as e:
+            logger.error(f"Ошибка записи журнала лимитов: {e}")
+            self._pending[:0] = lines
+
+    async def compact(self):
+        """Сворачивает журнал в новый снимок"""
+        async with self._lock:
+            await self._flush_pending()
+
+            snapshot = dict(self.data, seq=self._seq)
+            payload = json.dumps(snapshot, ensure_ascii=False, separators=(",", ":"))
+            try:
+                self._signature = await asyncio.to_thread(self._write_snapshot, payload)
+                self._journal_entries = 0
+            except OSError as e:
+                logger.error(f"Ошибка сохранения данных лимитов: {e}")
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(RATE_LIMIT_FLUSH_INTERVAL)
+            await self.refresh()
+            if self._journal_entries + len(self._pending) >= RATE_LIMIT_COMPACT_EVERY:
+                await self.compact()
+            else:
+                await self.flush()
+
+    async def start(self):
+        """Запускает периодический сброс журнала"""
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_loop())
+
+    async def close(self):
+        """Останавливает сброс журнала и сохраняет снимок"""
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+            self._flush_task = None
+
+        await self.compact()
+
+
+class SQLiteRateLimitStore:
+    """Хранилище лимитов в общей базе SQLite"""
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS rate_limits (
+            user_id INTEGER PRIMARY KEY,
+            requests_today INTEGER NOT NULL DEFAULT 0,
+            last_reset_date TEXT NOT NULL,
+            total_requests INTEGER NOT NULL DEFAULT 0,
+            quota_level REAL,
+            quota_stamp REAL,
+            quota_prev REAL
+        );
+
+        CREATE TABLE IF NOT EXISTS usage_totals (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            total_users INTEGER NOT NULL,
+            total_requests INTEGER NOT NULL,
+            day TEXT NOT NULL,
+            requests_today INTEGER NOT NULL
+        );
+    """
+
+    INIT_TOTALS = """
+        INSERT OR IGNORE INTO usage_totals
+        SELECT 1, COUNT(*), COALESCE(SUM(total_requests), 0), :today,
+            COALESCE(SUM(CASE
+                WHEN last_reset_date = :today THEN requests_today
+            END), 0)
+        FROM rate_limits
+    """
+
+    TRIGGERS = """
+        CREATE TRIGGER IF NOT EXISTS rate_limits_totals_insert
+        AFTER INSERT ON rate_limits
+        BEGIN
+            UPDATE usage_totals SET
+                total_users = total_users + 1,
+                total_requests = total_requests + NEW.total_requests,
+                requests_today = CASE
+                    WHEN NEW.last_reset_date > day THEN NEW.requests_today
+                    WHEN NEW.last_reset_date = day
+                    THEN requests_today + NEW.requests_today
+                    ELSE requests_today
+                END,
+                day = MAX(day, NEW.last_reset_date)
+            WHERE id = 1;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS rate_limits_totals_update
+        AFTER UPDATE ON rate_limits
+        BEGIN
+            UPDATE usage_totals SET
+                total_requests = total_requests + NEW.total_requests - OLD.total_requests,
+                requests_today = CASE
+                    WHEN NEW.last_reset_date < day THEN requests_today
+                    ELSE CASE WHEN NEW.last_reset_date = day THEN requests_today ELSE 0 END
+                        + NEW.requests_today
+                        - CASE
+                            WHEN OLD.last_reset_date = NEW.last_reset_date
+                            THEN OLD.requests_today
+                            ELSE 0
+                        END
+                END,
+                day = MAX(day, NEW.last_reset_date)
+            WHERE id = 1;
+        END;
+    """
+
+    QUOTA_COLUMNS = ("quota_level", "quota_stamp", "quota_prev")
+
+    SELECT_USER = """
+        SELECT requests_today, last_reset_date, total_requests,
+            quota_level, quota_stamp, quota_prev
+        FROM rate_limits WHERE user_id = ?
+    """
+
+    UPSERT_USER = """
+        INSERT INTO rate_limits (
+            user_id, requests_today, last_reset_date, total_requests,
+            quota_level, quota_stamp, quota_prev
+        )
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT (user_id) DO UPDATE SET
+            requests_today = excluded.requests_today,
+            last_reset_date = excluded.last_reset_date,
+            total_requests = excluded.total_requests,
+            quota_level = excluded.quota_level,
+            quota_stamp = excluded.quota_stamp,
+            quota_prev = excluded.quota_prev
+    """
+
+    INSERT_USER = """
+        INSERT OR IGNORE INTO rate_limits (
+            user_id, requests_today, last_reset_date, total_requests,
+            quota_level, quota_stamp, quota_prev
+        )
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    """
+
+    SELECT_TOTALS = """
+        SELECT total_users, total_requests, day, requests_today
+        FROM usage_totals WHERE id = 1
+    """
+
+    def __init__(self, policy: QuotaPolicy, legacy_store_factory=JsonRateLimitStore):
+        self.policy = policy
+        self.storage = SQLiteStorage()
+        self._legacy_store_factory = legacy_store_factory
+        self._ready = False
+
+    @staticmethod
+    def _row_to_user_data(row: tuple) -> Dict[str, Any]:
+        return {
+            "requests_today": row[0],
+            "last_reset_date": row[1],
+            "total_requests": row[2],
+            "quota": list(row[3:6]) if row[3] is not None else None,
+        }
+
+    @staticmethod
+    def _user_data_to_row(user_id: int, user_data: Dict[str, Any]) -> tuple:
+        quota = user_data.get("quota") or [None, None, None]
+        return (
+            user_id,
+            user_data["requests_today"],
+            user_data["last_reset_date"],
+            user_data["total_requests"],
+            *quota,
+        )
+
+    async def _migrate_from_json(self):
+        """Однократно переносит данные из JSON-файлов в базу"""
+        legacy = self._legacy_store_factory(self.policy)
+        files = [legacy.storage_file, legacy.journal_file]
+        if not any(os.path.exists(path) for path in files):
+            return
+
+        users = legacy.data["users"]
+        await self.storage.executemany(
+            self.INSERT_USER,
+            (
+                self._user_data_to_row(int(user_id), user_data)
+                for user_id, user_data in users.items()
+            ),
+        )
+
+        for path in files:
+            if os.path.exists(path):
+                os.replace(path, f"{path}.migrated")
+
+        logger.info(f"Лимиты {len(users)} пользователей перенесены из JSON в SQLite")
+
+    async def start(self):
+        """Создает схему и при необходимости переносит данные из JSON"""
+        if self._ready:
+            return
+
+        await self.storage.executescript(self.SCHEMA)
+
+        columns = {row[1] for row in await self.storage.fetchall(
+            "PRAGMA table_info(rate_limits)"
+        )}
+        for column in self.QUOTA_COLUMNS:
+            if column not in columns:
+                await self.storage.execute(
+                    f"ALTER TABLE rate_limits ADD COLUMN {column} REAL"
+                )
+
+        await self.storage.execute(self.INIT_TOTALS, {"today": usage_day(time.time())})
+        await self.storage.executescript(self.TRIGGERS)
+        await self._migrate_from_json()
+        self._ready = True
+
+    async def get(self, user_id: int) -> Optional[Dict[str, Any]]:
+        """Возвращает запись пользователя"""
+        row = await self.storage.fetchone(self.SELECT_USER, (user_id,))
+        return self._row_to_user_data(row) if row else None
+
+    async def add(self, user_id: int, now: float, count: int) -> Dict[str, Any]:
+        """Атомарно списывает квоту в транзакции базы"""
+
+        def _add(connection):
+            row = connection.execute(self.SELECT_USER, (user_id,)).fetchone()
+            user_data = self._row_to_user_data(row) if row else new_user_data(now)
+            apply_usage(user_data, self.policy, now, count)
+            connection.execute(
+                self.UPSERT_USER, self._user_data_to_row(user_id, user_data)
+            )
+            return user_data
+
+        return await self.storage.transaction(_add)
+
+    async def reserve(
+        self, user_id: int, now: float, count: int
+    ) -> Tuple[bool, Dict[str, Any]]:
+        """Проверяет остаток и списывает квоту в одной транзакции"""
+
+        def _reserve(connection):
+            row = connection.execute(self.SELECT_USER, (user_id,)).fetchone()
+            user_data = self._row_to_user_data(row) if row else new_user_data(now)
+            if not has_quota(user_data, self.policy, now, count):
+                return False, user_data
+
+            apply_usage(user_data, self.policy, now, count)
+            connection.execute(
+                self.UPSERT_USER, self._user_data_to_row(user_id, user_data)
+            )
+            return True, user_data
+
+        return await self.storage.transaction(_reserve)
+
+    async def get_global_stats(self, today: str) -> Dict[str, int]:
+        """Возвращает суммарные показатели по всем пользователям"""
+        row = await self.storage.fetchone(self.SELECT_TOTALS)
+        totals = {
+            "total_users": row[0],
+            "total_requests": row[1],
+            "day": row[2],
+            "requests_today": row[3],
+        }
+        return totals_for_day(totals, today)
+
+    async def close(self):
+        """Все изменения пишутся сразу, сбрасывать нечего"""
+
+
+class RedisRateLimitStore:
+    """Хранилище лимитов в Redis, общее для нескольких процессов бота.
+
+    Запись пользователя хранится в хэше с номером версии. Новое состояние
+    квоты вычисляется политикой в Python, а записывается Lua-скриптом,
+    который атомарно сверяет версию и обновляет суммарные счетчики; при
+    конкурентном изменении попытка повторяется.
+    """
+
+    ADD_SCRIPT = """
+        local version = tonumber(redis.call('HGET', KEYS[1], 'v') or '0')
+        if version ~= tonumber(ARGV[1]) then
+            return 0
+        end
+
+        redis.call('HSET', KEYS[1],
+            'v', version + 1,
+            'requests_today', ARGV[2],
+            'last_reset_date', ARGV[3],
+            'total_requests', ARGV[4],
+            'quota', ARGV[5])
+
+        if version == 0 then
+            redis.call('HINCRBY', KEYS[2], 'total_users', 1)
+        end
+        redis.call('HINCRBY', KEYS[2], 'total_requests', ARGV[7])
+
+        local day = redis.call('HGET', KEYS[2], 'day') or ''
+        if ARGV[6] > day then
+            redis.call('HSET', KEYS[2], 'day', ARGV[6], 'requests_today', ARGV[8])
+        elseif ARGV[6] == day then
+            redis.call('HINCRBY', KEYS[2], 'requests_today', ARGV[8])
+        end
+        return 1
+    """
+
+    def __init__(self, policy: QuotaPolicy, redis=None):
+        self.policy = policy
+        self.redis = redis if redis is not None else RedisConnection().client
+        self._add_script = self.redis.register_script(self.ADD_SCRIPT)
+        self._user_prefix = f"{REDIS_PREFIX}:rate_limits:"
+        self._totals_key = f"{REDIS_PREFIX}:usage_totals"
+
+    async def _read(self, user_id: int) -> tuple:
+        """Возвращает версию и запись пользователя (0 и None, если ее нет)"""
+        fields = await self.redis.hgetall(f"{self._user_prefix}{user_id}")
+        if not fields:
+            return 0, None
+
+        return int(fields["v"]), {
+            "requests_today": int(fields["requests_today"]),
+            "last_reset_date": fields["last_reset_date"],
+            "total_requests": int(fields["total_requests"]),
+            "quota": json.loads(fields["quota"]) if fields.get("quota") else None,
+        }
+
+    async def get(self, user_id: int) -> Optional[Dict[str, Any]]:
+        """Возвращает запись пользователя"""
+        return (await self._read(user_id))[1]
+
+    async def _write(
+        self,
+        user_id: int,
+        version: int,
+        user_data: Dict[str, Any],
+        now: float,
+        count: int,
+        today_before: int,
+    ) -> bool:
+        """Записывает запись, если ее версия не изменилась с момента чтения"""
+        day = usage_day(now)
+        return bool(
+            await self._add_script(
+                keys=[f"{self._user_prefix}{user_id}", self._totals_key],
+                args=[
+                    version,
+                    user_data["requests_today"],
+                    user_data["last_reset_date"],
+                    user_data["total_requests"],
+                    json.dumps(user_data["quota"]),
+                    day,
+                    count,
+                    requests_on(user_data, day) - today_before,
+                ],
+            )
+        )
+
+    async def add(self, user_id: int, now: float, count: int) -> Dict[str, Any]:
+        """Атомарно списывает квоту, повторяя попытку при гонке с другим процессом"""
+        while True:
+            version, user_data = await self._read(user_id)
+            if user_data is None:
+                user_data = new_user_data(now)
+
+            today_before = requests_on(user_data, usage_day(now))
+            apply_usage(user_data, self.policy, now, count)
+            if await self._write(
+                user_id, version, user_data, now, count, today_before
+            ):
+                return user_data
+
+    async def reserve(
+        self, user_id: int, now: float, count: int
+    ) -> Tuple[bool, Dict[str, Any]]:
+        """Списывает квоту, только если ее хватает; проверка повторяется,
+        если запись успел изменить другой процесс"""
+        while True:
+            version, user_data = await self._read(user_id)
+            if user_data is None:
+                user_data = new_user_data(now)
+            if not has_quota(user_data, self.policy, now, count):
+                return False, user_data
+
+            today_before = requests_on(user_data, usage_day(now))
+            apply_usage(user_data, self.policy, now, count)
+            if await self._write(
+                user_id, version, user_data, now, count, today_before
+            ):
+                return True, user_data
+
+    async def get_global_stats(self, today: str) -> Dict[str, int]:
+        """Возвращает суммарные показатели по всем пользователям"""
+        fields = await self.redis.hgetall(self._totals_key)
+        totals = {
+            "total_users": int(fields.get("total_users", 0)),
+            "total_requests": int(fields.get("total_requests", 0)),
+            "day": fields.get("day", ""),
+            "requests_today": int(fields.get("requests_today", 0)),
+        }
+        return totals_for_day(totals, today)
+
+    async def start(self):
+        """Проверяет доступность Redis"""
+        await self.redis.ping()
+
+    async def close(self):
+        """Все изменения пишутся сразу, сбрасывать нечего"""
+
+
+def new_user_data(now: float) -> Dict[str, Any]:
+    """Запись пользователя, еще не делавшего запросов"""
+    return {
+        "requests_today": 0,
+        "last_reset_date": usage_day(now),
+        "total_requests": 0,
+        "quota": None,
+    }
+
+
+def quota_state(
+    user_data: Dict[str, Any], policy: QuotaPolicy, now: float
+) -> QuotaState:
+    """Состояние квоты из записи; для старых записей выводится из счетчиков"""
+    state = QuotaState.from_list(user_data.get("quota"))
+    if state is None:
+        used_today = user_data["requests_today"]
+        if user_data["last_reset_date"] != usage_day(now):
+            used_today = 0
+        state = policy.new_state(now, used_today)
+    return state
+
+
+def has_quota(
+    user_data: Dict[str, Any], policy: QuotaPolicy, now: float, count: int
+) -> bool:
+    """Хватает ли остатка квоты на count запросов"""
+    return policy.remaining(quota_state(user_data, policy, now), now) >= count
+
+
+def apply_usage(user_data: Dict[str, Any], policy: QuotaPolicy, now: float, count: int):
+    """Применяет расход (или возврат) запросов к счетчикам и квоте"""
+    state = quota_state(user_data, policy, now)
+    policy.consume(state, now, count)
+    user_data["quota"] = state.to_list()
+    apply_increment(user_data, usage_day(now), count)
+
+
+def apply_increment(user_data: Dict[str, Any], date: str, count: int):
+    """Применяет приращение счетчика к записи пользователя.
+
+    Возврат уменьшает дневной счетчик, только если он относится к тому же
+    дню: запросы прошедших суток в нем уже не учитываются.
+    """
+    if count < 0:
+        if user_data["last_reset_date"] == date:
+            user_data["requests_today"] = max(0, user_data["requests_today"] + count)
+    else:
+        if user_data["last_reset_date"] != date:
             user_data["requests_today"] = 0
-            user_data["last_reset_date"] = today
-            self._save_data()
-            logger.info(f"Счетчик запросов к Gemini сброшен для пользователя {user_id}")
+            user_data["last_reset_date"] = date
+        user_data["requests_today"] += count
 
-    def can_make_request(self, user_id: int) -> bool:
-        """Проверяет, может ли пользователь сделать запрос"""
-        self._reset_daily_counter_if_needed(user_id)
-        user_data = self._get_user_data(user_id)
-        return user_data["requests_today"] < self.daily_limit
-
-    def increment_request_count(self, user_id: int):
-        """Увеличивает счетчик запросов пользователя"""
-        self._reset_daily_counter_if_needed(user_id)
-        user_data = self._get_user_data(user_id)
-        user_data["requests_today"] += 1
-        user_data["total_requests"] += 1
-        self._save_data()
+    user_data["total_requests"] += count
+
+
+def requests_on(user_data: Dict[str, Any], date: str) -> int:
+    """Дневной счетчик пользователя, если он относится к дню date"""
+    if user_data["last_reset_date"] != date:
+        return 0
+    return user_data["requests_today"]
+
+
+def apply_increment_to_totals(
+    totals: Dict[str, Any], date: str, count: int, today_count: int
+):
+    """Применяет приращение счетчиков к суммарным показателям; today_count -
+    изменение дневных счетчиков пользователей за день date"""
+    if date > totals["day"]:
+        totals["day"] = date
+        totals["requests_today"] = 0
+
+    if date == totals["day"]:
+        totals["requests_today"] += today_count
+    totals["total_requests"] += count
+
+
+def totals_for_day(totals: Dict[str, Any], today: str) -> Dict[str, int]:
+    """Суммарные показатели с учетом смены дня"""
+    return {
+        "total_users": totals["total_users"],
+        "total_requests": totals["total_requests"],
+        "requests_today": totals["requests_today"] if totals["day"] == today else 0,
+    }
+
+
+def create_rate_limit_store(policy: QuotaPolicy):
+    """Создает хранилище лимитов согласно STORAGE_BACKEND"""
+    if STORAGE_BACKEND == "json":
+        return JsonRateLimitStore(policy)
+    if STORAGE_BACKEND == "redis":
+        return RedisRateLimitStore(policy)
+    return SQLiteRateLimitStore(policy)
+
+
+class QuotaReservation:
+    """Слот квоты, занятый на время запроса к Gemini.
+
+    Квота списывается сразу при резервировании, поэтому параллельные
+    запросы пользователя не могут превысить лимит. commit подтверждает
+    расход, release возвращает слот, если ответ так и не был получен.
+    Ложное значение означает, что квоты не хватило.
+    """
+
+    __slots__ = ("user_id", "count", "user_data", "_limiter", "_held")
 
+    def __init__(
+        self,
+        limiter: "RateLimiter",
+        user_id: int,
+        count: int,
+        user_data: Dict[str, Any],
+    ):
+        self.user_id = user_id
+        self.count = count
+        # Запись пользователя сразу после резервирования (или отказа)
+        self.user_data = user_data
+        self._limiter = limiter
+        self._held = count > 0
+
+    def __bool__(self) -> bool:
+        return self.count > 0
+
+    def commit(self):
+        """Подтверждает расход: слот остается списанным"""
+        if not self._held:
+            return
+
+        self._held = False
         logger.info(
-            f"Пользователь {user_id} использовал запросов к Gemini: {user_data['requests_today']}/{self.daily_limit}"
+            f"Пользователь {self.user_id} использовал запросов к Gemini сегодня: {self.user_data['requests_today']}"
         )
 
-    def get_remaining_requests(self, user_id: int) -> int:
-        """Возвращает количество оставшихся запросов для пользователя"""
-        self._reset_daily_counter_if_needed(user_id)
-        user_data = self._get_user_data(user_id)
-        return max(0, self.daily_limit - user_data["requests_today"])
+    async def release(self):
+        """Возвращает слот в квоту пользователя"""
+        if not self._held:
+            return
 
-    def get_reset_time(self) -> datetime:
-        """Возвращает время следующего сброса лимита"""
-        tomorrow = datetime.now() + timedelta(days=1)
-        return tomorrow.replace(hour=0, minute=0, second=0, microsecond=0)
+        self._held = False
+        await self._limiter._refund(self)
 
-    def get_user_stats(self, user_id: int) -> Dict[str, Any]:
-        """Возвращает статистику использования для конкретного пользователя"""
-        self.data = self._load_data()
-        self._reset_daily_counter_if_needed(user_id)
-        user_data = self._get_user_data(user_id)
+
+class RateLimiter:
+    """Квоты запросов к AI поверх выбранного хранилища.
+
+    Политика квот (QUOTA_POLICY) подключаемая: календарные сутки,
+    скользящее окно или корзина токенов.
+    """
+
+    def __init__(self, daily_limit: int, policy: QuotaPolicy = None, store=None):
+        self.policy = policy if policy is not None else create_quota_policy(daily_limit)
+        self.daily_limit = self.policy.limit
+        self.store = store if store is not None else create_rate_limit_store(self.policy)
+        # Пользователь -> [блокировка, число ожидающих]; записи живут, пока заняты
+        self._locks: Dict[int, list] = {}
+
+    @asynccontextmanager
+    async def _user_lock(self, user_id: int):
+        """Блокировка операций с квотой одного пользователя"""
+        entry = self._locks.get(user_id)
+        if entry is None:
+            entry = self._locks[user_id] = [asyncio.Lock(), 0]
+
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._locks[user_id]
+
+    async def _get_user_data(self, user_id: int, now: float) -> Dict[str, Any]:
+        """Получает копию данных пользователя со сброшенным при необходимости счетчиком"""
+        user_data = await self.store.get(user_id)
+
+        if user_data is None:
+            return new_user_data(now)
+
+        user_data = dict(user_data)
+        if user_data["last_reset_date"] != usage_day(now):
+            user_data["requests_today"] = 0
+            user_data["last_reset_date"] = usage_day(now)
+
+        return user_data
+
+    async def get_user_data(self, user_id: int) -> Dict[str, Any]:
+        """Запись пользователя на текущий момент; по ней считают remaining, reset_time и user_stats"""
+        return await self._get_user_data(user_id, time.time())
+
+    def remaining(self, user_data: Dict[str, Any], now: Optional[float] = None) -> int:
+        """Оставшиеся запросы по уже прочитанной записи"""
+        now = time.time() if now is None else now
+        return self.policy.remaining(quota_state(user_data, self.policy, now), now)
+
+    def reset_time(self, user_data: Dict[str, Any], now: Optional[float] = None) -> datetime:
+        """Время полного восстановления квоты по уже прочитанной записи"""
+        now = time.time() if now is None else now
+        state = quota_state(user_data, self.policy, now)
+        return local_datetime(self.policy.reset_at(state, now))
+
+    def user_stats(self, user_data: Dict[str, Any], now: Optional[float] = None) -> Dict[str, Any]:
+        """Статистика пользователя по уже прочитанной записи"""
+        now = time.time() if now is None else now
+        state = quota_state(user_data, self.policy, now)
 
         return {
             "requests_today": user_data["requests_today"],
             "daily_limit": self.daily_limit,
-            "remaining_requests": self.get_remaining_requests(user_id),
+            "remaining_requests": self.policy.remaining(state, now),
             "total_requests": user_data["total_requests"],
-            "reset_time": self.get_reset_time(),
+            "reset_time": local_datetime(self.policy.reset_at(state, now)),
         }
 
-    def get_global_stats(self) -> Dict[str, Any]:
-        """Возвращает глобальную статистику по всем пользователям"""
-        total_users = len(self.data["users"])
-        total_requests_all_time = sum(
-            user_data["total_requests"] for user_data in self.data["users"].values()
+    async def start(self):
+        """Подготавливает хранилище к работе"""
+        await self.store.start()
+
+    async def close(self):
+        """Сохраняет несохраненные изменения"""
+        await self.store.close()
+
+    async def can_make_request(self, user_id: int) -> bool:
+        """Проверяет, может ли пользователь сделать запрос"""
+        return self.remaining(await self.get_user_data(user_id)) > 0
+
+    async def reserve(self, user_id: int, count: int = 1) -> QuotaReservation:
+        """Занимает count запросов из квоты, если их хватает.
+
+        Проверка и списание атомарны в хранилище, а запросы одного
+        пользователя дополнительно выстраиваются в очередь без влияния
+        на остальных пользователей.
+        """
+        now = time.time()
+        async with self._user_lock(user_id):
+            granted, user_data = await self.store.reserve(user_id, now, count)
+        return QuotaReservation(self, user_id, count if granted else 0, user_data)
+
+    async def _refund(self, reservation: QuotaReservation):
+        now = time.time()
+        async with self._user_lock(reservation.user_id):
+            await self.store.add(reservation.user_id, now, -reservation.count)
+        logger.info(
+            f"Пользователю {reservation.user_id} возвращено запросов: {reservation.count}"
         )
 
-        today = datetime.now().strftime("%Y-%m-%d")
-        requests_today_all_users = sum(
-            user_data["requests_today"]
-            for user_data in self.data["users"].values()
-            if user_data["last_reset_date"] == today
+    async def increment_request_count(self, user_id: int):
+        """Списывает один запрос из квоты пользователя"""
+        user_data = await self.store.add(user_id, time.time(), 1)
+
+        logger.info(
+            f"Пользователь {user_id} использовал запросов к Gemini сегодня: {user_data['requests_today']}"
         )
 
+    async def get_remaining_requests(self, user_id: int) -> int:
+        """Возвращает количество оставшихся запросов для пользователя"""
+        return self.remaining(await self.get_user_data(user_id))
+
+    async def get_reset_time(self, user_id: int) -> datetime:
+        """Возвращает время полного восстановления квоты пользователя"""
+        return self.reset_time(await self.get_user_data(user_id))
+
+    async def get_user_stats(self, user_id: int) -> Dict[str, Any]:
+        """Возвращает статистику использования для конкретного пользователя"""
+        return self.user_stats(await self.get_user_data(user_id))
+
+    async def get_global_stats(self) -> Dict[str, Any]:
+        """Возвращает глобальную статистику по всем пользователям"""
+        totals = await self.store.get_global_stats(usage_day(time.time()))
+
         return {
-            "total_users": total_users,
-            "total_requests_all_time": total_requests_all_time,
-            "requests_today_all_users": requests_today_all_users,
+            "total_users": totals["total_users"],
+            "total_requests_all_time": totals["total_requests"],
+            "requests_today_all_users": totals["requests_today"],
             "daily_limit_per_user": self.daily_limit,
         }
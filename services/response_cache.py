@@ -0,0 +1,182 @@
+import asyncio
+import hashlib
+import logging
+import os
+import re
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Optional, Tuple
+from config import (
+    RESPONSE_CACHE_MAX_BYTES,
+    RESPONSE_CACHE_TTL,
+    RESPONSE_CACHE_DISK,
+    RESPONSE_CACHE_DIR,
+    RESPONSE_CACHE_DISK_MAX_BYTES,
+)
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    """Приводит текст к каноническому виду для ключа кэша"""
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFC", text)).strip()
+
+
+def cache_key(text: str, task_type: str, language_code: str) -> str:
+    """Ключ кэша: хэш нормализованного текста, типа задачи и языка"""
+    payload = "\0".join((task_type, language_code, normalize_text(text)))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """Кэш ответов Gemini по содержимому запроса.
+
+    Первый уровень - LRU в памяти с ограничением по байтам и TTL. Второй,
+    необязательный, - файлы в RESPONSE_CACHE_DIR, которые переживают
+    перезапуск бота. Файловые операции выполняются вне event loop.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = RESPONSE_CACHE_MAX_BYTES,
+        ttl: float = RESPONSE_CACHE_TTL,
+        directory: Optional[str] = RESPONSE_CACHE_DIR if RESPONSE_CACHE_DISK else None,
+        disk_max_bytes: int = RESPONSE_CACHE_DISK_MAX_BYTES,
+    ):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.directory = directory
+        self.disk_max_bytes = disk_max_bytes
+        self._memory: "OrderedDict[str, Tuple[float, str, int]]" = OrderedDict()
+        self._memory_bytes = 0
+        self._disk: "OrderedDict[str, int]" = OrderedDict()
+        self._disk_bytes = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    async def start(self):
+        """Загружает индекс файлового уровня"""
+        if self.directory:
+            await asyncio.to_thread(self._load_disk_index)
+
+    def _load_disk_index(self):
+        os.makedirs(self.directory, exist_ok=True)
+        entries = []
+        now = time.time()
+
+        for entry in os.scandir(self.directory):
+            if not entry.name.endswith(".txt"):
+                continue
+            stat = entry.stat()
+            if now - stat.st_mtime > self.ttl:
+                os.remove(entry.path)
+                continue
+            entries.append((stat.st_mtime, entry.name[:-4], stat.st_size))
+
+        for _, key, size in sorted(entries):
+            self._disk[key] = size
+            self._disk_bytes += size
+
+        logger.info(f"Кэш ответов на диске: {len(self._disk)} записей")
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.txt")
+
+    def _remember(self, key: str, text: str, expires_at: float):
+        size = len(text.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+
+        old = self._memory.pop(key, None)
+        if old is not None:
+            self._memory_bytes -= old[2]
+
+        self._memory[key] = (expires_at, text, size)
+        self._memory_bytes += size
+
+        while self._memory_bytes > self.max_bytes:
+            _, (_, _, evicted_size) = self._memory.popitem(last=False)
+            self._memory_bytes -= evicted_size
+
+    async def get(self, key: str) -> Optional[str]:
+        """Возвращает сохраненный ответ или None"""
+        now = time.time()
+        entry = self._memory.get(key)
+
+        if entry is not None:
+            if entry[0] > now:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            del self._memory[key]
+            self._memory_bytes -= entry[2]
+
+        if self.directory and key in self._disk:
+            loaded = await asyncio.to_thread(self._read_file, key)
+            if loaded is not None:
+                mtime, text = loaded
+                if now - mtime <= self.ttl:
+                    self._disk.move_to_end(key)
+                    self._remember(key, text, mtime + self.ttl)
+                    self.hits += 1
+                    self.disk_hits += 1
+                    return text
+            self._forget_file(key)
+
+        self.misses += 1
+        return None
+
+    async def set(self, key: str, text: str):
+        """Сохраняет ответ в кэш"""
+        self._remember(key, text, time.time() + self.ttl)
+
+        if self.directory:
+            size = await asyncio.to_thread(self._write_file, key, text)
+            self._disk_bytes -= self._disk.pop(key, 0)
+            self._disk[key] = size
+            self._disk_bytes += size
+
+            while self._disk_bytes > self.disk_max_bytes and self._disk:
+                self._forget_file(next(iter(self._disk)))
+
+    def _read_file(self, key: str) -> Optional[Tuple[float, str]]:
+        try:
+            path = self._path(key)
+            mtime = os.path.getmtime(path)
+            with open(path, "r", encoding="utf-8") as f:
+                return mtime, f.read()
+        except OSError:
+            return None
+
+    def _write_file(self, key: str, text: str) -> int:
+        path = self._path(key)
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(temp_path, path)
+        return os.path.getsize(path)
+
+    def _forget_file(self, key: str):
+        self._disk_bytes -= self._disk.pop(key, 0)
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def get_stats(self) -> dict:
+        """Счетчики попаданий и размер кэша"""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": len(self._memory),
+            "bytes": self._memory_bytes,
+            "disk_entries": len(self._disk),
+            "disk_bytes": self._disk_bytes,
+        }
@@ -0,0 +1,275 @@
+import json
+import logging
+import os
+import time
+from typing import Any, Dict, List, Optional
+from config import STORAGE_BACKEND, REDIS_PREFIX, SAVED_CHANNELS_LIMIT
+from .storage import SQLiteStorage, RedisConnection, JsonFileWriter
+
+logger = logging.getLogger(__name__)
+
+# Поля информации о канале, которые сохраняются для кнопок публикации
+CHANNEL_FIELDS = ("id", "title", "username", "type")
+
+
+def _channel_record(chat_info: Dict[str, Any]) -> Dict[str, Any]:
+    return {field: chat_info.get(field) for field in CHANNEL_FIELDS}
+
+
+class JsonChannelStore:
+    """Сохраненные каналы пользователей в JSON-файле.
+
+    Изменения сразу применяются в памяти, а файл переписывается в фоне
+    через JSON_FLUSH_DELAY секунд одной атомарной записью.
+    """
+
+    def __init__(self, storage_file: str = "data/saved_channels.json"):
+        self.storage_file = storage_file
+        self.data = self._load_data()
+        self._writer = JsonFileWriter(
+            storage_file, self._snapshot, "сохраненных каналов"
+        )
+
+    def _load_data(self) -> Dict[str, Any]:
+        """Загружает сохраненные каналы из файла"""
+        if os.path.exists(self.storage_file):
+            try:
+                with open(self.storage_file, "r", encoding="utf-8") as f:
+                    return json.load(f)
+            except (json.JSONDecodeError, IOError) as e:
+                logger.error(f"Ошибка загрузки сохраненных каналов: {e}")
+
+        return {"users": {}}
+
+    def _snapshot(self) -> Dict[str, Any]:
+        """Копия данных для записи в фоновом потоке"""
+        return {
+            "users": {
+                user_id: {chat_id: dict(channel) for chat_id, channel in channels.items()}
+                for user_id, channels in self.data["users"].items()
+            }
+        }
+
+    async def recent(self, user_id: int, limit: int) -> List[Dict[str, Any]]:
+        """Каналы пользователя от последнего использованного"""
+        channels = self.data["users"].get(str(user_id), {}).values()
+        ordered = sorted(channels, key=lambda channel: channel["used_at"], reverse=True)
+        return [_channel_record(channel) for channel in ordered[:limit]]
+
+    async def save(self, user_id: int, chat_info: Dict[str, Any], limit: int):
+        """Запоминает канал и забывает самые давние сверх limit"""
+        channels = self.data["users"].setdefault(str(user_id), {})
+        channels[str(chat_info["id"])] = {**_channel_record(chat_info), "used_at": time.time()}
+
+        for chat_id, _ in sorted(channels.items(), key=lambda item: item[1]["used_at"])[:-limit]:
+            del channels[chat_id]
+        self._writer.schedule()
+
+    async def remove(self, user_id: int, chat_id: str):
+        """Удаляет канал из списка пользователя"""
+        if self.data["users"].get(str(user_id), {}).pop(str(chat_id), None) is not None:
+            self._writer.schedule()
+
+    async def start(self):
+        """Данные загружаются при создании, подготовка не нужна"""
+
+    async def close(self):
+        """Сохраняет несохраненные изменения"""
+        await self._writer.close()
+
+
+class SQLiteChannelStore:
+    """Сохраненные каналы пользователей в общей базе SQLite"""
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS saved_channels (
+            user_id INTEGER NOT NULL,
+            chat_id INTEGER NOT NULL,
+            title TEXT,
+            username TEXT,
+            type TEXT,
+            used_at REAL NOT NULL,
+            PRIMARY KEY (user_id, chat_id)
+        );
+        CREATE INDEX IF NOT EXISTS saved_channels_recent
+            ON saved_channels (user_id, used_at DESC);
+    """
+
+    SELECT_RECENT = """
+        SELECT chat_id, title, username, type FROM saved_channels
+        WHERE user_id = ? ORDER BY used_at DESC LIMIT ?
+    """
+
+    UPSERT_CHANNEL = """
+        INSERT INTO saved_channels (user_id, chat_id, title, username, type, used_at)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT (user_id, chat_id) DO UPDATE SET
+            title = excluded.title,
+            username = excluded.username,
+            type = excluded.type,
+            used_at = excluded.used_at
+    """
+
+    DELETE_OLDEST = """
+        DELETE FROM saved_channels WHERE user_id = ? AND chat_id NOT IN (
+            SELECT chat_id FROM saved_channels
+            WHERE user_id = ? ORDER BY used_at DESC LIMIT ?
+        )
+    """
+
+    DELETE_CHANNEL = "DELETE FROM saved_channels WHERE user_id = ? AND chat_id = ?"
+
+    def __init__(self):
+        self.storage = SQLiteStorage()
+        self._ready = False
+
+    async def start(self):
+        """Создает схему"""
+        if self._ready:
+            return
+
+        await self.storage.executescript(self.SCHEMA)
+        self._ready = True
+
+    async def recent(self, user_id: int, limit: int) -> List[Dict[str, Any]]:
+        """Каналы пользователя от последнего использованного"""
+        rows = await self.storage.fetchall(self.SELECT_RECENT, (user_id, limit))
+        return [dict(zip(CHANNEL_FIELDS, row)) for row in rows]
+
+    async def save(self, user_id: int, chat_info: Dict[str, Any], limit: int):
+        """Запоминает канал и забывает самые давние сверх limit"""
+        record = _channel_record(chat_info)
+
+        def _save(connection):
+            connection.execute(
+                self.UPSERT_CHANNEL,
+                (
+                    user_id,
+                    int(record["id"]),
+                    record["title"],
+                    record["username"],
+                    record["type"],
+                    time.time(),
+                ),
+            )
+            connection.execute(self.DELETE_OLDEST, (user_id, user_id, limit))
+
+        await self.storage.transaction(_save)
+
+    async def remove(self, user_id: int, chat_id: str):
+        """Удаляет канал из списка пользователя"""
+        await self.storage.execute(self.DELETE_CHANNEL, (user_id, int(chat_id)))
+
+    async def close(self):
+        """Все изменения пишутся сразу, сбрасывать нечего"""
+
+
+class RedisChannelStore:
+    """Сохраненные каналы пользователей в Redis: порядок в sorted set,
+    данные каналов в hash"""
+
+    def __init__(self, redis=None):
+        self.redis = redis if redis is not None else RedisConnection().client
+        self._prefix = f"{REDIS_PREFIX}:saved_channels"
+
+    def _keys(self, user_id: int):
+        return f"{self._prefix}:{user_id}:recent", f"{self._prefix}:{user_id}:info"
+
+    async def recent(self, user_id: int, limit: int) -> List[Dict[str, Any]]:
+        """Каналы пользователя от последнего использованного"""
+        recent_key, info_key = self._keys(user_id)
+        chat_ids = await self.redis.zrevrange(recent_key, 0, limit - 1)
+        if not chat_ids:
+            return []
+
+        records = await self.redis.hmget(info_key, chat_ids)
+        return [json.loads(record) for record in records if record is not None]
+
+    async def save(self, user_id: int, chat_info: Dict[str, Any], limit: int):
+        """Запоминает канал и забывает самые давние сверх limit"""
+        recent_key, info_key = self._keys(user_id)
+        chat_id = str(chat_info["id"])
+        record = json.dumps(_channel_record(chat_info), ensure_ascii=False)
+
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.zadd(recent_key, {chat_id: time.time()})
+            pipe.hset(info_key, chat_id, record)
+            pipe.zrange(recent_key, 0, -limit - 1)
+            _, _, stale = await pipe.execute()
+
+        if stale:
+            async with self.redis.pipeline(transaction=True) as pipe:
+                pipe.zrem(recent_key, *stale)
+                pipe.hdel(info_key, *stale)
+                await pipe.execute()
+
+    async def remove(self, user_id: int, chat_id: str):
+        """Удаляет канал из списка пользователя"""
+        recent_key, info_key = self._keys(user_id)
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.zrem(recent_key, str(chat_id))
+            pipe.hdel(info_key, str(chat_id))
+            await pipe.execute()
+
+    async def start(self):
+        """Проверяет доступность Redis"""
+        await self.redis.ping()
+
+    async def close(self):
+        """Все изменения пишутся сразу, сбрасывать нечего"""
+
+
+def create_channel_store():
+    """Создает хранилище сохраненных каналов согласно STORAGE_BACKEND"""
+    if STORAGE_BACKEND == "json":
+        return JsonChannelStore()
+    if STORAGE_BACKEND == "redis":
+        return RedisChannelStore()
+    return SQLiteChannelStore()
+
+
+class SavedChannelsService:
+    """Недавние каналы пользователя для публикации в одно касание.
+
+    Канал попадает в список после успешной проверки доступа и поднимается
+    наверх при каждой публикации. Хранится не больше SAVED_CHANNELS_LIMIT
+    каналов на пользователя.
+    """
+
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(SavedChannelsService, cls).__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        if hasattr(self, "_initialized") and self._initialized:
+            return
+
+        self.store = create_channel_store()
+        self.limit = SAVED_CHANNELS_LIMIT
+        self._initialized = True
+
+    async def start(self):
+        """Подготавливает хранилище к работе"""
+        await self.store.start()
+
+    async def close(self):
+        """Сохраняет несохраненные изменения"""
+        await self.store.close()
+
+    async def get_recent(self, user_id: int) -> List[Dict[str, Any]]:
+        """Возвращает сохраненные каналы, начиная с последнего использованного"""
+        if self.limit <= 0:
+            return []
+        return await self.store.recent(user_id, self.limit)
+
+    async def save(self, user_id: int, chat_info: Dict[str, Any]):
+        """Запоминает канал или поднимает его в начало списка"""
+        if self.limit > 0:
+            await self.store.save(user_id, chat_info, self.limit)
+
+    async def remove(self, user_id: int, chat_id: str):
+        """Удаляет канал из списка пользователя"""
+        await self.store.remove(user_id, chat_id)
@@ -0,0 +1,631 @@
+import asyncio
+import hashlib
+import heapq
+import json
+import logging
+import os
+import time
+from typing import Any, Dict, List, Optional, Set, Tuple
+from config import (
+    BOT_WORKERS,
+    STORAGE_BACKEND,
+    REDIS_PREFIX,
+    SCHEDULE_CLAIM_TIMEOUT,
+    SCHEDULE_MAX_SLEEP,
+    SCHEDULE_POLL_INTERVAL,
+)
+from .storage import SQLiteStorage, RedisConnection
+
+logger = logging.getLogger(__name__)
+
+PENDING, SENDING, SENT, FAILED, CANCELLED = "pending", "sending", "sent", "failed", "cancelled"
+
+# Сколько хранить завершенные задания, чтобы повторная отправка формы не создала дубль
+FINISHED_JOB_TTL = 7 * 86400
+
+
+def job_key(user_id: int, chat_id: str, text: str, run_at: float) -> str:
+    """Ключ идемпотентности: одинаковый запрос дает то же задание"""
+    payload = "\0".join((str(user_id), str(chat_id), str(int(run_at)), text))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:32]
+
+
+def _due_at(job: Dict[str, Any]) -> float:
+    """Когда заданием нужно заняться: в срок или после истечения захвата"""
+    if job["status"] == SENDING:
+        return job["claimed_at"] + SCHEDULE_CLAIM_TIMEOUT
+    return job["run_at"]
+
+
+class JsonJobStore:
+    """Задания отложенной публикации в JSON-файле (для одного процесса).
+
+    Файл переписывается в потоке, а не в цикле событий, и заменяется
+    атомарно через временный. Изменения, сделанные во время записи,
+    сохраняются следующей записью одной операцией.
+    """
+
+    def __init__(self, storage_file: str = "data/scheduled_posts.json"):
+        self.storage_file = storage_file
+        self.data = {"jobs": {}}
+        self._lock = asyncio.Lock()
+        # Номер последнего изменения и последнего записанного в файл
+        self._version = 0
+        self._saved_version = 0
+
+    def _load_data(self) -> Dict[str, Any]:
+        """Загружает задания из файла"""
+        if os.path.exists(self.storage_file):
+            try:
+                with open(self.storage_file, "r", encoding="utf-8") as f:
+                    return json.load(f)
+            except (json.JSONDecodeError, IOError) as e:
+                logger.error(f"Ошибка загрузки запланированных постов: {e}")
+
+        return {"jobs": {}}
+
+    def _write_data(self, jobs: Dict[str, Dict[str, Any]]):
+        """Атомарно заменяет файл: временный файл, fsync, переименование"""
+        payload = json.dumps({"jobs": jobs}, ensure_ascii=False)
+        temp_file = f"{self.storage_file}.tmp"
+        with open(temp_file, "w", encoding="utf-8") as f:
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_file, self.storage_file)
+
+    async def _save_data(self):
+        """Сохраняет задания в файл и дожидается записи"""
+        self._version += 1
+        version = self._version
+
+        async with self._lock:
+            # Изменение уже попало в запись, начатую после него
+            if self._saved_version >= version:
+                return
+
+            version = self._version
+            jobs = {job_id: dict(job) for job_id, job in self.data["jobs"].items()}
+            try:
+                await asyncio.to_thread(self._write_data, jobs)
+                self._saved_version = version
+            except OSError as e:
+                logger.error(f"Ошибка сохранения запланированных постов: {e}")
+
+    async def start(self):
+        """Загружает задания и удаляет давно завершенные"""
+        self.data = self._load_data()
+        now = time.time()
+        jobs = self.data["jobs"]
+        for job_id in [
+            job_id
+            for job_id, job in jobs.items()
+            if job.get("finished_at") and now - job["finished_at"] > FINISHED_JOB_TTL
+        ]:
+            del jobs[job_id]
+
+    async def add(self, job: Dict[str, Any]) -> bool:
+        """Сохраняет задание; False, если задание с таким ключом уже есть"""
+        if job["id"] in self.data["jobs"]:
+            return False
+        self.data["jobs"][job["id"]] = job
+        await self._save_data()
+        return True
+
+    async def due(self) -> List[Tuple[float, str]]:
+        """Сроки всех незавершенных заданий"""
+        return [
+            (_due_at(job), job_id)
+            for job_id, job in self.data["jobs"].items()
+            if job["status"] in (PENDING, SENDING)
+        ]
+
+    async def claim(self, job_id: str, now: float) -> Optional[Dict[str, Any]]:
+        """Захватывает задание для отправки; None, если оно уже не ждет отправки"""
+        job = self.data["jobs"].get(job_id)
+        if job is None or job["status"] not in (PENDING, SENDING) or _due_at(job) > now:
+            return None
+        job.update(status=SENDING, claimed_at=now)
+        await self._save_data()
+        return dict(job)
+
+    async def finish(self, job_id: str, status: str, error: Optional[str] = None):
+        """Отмечает задание выполненным или неудачным"""
+        job = self.data["jobs"].get(job_id)
+        if job is not None:
+            job.update(status=status, error=error, finished_at=time.time())
+            await self._save_data()
+
+    async def cancel(self, job_id: str, user_id: int) -> bool:
+        """Отменяет ожидающее задание пользователя"""
+        job = self.data["jobs"].get(job_id)
+        if job is None or job["user_id"] != user_id or job["status"] != PENDING:
+            return False
+        job.update(status=CANCELLED, finished_at=time.time())
+        await self._save_data()
+        return True
+
+    async def user_jobs(self, user_id: int) -> List[Dict[str, Any]]:
+        """Ожидающие задания пользователя по времени публикации"""
+        jobs = [
+            job
+            for job in self.data["jobs"].values()
+            if job["user_id"] == user_id and job["status"] == PENDING
+        ]
+        return sorted(jobs, key=lambda job: job["run_at"])
+
+    async def close(self):
+        """Данные пишутся сразу, сбрасывать нечего"""
+
+
+class SQLiteJobStore:
+    """Задания отложенной публикации в общей базе SQLite"""
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS scheduled_posts (
+            id TEXT PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            chat_id TEXT NOT NULL,
+            chat_title TEXT,
+            text TEXT NOT NULL,
+            run_at REAL NOT NULL,
+            status TEXT NOT NULL,
+            claimed_at REAL,
+            finished_at REAL,
+            error TEXT
+        );
+        CREATE INDEX IF NOT EXISTS scheduled_posts_due
+            ON scheduled_posts (status, run_at);
+        CREATE INDEX IF NOT EXISTS scheduled_posts_user
+            ON scheduled_posts (user_id, status, run_at);
+    """
+
+    COLUMNS = ("id", "user_id", "chat_id", "chat_title", "text", "run_at", "status", "claimed_at")
+
+    INSERT_JOB = """
+        INSERT OR IGNORE INTO scheduled_posts
+            (id, user_id, chat_id, chat_title, text, run_at, status)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    """
+
+    SELECT_DUE = """
+        SELECT id, CASE WHEN status = 'sending' THEN claimed_at + ? ELSE run_at END
+        FROM scheduled_posts WHERE status IN ('pending', 'sending')
+    """
+
+    CLAIM_JOB = """
+        UPDATE scheduled_posts SET status = 'sending', claimed_at = ?
+        WHERE id = ? AND (
+            (status = 'pending' AND run_at <= ?)
+            OR (status = 'sending' AND claimed_at + ? <= ?)
+        )
+    """
+
+    SELECT_JOB = f"SELECT {', '.join(COLUMNS)} FROM scheduled_posts WHERE id = ?"
+
+    FINISH_JOB = """
+        UPDATE scheduled_posts SET status = ?, error = ?, finished_at = ? WHERE id = ?
+    """
+
+    CANCEL_JOB = """
+        UPDATE scheduled_posts SET status = 'cancelled', finished_at = ?
+        WHERE id = ? AND user_id = ? AND status = 'pending'
+    """
+
+    SELECT_USER_JOBS = f"""
+        SELECT {', '.join(COLUMNS)} FROM scheduled_posts
+        WHERE user_id = ? AND status = 'pending' ORDER BY run_at
+    """
+
+    PURGE_FINISHED = "DELETE FROM scheduled_posts WHERE finished_at < ?"
+
+    def __init__(self):
+        self.storage = SQLiteStorage()
+
+    async def start(self):
+        """Создает схему и удаляет давно завершенные задания"""
+        await self.storage.executescript(self.SCHEMA)
+        await self.storage.execute(self.PURGE_FINISHED, (time.time() - FINISHED_JOB_TTL,))
+
+    async def add(self, job: Dict[str, Any]) -> bool:
+        """Сохраняет задание; False, если задание с таким ключом уже есть"""
+        return (
+            await self.storage.execute(
+                self.INSERT_JOB,
+                (
+                    job["id"],
+                    job["user_id"],
+                    job["chat_id"],
+                    job["chat_title"],
+                    job["text"],
+                    job["run_at"],
+                    job["status"],
+                ),
+            )
+            == 1
+        )
+
+    async def due(self) -> List[Tuple[float, str]]:
+        """Сроки всех незавершенных заданий"""
+        rows = await self.storage.fetchall(self.SELECT_DUE, (SCHEDULE_CLAIM_TIMEOUT,))
+        return [(due_at, job_id) for job_id, due_at in rows]
+
+    async def claim(self, job_id: str, now: float) -> Optional[Dict[str, Any]]:
+        """Захватывает задание для отправки; None, если оно уже не ждет отправки"""
+
+        def _claim(connection):
+            claimed = connection.execute(
+                self.CLAIM_JOB, (now, job_id, now, SCHEDULE_CLAIM_TIMEOUT, now)
+            ).rowcount
+            if not claimed:
+                return None
+            return connection.execute(self.SELECT_JOB, (job_id,)).fetchone()
+
+        row = await self.storage.transaction(_claim)
+        return dict(zip(self.COLUMNS, row)) if row else None
+
+    async def finish(self, job_id: str, status: str, error: Optional[str] = None):
+        """Отмечает задание выполненным или неудачным"""
+        await self.storage.execute(self.FINISH_JOB, (status, error, time.time(), job_id))
+
+    async def cancel(self, job_id: str, user_id: int) -> bool:
+        """Отменяет ожидающее задание пользователя"""
+        return await self.storage.execute(self.CANCEL_JOB, (time.time(), job_id, user_id)) == 1
+
+    async def user_jobs(self, user_id: int) -> List[Dict[str, Any]]:
+        """Ожидающие задания пользователя по времени публикации"""
+        rows = await self.storage.fetchall(self.SELECT_USER_JOBS, (user_id,))
+        return [dict(zip(self.COLUMNS, row)) for row in rows]
+
+    async def close(self):
+        """Все изменения пишутся сразу, сбрасывать нечего"""
+
+
+class RedisJobStore:
+    """Задания отложенной публикации в Redis, общие для нескольких процессов.
+
+    Задание хранится в хэше, сроки незавершенных заданий - в общем sorted
+    set, ожидающие задания пользователя - в его sorted set. Переходы
+    состояния выполняются Lua-скриптами атомарно.
+    """
+
+    ADD_SCRIPT = """
+        if redis.call('EXISTS', KEYS[1]) == 1 then
+            return 0
+        end
+        redis.call('HSET', KEYS[1], 'user_id', ARGV[2], 'chat_id', ARGV[3],
+            'chat_title', ARGV[4], 'text', ARGV[5], 'run_at', ARGV[6], 'status', 'pending')
+        redis.call('ZADD', KEYS[2], ARGV[6], ARGV[1])
+        redis.call('ZADD', KEYS[3], ARGV[6], ARGV[1])
+        return 1
+    """
+
+    CLAIM_SCRIPT = """
+        local job = redis.call('HMGET', KEYS[1], 'status', 'run_at', 'claimed_at')
+        local now = tonumber(ARGV[2])
+        local timeout = tonumber(ARGV[3])
+        local ready = (job[1] == 'pending' and tonumber(job[2]) <= now)
+            or (job[1] == 'sending' and tonumber(job[3]) + timeout <= now)
+        if not ready then
+            return 0
+        end
+        redis.call('HSET', KEYS[1], 'status', 'sending', 'claimed_at', ARGV[2])
+        redis.call('ZADD', KEYS[2], now + timeout, ARGV[1])
+        return 1
+    """
+
+    FINISH_SCRIPT = """
+        local user_id = redis.call('HGET', KEYS[1], 'user_id')
+        if not user_id then
+            return 0
+        end
+        if ARGV[4] ~= '' and (user_id ~= ARGV[4]
+                or redis.call('HGET', KEYS[1], 'status') ~= 'pending') then
+            return 0
+        end
+        redis.call('HSET', KEYS[1], 'status', ARGV[2], 'error', ARGV[3])
+        redis.call('EXPIRE', KEYS[1], ARGV[5])
+        redis.call('ZREM', KEYS[2], ARGV[1])
+        redis.call('ZREM', KEYS[3], ARGV[1])
+        return 1
+    """
+
+    def __init__(self, redis=None):
+        self.redis = redis if redis is not None else RedisConnection().client
+        self._add_script = self.redis.register_script(self.ADD_SCRIPT)
+        self._claim_script = self.redis.register_script(self.CLAIM_SCRIPT)
+        self._finish_script = self.redis.register_script(self.FINISH_SCRIPT)
+        self._job_prefix = f"{REDIS_PREFIX}:scheduled:"
+        self._due_key = f"{REDIS_PREFIX}:scheduled_due"
+        self._user_prefix = f"{REDIS_PREFIX}:scheduled_user:"
+
+    @staticmethod
+    def _decode(job_id: str, fields: Dict[str, str]) -> Dict[str, Any]:
+        return {
+            "id": job_id,
+            "user_id": int(fields["user_id"]),
+            "chat_id": fields["chat_id"],
+            "chat_title": fields.get("chat_title") or None,
+            "text": fields["text"],
+            "run_at": float(fields["run_at"]),
+            "status": fields["status"],
+            "claimed_at": float(fields["claimed_at"]) if fields.get("claimed_at") else None,
+        }
+
+    async def start(self):
+        """Проверяет доступность Redis"""
+        await self.redis.ping()
+
+    async def add(self, job: Dict[str, Any]) -> bool:
+        """Сохраняет задание; False, если задание с таким ключом уже есть"""
+        added = await self._add_script(
+            keys=[
+                f"{self._job_prefix}{job['id']}",
+                self._due_key,
+                f"{self._user_prefix}{job['user_id']}",
+            ],
+            args=[
+                job["id"],
+                job["user_id"],
+                job["chat_id"],
+                job["chat_title"] or "",
+                job["text"],
+                job["run_at"],
+            ],
+        )
+        return added == 1
+
+    async def due(self) -> List[Tuple[float, str]]:
+        """Сроки всех незавершенных заданий"""
+        entries = await self.redis.zrange(self._due_key, 0, -1, withscores=True)
+        return [(due_at, job_id) for job_id, due_at in entries]
+
+    async def claim(self, job_id: str, now: float) -> Optional[Dict[str, Any]]:
+        """Захватывает задание для отправки; None, если оно уже не ждет отправки"""
+        key = f"{self._job_prefix}{job_id}"
+        claimed = await self._claim_script(
+            keys=[key, self._due_key], args=[job_id, now, SCHEDULE_CLAIM_TIMEOUT]
+        )
+        if claimed != 1:
+            return None
+        return self._decode(job_id, await self.redis.hgetall(key))
+
+    async def _finish(
+        self, job_id: str, user_id: str, status: str, error: Optional[str], owner: str
+    ) -> bool:
+        # Все ключи скрипта передаются в KEYS, как требует Redis Cluster
+        finished = await self._finish_script(
+            keys=[
+                f"{self._job_prefix}{job_id}",
+                self._due_key,
+                f"{self._user_prefix}{user_id}",
+            ],
+            args=[job_id, status, error or "", owner, FINISHED_JOB_TTL],
+        )
+        return finished == 1
+
+    async def finish(self, job_id: str, status: str, error: Optional[str] = None):
+        """Отмечает задание выполненным или неудачным"""
+        # Автор задания не меняется, поэтому его можно прочитать до скрипта
+        user_id = await self.redis.hget(f"{self._job_prefix}{job_id}", "user_id")
+        if user_id is not None:
+            await self._finish(job_id, user_id, status, error, "")
+
+    async def cancel(self, job_id: str, user_id: int) -> bool:
+        """Отменяет ожидающее задание пользователя"""
+        return await self._finish(job_id, str(user_id), CANCELLED, None, str(user_id))
+
+    async def user_jobs(self, user_id: int) -> List[Dict[str, Any]]:
+        """Ожидающие задания пользователя по времени публикации"""
+        job_ids = await self.redis.zrange(f"{self._user_prefix}{user_id}", 0, -1)
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for job_id in job_ids:
+                pipe.hgetall(f"{self._job_prefix}{job_id}")
+            records = await pipe.execute()
+
+        return [
+            self._decode(job_id, fields)
+            for job_id, fields in zip(job_ids, records)
+            if fields and fields["status"] == PENDING
+        ]
+
+    async def close(self):
+        """Все изменения пишутся сразу, сбрасывать нечего"""
+
+
+def create_job_store():
+    """Создает хранилище заданий согласно STORAGE_BACKEND"""
+    if STORAGE_BACKEND == "json":
+        return JsonJobStore()
+    if STORAGE_BACKEND == "redis":
+        return RedisJobStore()
+    return SQLiteJobStore()
+
+
+class PublishScheduler:
+    """Отложенная публикация постов.
+
+    Сроки заданий держатся в куче в памяти, и единственная фоновая задача
+    спит до ближайшего срока, поэтому ожидание тысяч постов не тратит
+    процессор. При запуске сроки загружаются из хранилища, и пропущенные
+    за время простоя задания публикуются сразу.
+
+    Доставка - не менее одного раза: задание захватывается атомарно
+    (другой процесс его уже не возьмет), а если процесс упал после
+    захвата, задание отправляется снова через SCHEDULE_CLAIM_TIMEOUT.
+
+    При нескольких процессах-обработчиках таймер работает только в одном
+    из них; задания, созданные остальными, он подхватывает из хранилища
+    раз в SCHEDULE_POLL_INTERVAL секунд.
+    """
+
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(PublishScheduler, cls).__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        if hasattr(self, "_initialized") and self._initialized:
+            return
+
+        self.store = create_job_store()
+        self.publisher = None
+        self.on_finished = None
+        self._heap: List[Tuple[float, str]] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        # Задания добавляют и другие процессы, их сроки перечитываются из хранилища
+        self._poll_interval = SCHEDULE_POLL_INTERVAL if BOT_WORKERS > 1 else None
+        self._deliveries: Set[asyncio.Task] = set()
+        self._initialized = True
+
+    def attach(self, publisher, on_finished=None):
+        """Задает сервис публикации и колбэк on_finished(job, error) для итогов"""
+        self.publisher = publisher
+        self.on_finished = on_finished
+
+    async def start(self, timer: bool = True):
+        """Загружает незавершенные задания и запускает таймер.
+
+        Без timer процесс только принимает и отменяет задания, а публикует
+        их процесс с таймером.
+        """
+        await self.store.start()
+        if not timer:
+            return
+
+        self._heap = await self.store.due()
+        heapq.heapify(self._heap)
+
+        overdue = sum(1 for due_at, _ in self._heap if due_at <= time.time())
+        logger.info(
+            f"Запланированных публикаций: {len(self._heap)}, из них пропущенных: {overdue}"
+        )
+
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        """Останавливает таймер и дожидается начатых отправок"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._deliveries:
+            await asyncio.wait(set(self._deliveries))
+        await self.store.close()
+
+    def _push(self, due_at: float, job_id: str):
+        # Без таймера задание опубликует процесс, который его запускает
+        if self._task is None:
+            return
+        heapq.heappush(self._heap, (due_at, job_id))
+        # Таймер будится, только если новое задание стало ближайшим
+        if self._heap[0][1] == job_id and self._wakeup is not None:
+            self._wakeup.set()
+
+    async def schedule(
+        self,
+        user_id: int,
+        chat_id: str,
+        chat_title: Optional[str],
+        text: str,
+        run_at: float,
+    ) -> str:
+        """Планирует публикацию и возвращает ключ задания"""
+        job = {
+            "id": job_key(user_id, chat_id, text, run_at),
+            "user_id": user_id,
+            "chat_id": str(chat_id),
+            "chat_title": chat_title,
+            "text": text,
+            "run_at": run_at,
+            "status": PENDING,
+        }
+        if await self.store.add(job):
+            self._push(run_at, job["id"])
+            logger.info(f"Запланирована публикация {job['id']} в {chat_id}")
+        return job["id"]
+
+    async def cancel(self, job_id: str, user_id: int) -> bool:
+        """Отменяет задание; его срок в куче просто будет пропущен"""
+        return await self.store.cancel(job_id, user_id)
+
+    async def get_user_jobs(self, user_id: int) -> List[Dict[str, Any]]:
+        """Ожидающие публикации пользователя"""
+        return await self.store.user_jobs(user_id)
+
+    async def _sync(self):
+        """Перечитывает сроки заданий, включая созданные другими процессами"""
+        try:
+            heap = await self.store.due()
+        except Exception as e:
+            logger.error(f"Не удалось обновить запланированные публикации: {e}")
+            return
+        heapq.heapify(heap)
+        self._heap = heap
+
+    async def _run(self):
+        next_sync = time.time() + self._poll_interval if self._poll_interval else None
+        while True:
+            self._wakeup.clear()
+            now = time.time()
+
+            if next_sync is not None and now >= next_sync:
+                await self._sync()
+                next_sync = now + self._poll_interval
+
+            while self._heap and self._heap[0][0] <= now:
+                _, job_id = heapq.heappop(self._heap)
+                task = asyncio.create_task(self._deliver(job_id))
+                self._deliveries.add(task)
+                task.add_done_callback(self._deliveries.discard)
+
+            # Сон ограничен сверху на случай перевода системных часов
+            delay = min(self._heap[0][0] - now, SCHEDULE_MAX_SLEEP) if self._heap else None
+            if next_sync is not None:
+                delay = next_sync - now if delay is None else min(delay, next_sync - now)
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _deliver(self, job_id: str):
+        now = time.time()
+        try:
+            job = await self.store.claim(job_id, now)
+        except Exception as e:
+            logger.error(f"Не удалось захватить задание {job_id}: {e}")
+            self._push(now + SCHEDULE_CLAIM_TIMEOUT, job_id)
+            return
+
+        # Задание отменено, уже отправлено или его взял другой процесс
+        if job is None:
+            return
+
+        try:
+            errors = await self.publisher.publish_many([job["chat_id"]], job["text"], "HTML")
+        except Exception as e:
+            logger.error(f"Ошибка отправки запланированного поста {job_id}: {e}")
+            self._push(now + SCHEDULE_CLAIM_TIMEOUT, job_id)
+            return
+        error = errors[job["chat_id"]]
+
+        try:
+            await self.store.finish(job_id, SENT if error is None else FAILED, error)
+        except Exception as e:
+            # Задание останется захваченным и будет отправлено повторно
+            logger.error(f"Не удалось сохранить итог задания {job_id}: {e}")
+            self._push(now + SCHEDULE_CLAIM_TIMEOUT, job_id)
+            return
+
+        if self.on_finished is not None:
+            try:
+                await self.on_finished(job, error)
+            except Exception as e:
+                logger.error(f"Ошибка уведомления о публикации {job_id}: {e}")
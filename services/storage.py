@@ -0,0 +1,259 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Iterable, List, Optional, Sequence
+from config import SQLITE_PATH, REDIS_URL, JSON_FLUSH_DELAY
+
+logger = logging.getLogger(__name__)
+
+# Наибольшая пауза между повторами неудавшейся записи JSON-файла, с
+MAX_FLUSH_RETRY_DELAY = 60.0
+
+
+class SQLiteStorage:
+    """Общее хранилище бота на встроенной SQLite в режиме WAL.
+
+    Все обращения к базе выполняются в одном выделенном потоке, поэтому
+    event loop никогда не ждет диск. Скомпилированные запросы кэшируются
+    модулем sqlite3 (cached_statements), так что повторяющийся SQL
+    подготавливается один раз.
+    """
+
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(SQLiteStorage, cls).__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        if hasattr(self, "_initialized") and self._initialized:
+            return
+
+        self.path = SQLITE_PATH
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite")
+        self._connection: Optional[sqlite3.Connection] = None
+        self._initialized = True
+
+    def _connect(self) -> sqlite3.Connection:
+        """Открывает соединение (вызывается только из потока хранилища)"""
+        if self._connection is None:
+            connection = sqlite3.connect(
+                self.path,
+                isolation_level=None,
+                check_same_thread=False,
+                cached_statements=256,
+            )
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute("PRAGMA busy_timeout=5000")
+            self._connection = connection
+            logger.info(f"Открыта база данных {self.path}")
+
+        return self._connection
+
+    async def _run(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, func, *args)
+
+    async def execute(self, sql: str, params: Sequence[Any] = ()) -> int:
+        """Выполняет изменяющий запрос и возвращает число затронутых строк"""
+
+        def _execute():
+            return self._connect().execute(sql, params).rowcount
+
+        return await self._run(_execute)
+
+    async def executemany(self, sql: str, rows: Iterable[Sequence[Any]]):
+        """Выполняет запрос для набора строк в одной транзакции"""
+
+        def _executemany():
+            connection = self._connect()
+            with connection:
+                connection.execute("BEGIN")
+                connection.executemany(sql, rows)
+
+        await self._run(_executemany)
+
+    async def transaction(self, func):
+        """Выполняет func(connection) в транзакции с блокировкой на запись.
+
+        func выполняется в потоке хранилища, поэтому чтение и запись внутри
+        нее атомарны даже при работе нескольких процессов с одной базой.
+        """
+
+        def _transaction():
+            connection = self._connect()
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                result = func(connection)
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+            connection.execute("COMMIT")
+            return result
+
+        return await self._run(_transaction)
+
+    async def executescript(self, script: str):
+        """Выполняет несколько запросов (создание схемы)"""
+        await self._run(lambda: self._connect().executescript(script))
+
+    async def fetchone(self, sql: str, params: Sequence[Any] = ()) -> Optional[tuple]:
+        """Возвращает первую строку результата"""
+        return await self._run(
+            lambda: self._connect().execute(sql, params).fetchone()
+        )
+
+    async def fetchall(self, sql: str, params: Sequence[Any] = ()) -> List[tuple]:
+        """Возвращает все строки результата"""
+        return await self._run(
+            lambda: self._connect().execute(sql, params).fetchall()
+        )
+
+    async def close(self):
+        """Закрывает соединение и поток хранилища"""
+
+        def _close():
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+        await self._run(_close)
+
+
+class RedisConnection:
+    """Общее подключение к Redis для работы нескольких процессов бота.
+
+    Пакет redis импортируется только при выборе этого хранилища.
+    """
+
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(RedisConnection, cls).__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        if hasattr(self, "_initialized") and self._initialized:
+            return
+
+        from redis.asyncio import Redis
+
+        self.url = REDIS_URL
+        self.client = Redis.from_url(REDIS_URL, decode_responses=True)
+        self._initialized = True
+
+    async def close(self):
+        """Закрывает пул соединений"""
+        await self.client.aclose()
+
+
+class JsonFileWriter:
+    """Отложенная атомарная запись JSON-файла хранилища.
+
+    Хранилище меняет данные в памяти и вызывает schedule: файл переписывается
+    в фоне через delay секунд, и все изменения за это время попадают в одну
+    запись. Файл заменяется через временный, записи выполняются по одной,
+    а неудавшаяся запись повторяется с растущей паузой.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        snapshot: Callable[[], Any],
+        description: str,
+        delay: float = JSON_FLUSH_DELAY,
+    ):
+        self.path = path
+        self.delay = delay
+        # Копия данных для записи; вызывается в цикле событий
+        self._snapshot = snapshot
+        self._description = description
+        self._dirty = False
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._sleeping = False
+        self._closing = False
+
+    def _write(self, data: Any):
+        """Атомарно заменяет файл: временный файл, fsync, переименование"""
+        payload = json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+        tmp_file = f"{self.path}.tmp"
+        with open(tmp_file, "w", encoding="utf-8") as f:
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_file, self.path)
+
+    def schedule(self):
+        """Отмечает изменения и планирует запись файла"""
+        self._dirty = True
+        if self._task is None and not self._closing:
+            self._sleeping = True
+            self._task = asyncio.create_task(self._flush_later())
+
+    async def flush(self) -> bool:
+        """Записывает несохраненные изменения вне цикла событий;
+        False, если запись не удалась"""
+        async with self._lock:
+            if not self._dirty:
+                return True
+
+            self._dirty = False
+            try:
+                await asyncio.to_thread(self._write, self._snapshot())
+            except OSError as e:
+                self._dirty = True
+                logger.error(f"Ошибка сохранения {self._description}: {e}")
+                return False
+            return True
+
+    async def _flush_later(self):
+        delay = self.delay
+        failures = 0
+        try:
+            while True:
+                await asyncio.sleep(delay)
+                self._sleeping = False
+
+                if await self.flush():
+                    failures = 0
+                    delay = self.delay
+                else:
+                    failures += 1
+                    delay = min(self.delay * 2**failures, MAX_FLUSH_RETRY_DELAY)
+                    logger.warning(
+                        f"Повтор сохранения {self._description} через {delay:.1f} с"
+                    )
+
+                # Изменения во время записи попадут в следующую запись
+                if not self._dirty or self._closing:
+                    return
+                self._sleeping = True
+        finally:
+            self._task = None
+
+    async def close(self):
+        """Дожидается начатой записи и сохраняет оставшиеся изменения сразу.
+
+        Отменяется только ожидание перед записью: прерванная запись
+        продолжилась бы в потоке параллельно с новой.
+        """
+        self._closing = True
+        task = self._task
+        if task is not None:
+            if self._sleeping:
+                task.cancel()
+            try:
+                await asyncio.shield(task)
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+        if not await self.flush():
+            logger.error(f"Несохраненные изменения {self._description} потеряны")
@@ -0,0 +1,84 @@
+from typing import Any, Dict, List, Optional
+from .i18n import Catalog
+from .language_service import LanguageService
+from .rate_limiter import RateLimiter
+from .saved_channels import SavedChannelsService
+
+language_service = LanguageService()
+saved_channels = SavedChannelsService()
+
+
+class UserContext:
+    """Данные пользователя на время обработки одного обновления.
+
+    Создается UserPreloadMiddleware и передается обработчикам аргументом
+    user_context. Язык определяется один раз, запись квоты и сохраненные
+    каналы читаются из хранилища только при первом обращении, а измененный
+    язык сохраняется одной записью после обработки.
+    """
+
+    __slots__ = (
+        "user_id",
+        "text",
+        "has_language",
+        "_rate_limiter",
+        "_usage",
+        "_channels",
+        "_dirty",
+    )
+
+    def __init__(self, user_id: int, rate_limiter: RateLimiter):
+        self.user_id = user_id
+        # Переводы на языке пользователя: user_context.text("key", *args)
+        self.text: Catalog = language_service.for_user(user_id)
+        self.has_language = language_service.has_language_set(user_id)
+        self._rate_limiter = rate_limiter
+        self._usage: Optional[Dict[str, Any]] = None
+        self._channels: Optional[List[Dict[str, Any]]] = None
+        self._dirty = False
+
+    @property
+    def language(self) -> str:
+        return self.text.language
+
+    def set_language(self, language: str):
+        """Меняет язык сразу для ответа; в хранилище он попадет в save"""
+        self.text = language_service.select_language(self.user_id, language)
+        self.has_language = True
+        self._dirty = True
+
+    async def usage(self) -> Dict[str, Any]:
+        """Запись квоты пользователя, прочитанная при первом обращении"""
+        if self._usage is None:
+            self._usage = await self._rate_limiter.get_user_data(self.user_id)
+        return self._usage
+
+    def update_usage(self, user_data: Dict[str, Any]):
+        """Запоминает запись квоты, измененную в этом же обновлении"""
+        self._usage = user_data
+
+    async def usage_stats(self) -> Dict[str, Any]:
+        """Статистика использования по записи квоты"""
+        return self._rate_limiter.user_stats(await self.usage())
+
+    async def saved_channels(self) -> List[Dict[str, Any]]:
+        """Сохраненные каналы пользователя, прочитанные при первом обращении"""
+        if self._channels is None:
+            self._channels = await saved_channels.get_recent(self.user_id)
+        return self._channels
+
+    async def save_channel(self, chat_info: Dict[str, Any]):
+        """Запоминает канал или поднимает его в начало списка"""
+        await saved_channels.save(self.user_id, chat_info)
+        self._channels = None
+
+    async def remove_channel(self, chat_id: str):
+        """Удаляет канал из списка пользователя"""
+        await saved_channels.remove(self.user_id, chat_id)
+        self._channels = None
+
+    async def save(self):
+        """Сохраняет поля, измененные за время обработки"""
+        if self._dirty:
+            await language_service.save_language(self.user_id, self.language)
+            self._dirty = False
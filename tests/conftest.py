@@ -0,0 +1,5 @@
+import os
+
+# config.py требует токены при импорте; настоящие в тестах не нужны
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "test-token")
+os.environ.setdefault("GEMINI_API_KEY", "test-key")
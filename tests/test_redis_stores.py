@@ -0,0 +1,156 @@
+import asyncio
+
+import pytest
+
+fakeredis = pytest.importorskip("fakeredis")
+pytest.importorskip("lupa")
+
+from services.quota import FixedDailyPolicy, day_start, usage_day
+from services.rate_limiter import RateLimiter, RedisRateLimitStore
+
+LIMIT = 2
+# Полдень, чтобы соседние моменты не попадали в другие сутки
+NOON = day_start(1_800_000_000) + 12 * 3600
+MIDNIGHT = day_start(NOON, days_ahead=1)
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def make_store(server=None):
+    redis = fakeredis.aioredis.FakeRedis(server=server, decode_responses=True)
+    return RedisRateLimitStore(FixedDailyPolicy(LIMIT), redis=redis)
+
+
+def interleave(store, other_store, user_id, now, count):
+    """Один раз вклинивает запись другого процесса между чтением и записью"""
+    read = store._read
+    calls = []
+
+    async def _read(uid):
+        result = await read(uid)
+        if not calls:
+            await other_store.add(user_id, now, count)
+        calls.append(uid)
+        return result
+
+    store._read = _read
+    return calls
+
+
+def test_reserve_until_limit_and_refund():
+    async def scenario():
+        store = make_store()
+        results = [(await store.reserve(1, NOON, 1))[0] for _ in range(LIMIT + 1)]
+        assert results == [True, True, False]
+
+        user_data = await store.add(1, NOON + 1, -1)
+        assert user_data["requests_today"] == LIMIT - 1
+        assert user_data["total_requests"] == LIMIT - 1
+
+        granted, user_data = await store.reserve(1, NOON + 2, 1)
+        assert granted
+        assert user_data["requests_today"] == LIMIT
+
+    run(scenario())
+
+
+def test_rate_limiter_release_returns_quota():
+    async def scenario():
+        store = make_store()
+        limiter = RateLimiter(LIMIT, policy=store.policy, store=store)
+
+        reservation = await limiter.reserve(1, LIMIT)
+        assert reservation
+        assert not await limiter.can_make_request(1)
+
+        await reservation.release()
+        assert await limiter.get_remaining_requests(1) == LIMIT
+        assert (await store.get(1))["requests_today"] == 0
+
+    run(scenario())
+
+
+def test_refund_after_midnight_keeps_counters_non_negative():
+    async def scenario():
+        store = make_store()
+        await store.reserve(1, MIDNIGHT - 10, 1)
+
+        user_data = await store.add(1, MIDNIGHT + 10, -1)
+        # Дневной счетчик прошедших суток не меняется, квота новых суток полная
+        assert user_data["requests_today"] == 1
+        assert user_data["last_reset_date"] == usage_day(MIDNIGHT - 10)
+        assert user_data["total_requests"] == 0
+
+        totals = await store.get_global_stats(usage_day(MIDNIGHT + 10))
+        assert totals["requests_today"] == 0
+        assert totals["total_requests"] == 0
+        assert (await store.reserve(1, MIDNIGHT + 20, LIMIT))[0]
+
+    run(scenario())
+
+
+def test_add_retries_after_concurrent_write():
+    async def scenario():
+        server = fakeredis.FakeServer()
+        store, other_store = make_store(server), make_store(server)
+        calls = interleave(store, other_store, 1, NOON, 1)
+
+        user_data = await store.add(1, NOON, 1)
+        assert len(calls) == 2
+        assert user_data["requests_today"] == 2
+        assert (await store.get(1))["requests_today"] == 2
+
+        totals = await store.get_global_stats(usage_day(NOON))
+        assert totals == {"total_users": 1, "total_requests": 2, "requests_today": 2}
+
+    run(scenario())
+
+
+def test_reserve_rechecks_quota_after_concurrent_write():
+    async def scenario():
+        server = fakeredis.FakeServer()
+        store, other_store = make_store(server), make_store(server)
+        await store.add(1, NOON, LIMIT - 1)
+        calls = interleave(store, other_store, 1, NOON, 1)
+
+        granted, user_data = await store.reserve(1, NOON, 1)
+        assert len(calls) == 2
+        assert not granted
+        assert user_data["requests_today"] == LIMIT
+        assert (await store.get(1))["requests_today"] == LIMIT
+
+    run(scenario())
+
+
+def test_global_stats_roll_over_to_the_next_day():
+    async def scenario():
+        store = make_store()
+        today, tomorrow = usage_day(NOON), usage_day(MIDNIGHT + 10)
+
+        await store.add(1, NOON, 2)
+        await store.add(2, NOON, 1)
+        assert await store.get_global_stats(today) == {
+            "total_users": 2,
+            "total_requests": 3,
+            "requests_today": 3,
+        }
+        # Пока в новых сутках нет запросов, счетчик за день обнуляется при чтении
+        assert (await store.get_global_stats(tomorrow))["requests_today"] == 0
+
+        await store.add(2, MIDNIGHT + 10, 1)
+        assert await store.get_global_stats(tomorrow) == {
+            "total_users": 2,
+            "total_requests": 4,
+            "requests_today": 1,
+        }
+        # Запись с опозданием за прошедшие сутки не попадает в новый день
+        await store.add(1, MIDNIGHT - 10, 1)
+        assert await store.get_global_stats(tomorrow) == {
+            "total_users": 2,
+            "total_requests": 5,
+            "requests_today": 1,
+        }
+
+    run(scenario())
@@ -0,0 +1,101 @@
+import random
+import re
+from html.parser import HTMLParser
+
+import pytest
+
+from utils.telegram_html import to_telegram_html
+
+ALLOWED_TAGS = {"b", "i", "u", "s", "code", "pre", "a", "tg-spoiler", "blockquote"}
+
+CORPUS = [
+    # Markdown
+    ("**bold** and __bold__", "<b>bold</b> and <b>bold</b>"),
+    ("*italic* and _italic_", "<i>italic</i> and <i>italic</i>"),
+    ("~~gone~~ ||secret||", "<s>gone</s> <tg-spoiler>secret</tg-spoiler>"),
+    ("use `a < b` here", "use <code>a &lt; b</code> here"),
+    ("snake_case_name stays", "snake_case_name stays"),
+    ("2 * 3 * 4", "2 * 3 * 4"),
+    ("\\*not italic\\*", "*not italic*"),
+    ("**unclosed bold", "**unclosed bold"),
+    ("**a\nb**", "**a\nb**"),
+    ("# Title", "<b>Title</b>"),
+    ("## Title ##", "<b>Title</b>"),
+    ("- one\n* two", "• one\n• two"),
+    ("---", "———"),
+    ("> quoted\n> lines\nafter", "<blockquote>quoted\nlines</blockquote>\nafter"),
+    ("```python\nif a < b:\n    pass\n```", '<pre><code class="language-python">if a &lt; b:\n    pass</code></pre>'),
+    ("```\nunclosed", "<pre><code>unclosed</code></pre>"),
+    ("[site](https://example.com)", '<a href="https://example.com">site</a>'),
+    ("[bad](javascript:alert(1))", "[bad](javascript:alert(1))"),
+    # HTML, которое Telegram принимает
+    ("<b>bold</b> <strong>strong</strong>", "<b>bold</b> <b>strong</b>"),
+    ("<em>em</em> <ins>ins</ins> <del>del</del>", "<i>em</i> <u>ins</u> <s>del</s>"),
+    ('<a href="https://example.com">x</a>', '<a href="https://example.com">x</a>'),
+    ('<a href="javascript:x">x</a>', '&lt;a href="javascript:x"&gt;x&lt;/a&gt;'),
+    ("<b>a\nb</b>", "<b>a\nb</b>"),
+    ("<i>one\n**two**\nthree</i>", "<i>one\n<b>two</b>\nthree</i>"),
+    ("<pre>x < y\n**raw**\n</pre>", "<pre>x &lt; y\n**raw**\n</pre>"),
+    ("<pre><code class=\"language-go\">a\nb</code></pre>", '<pre><code class="language-go">a\nb</code></pre>'),
+    ("<blockquote>a\nb</blockquote>", "<blockquote>a\nb</blockquote>"),
+    ("<blockquote expandable>long</blockquote>", "<blockquote expandable>long</blockquote>"),
+    ('<span class="tg-spoiler">hidden</span>', "<tg-spoiler>hidden</tg-spoiler>"),
+    ("<tg-spoiler>hidden</tg-spoiler>", "<tg-spoiler>hidden</tg-spoiler>"),
+    ("<b>line\n# not a header</b>", "<b>line\n# not a header</b>"),
+    # Все остальное экранируется
+    ("<span>plain</span>", "&lt;span&gt;plain&lt;/span&gt;"),
+    ("<script>x</script>", "&lt;script&gt;x&lt;/script&gt;"),
+    ("<b>unclosed\nnext", "&lt;b&gt;unclosed\nnext"),
+    ("<b><blockquote>x</blockquote></b>", "<b>&lt;blockquote&gt;x&lt;/blockquote&gt;</b>"),
+    ("<b>x<i>y</b>z</i>", "<b>x&lt;i&gt;y</b>z&lt;/i&gt;"),
+    ("<code><b>x</b></code>", "<code>&lt;b&gt;x&lt;/b&gt;</code>"),
+    ("a & b < c", "a &amp; b &lt; c"),
+]
+
+
+class _TagValidator(HTMLParser):
+    """Проверяет, что в HTML только разрешенные и правильно вложенные теги"""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.stack = []
+
+    def handle_starttag(self, tag, attrs):
+        assert tag in ALLOWED_TAGS, tag
+        assert not {"code", "pre"} & set(self.stack) or (tag == "code" and self.stack[-1] == "pre")
+        assert tag != "a" or "a" not in self.stack
+        assert tag != "blockquote" or not self.stack
+        self.stack.append(tag)
+
+    def handle_endtag(self, tag):
+        assert self.stack and self.stack[-1] == tag, (self.stack, tag)
+        self.stack.pop()
+
+
+def assert_valid(output: str):
+    validator = _TagValidator()
+    validator.feed(output)
+    validator.close()
+    assert validator.stack == []
+    # Вне тегов не должно остаться неэкранированных < и >
+    assert not re.search(r"<(?![a-z/])", output)
+
+
+@pytest.mark.parametrize("source, expected", CORPUS)
+def test_corpus(source, expected):
+    output = to_telegram_html(source)
+    assert output == expected
+    assert_valid(output)
+
+
+def test_random_input_is_always_valid():
+    tokens = [
+        "**", "*", "_", "__", "~~", "||", "`", "```", "\\*", "\n", "> ", "# ", "- ",
+        "<b>", "</b>", "<i>", "</i>", "<code>", "</code>", "<pre>", "</pre>",
+        "<blockquote>", "</blockquote>", '<span class="tg-spoiler">', "</span>",
+        '<a href="https://e.com">', "</a>", "[l](https://e.com)", "<x>", "&", "text", " ",
+    ]
+    rng = random.Random(0)
+    for _ in range(2000):
+        source = "".join(rng.choice(tokens) for _ in range(rng.randint(1, 20)))
+        assert_valid(to_telegram_html(source))
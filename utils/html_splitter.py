@@ -0,0 +1,190 @@
+import asyncio
+import html
+import logging
+import re
+from typing import List, Optional, Tuple
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
+from aiogram.types import InlineKeyboardMarkup, Message
+from config import MAX_MESSAGE_LENGTH
+
+logger = logging.getLogger(__name__)
+
+_TOKEN = re.compile(
+    r"<(/?)([a-zA-Z][\w-]*)[^>]*>|&(?:#\d+|#x[0-9a-fA-F]+|[a-zA-Z]+);"
+)
+
+# Границы разбиения от лучшей к худшей: абзац, строка, предложение, слово
+_BOUNDARY = re.compile(r"(\n\s*\n\s*)|(\n\s*)|([.!?…](?:\s+))|(\s+)")
+_LEVELS = 4
+
+TEXT, ENTITY, OPEN, CLOSE = range(4)
+
+
+def utf16_length(text: str) -> int:
+    """Длина текста так, как ее считает Telegram: в кодовых единицах UTF-16"""
+    return len(text.encode("utf-16-le")) // 2
+
+
+def _utf16_prefix(text: str, units: int) -> str:
+    """Самый длинный префикс text не длиннее units единиц UTF-16"""
+    encoded = text.encode("utf-16-le")[: units * 2]
+    # Не разрезаем суррогатную пару
+    if encoded and 0xD8 <= encoded[-1] <= 0xDB:
+        encoded = encoded[:-2]
+    return encoded.decode("utf-16-le")
+
+
+def _tokenize(text: str) -> List[Tuple[int, str, str]]:
+    """Разбирает HTML на текст, сущности и теги за один проход"""
+    tokens = []
+    position = 0
+
+    for match in _TOKEN.finditer(text):
+        if match.start() > position:
+            tokens.append((TEXT, text[position : match.start()], ""))
+
+        raw = match.group(0)
+        if match.group(2) is None:
+            tokens.append((ENTITY, raw, ""))
+        elif match.group(1):
+            tokens.append((CLOSE, raw, match.group(2).lower()))
+        else:
+            tokens.append((OPEN, raw, match.group(2).lower()))
+        position = match.end()
+
+    if position < len(text):
+        tokens.append((TEXT, text[position:], ""))
+
+    return tokens
+
+
+def _closing(stack: Tuple[Tuple[str, str], ...]) -> str:
+    return "".join(f"</{name}>" for name, _ in reversed(stack))
+
+
+def _opening(stack: Tuple[Tuple[str, str], ...]) -> str:
+    return "".join(raw for _, raw in stack)
+
+
+def split_html(text: str, limit: int = MAX_MESSAGE_LENGTH) -> List[str]:
+    """Делит HTML-текст на сообщения не длиннее limit видимых символов.
+
+    Длина считается после разбора разметки в единицах UTF-16, как в
+    Telegram. Разрез делается по абзацу, строке, предложению или слову;
+    незакрытые теги закрываются в конце части и открываются снова в
+    начале следующей.
+    """
+    tokens = _tokenize(text)
+    chunks = []
+    index, offset = 0, 0
+    stack: Tuple[Tuple[str, str], ...] = ()
+
+    while index < len(tokens):
+        pieces = [_opening(stack)]
+        current = list(stack)
+        used = 0
+        # Последний кандидат каждого уровня: (видимая длина, число частей,
+        # хвост текста, индекс токена, смещение, стек тегов)
+        candidates: List[Optional[tuple]] = [None] * _LEVELS
+        cut = None
+
+        while index < len(tokens):
+            kind, raw, name = tokens[index]
+
+            if kind == OPEN:
+                pieces.append(raw)
+                current.append((name, raw))
+            elif kind == CLOSE:
+                pieces.append(raw)
+                for position in range(len(current) - 1, -1, -1):
+                    if current[position][0] == name:
+                        del current[position]
+                        break
+            elif kind == ENTITY:
+                width = utf16_length(html.unescape(raw))
+                if used + width > limit:
+                    cut = (used, len(pieces), "", index, 0, tuple(current))
+                    break
+                pieces.append(raw)
+                used += width
+            else:
+                segment = raw[offset:]
+                if used == 0:
+                    stripped = segment.lstrip()
+                    offset += len(segment) - len(stripped)
+                    segment = stripped
+
+                fits = _utf16_prefix(segment, limit - used)
+                for match in _BOUNDARY.finditer(fits):
+                    level = _LEVELS - match.lastindex
+                    end = match.end()
+                    candidates[level] = (
+                        used + utf16_length(fits[:end]),
+                        len(pieces),
+                        fits[:end],
+                        index,
+                        offset + end,
+                        tuple(current),
+                    )
+
+                if len(fits) < len(segment):
+                    cut = (used, len(pieces), fits, index, offset + len(fits), tuple(current))
+                    break
+
+                pieces.append(segment)
+                used += utf16_length(segment)
+
+            index += 1
+            offset = 0
+
+        if cut is None:
+            chunks.append("".join(pieces) + _closing(tuple(current)))
+            break
+
+        # Лучшая граница, оставляющая часть не короче половины лимита
+        for candidate in reversed(candidates):
+            if candidate is not None and candidate[0] >= limit // 2:
+                cut = candidate
+                break
+        else:
+            found = [candidate for candidate in candidates if candidate is not None]
+            if found:
+                cut = max(found, key=lambda candidate: candidate[0])
+
+        _, count, tail, index, offset, stack = cut
+        chunk = ("".join(pieces[:count]) + tail).rstrip() + _closing(stack)
+        chunks.append(chunk)
+
+    return [chunk for chunk in chunks if chunk.strip()]
+
+
+def strip_html(text: str) -> str:
+    """Текст без разметки - запасной вариант для отправки без parse_mode"""
+    return html.unescape(re.sub(r"<[^>]+>", "", text))
+
+
+async def send_html_chunks(
+    message: Message,
+    text: str,
+    reply_markup: Optional[InlineKeyboardMarkup] = None,
+):
+    """Отправляет длинный HTML-текст частями по порядку.
+
+    Клавиатура прикрепляется к последней части. Часть, которую Telegram
+    не смог разобрать, отправляется без разметки.
+    """
+    chunks = split_html(text)
+
+    for number, chunk in enumerate(chunks, 1):
+        markup = reply_markup if number == len(chunks) else None
+
+        while True:
+            try:
+                await message.answer(chunk, parse_mode="HTML", reply_markup=markup)
+                break
+            except TelegramRetryAfter as e:
+                await asyncio.sleep(e.retry_after)
+            except TelegramBadRequest as e:
+                logger.warning(f"Не удалось отправить часть с разметкой: {e}")
+                await message.answer(strip_html(chunk), parse_mode=None, reply_markup=markup)
+                break
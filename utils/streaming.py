@@ -0,0 +1,80 @@
+import asyncio
+import logging
+from typing import AsyncIterator, Awaitable, Callable, Optional
+from aiogram.types import Message, InlineKeyboardMarkup
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
+from config import MAX_MESSAGE_LENGTH, STREAM_EDIT_INTERVAL
+
+logger = logging.getLogger(__name__)
+
+CURSOR = " ▌"
+
+
+def _progress_text(text: str) -> str:
+    """Готовит промежуточный текст для показа: хвост, влезающий в сообщение"""
+    limit = MAX_MESSAGE_LENGTH - len(CURSOR) - 1
+    if len(text) > limit:
+        text = "…" + text[-limit:]
+    return text + CURSOR
+
+
+async def stream_to_message(
+    message: Message,
+    chunks: AsyncIterator[str],
+    reply_markup: Optional[InlineKeyboardMarkup] = None,
+    interval: float = STREAM_EDIT_INTERVAL,
+) -> str:
+    """Показывает генерируемый текст, редактируя сообщение не чаще interval секунд.
+
+    Первый непустой фрагмент показывается сразу, следующие правки - не
+    чаще interval. Промежуточные правки отправляются без разметки, так как
+    незавершенный HTML может быть некорректным. Возвращает полный текст ответа.
+    """
+    loop = asyncio.get_running_loop()
+    parts = []
+    next_edit_at = loop.time()
+
+    async for chunk in chunks:
+        parts.append(chunk)
+
+        if loop.time() < next_edit_at:
+            continue
+
+        text = "".join(parts).strip()
+        if not text:
+            continue
+
+        try:
+            await message.edit_text(
+                _progress_text(text), parse_mode=None, reply_markup=reply_markup
+            )
+            next_edit_at = loop.time() + interval
+        except TelegramRetryAfter as e:
+            next_edit_at = loop.time() + e.retry_after
+        except TelegramBadRequest as e:
+            logger.debug(f"Не удалось обновить сообщение с прогрессом: {e}")
+            next_edit_at = loop.time() + interval
+
+    return "".join(parts).strip()
+
+
+def queue_position_notifier(
+    message: Message,
+    text_for_position: Callable[[int], str],
+    reply_markup: Optional[InlineKeyboardMarkup] = None,
+) -> Callable[[int], Awaitable[None]]:
+    """Возвращает колбэк, показывающий позицию запроса в очереди к AI.
+
+    TelegramRetryAfter не перехватывается: по нему очередь приостанавливает
+    показ позиций всем ожидающим.
+    """
+
+    async def notify(position: int):
+        try:
+            await message.edit_text(
+                text_for_position(position), reply_markup=reply_markup
+            )
+        except TelegramBadRequest as e:
+            logger.debug(f"Не удалось показать позицию в очереди: {e}")
+
+    return notify
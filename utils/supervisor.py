@@ -0,0 +1,264 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Set
+from aiohttp import web
+from aiogram import Bot, Dispatcher
+from config import (
+    GEMINI_MAX_CONCURRENCY,
+    GEMINI_RPM,
+    GEMINI_TPM,
+    GEMINI_MAX_QUEUE,
+    PUBLISH_GLOBAL_RATE,
+    WORKER_HEARTBEAT_INTERVAL,
+    WORKER_HEARTBEAT_TIMEOUT,
+    WORKER_SHUTDOWN_TIMEOUT,
+    SUPERVISOR_HEALTH_PORT,
+)
+
+logger = logging.getLogger(__name__)
+
+# Лимиты Gemini и Telegram делятся между процессами, чтобы в сумме не превысить общие
+SHARED_LIMITS = {
+    "GEMINI_MAX_CONCURRENCY": GEMINI_MAX_CONCURRENCY,
+    "GEMINI_RPM": GEMINI_RPM,
+    "GEMINI_TPM": GEMINI_TPM,
+    "GEMINI_MAX_QUEUE": GEMINI_MAX_QUEUE,
+    "PUBLISH_GLOBAL_RATE": PUBLISH_GLOBAL_RATE,
+}
+
+
+class ShardWorker:
+    """Обрабатывает обновления, которые супервизор направил этому процессу"""
+
+    def __init__(self, index: int, dp: Dispatcher, bot: Bot, inbox, status):
+        self.index = index
+        self.dp = dp
+        self.bot = bot
+        self.inbox = inbox
+        self.status = status
+        self.processed = 0
+        self.failed = 0
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def _process(self, update: Dict[str, Any]):
+        try:
+            await self.dp.feed_raw_update(self.bot, update)
+            self.processed += 1
+        except Exception as e:
+            self.failed += 1
+            logger.error(f"Ошибка обработки обновления в процессе {self.index}: {e}")
+
+    async def _heartbeat(self):
+        while True:
+            self.status.put(
+                {
+                    "index": self.index,
+                    "pid": os.getpid(),
+                    "time": time.time(),
+                    "processed": self.processed,
+                    "failed": self.failed,
+                    "active": len(self._tasks),
+                }
+            )
+            await asyncio.sleep(WORKER_HEARTBEAT_INTERVAL)
+
+    async def run(self):
+        """Читает входящую очередь до получения None, затем дорабатывает начатое"""
+        loop = asyncio.get_running_loop()
+        reader = ThreadPoolExecutor(max_workers=1, thread_name_prefix="inbox")
+        heartbeat = asyncio.create_task(self._heartbeat())
+
+        try:
+            while True:
+                update = await loop.run_in_executor(reader, self.inbox.get)
+                if update is None:
+                    break
+
+                task = asyncio.create_task(self._process(update))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+
+            if self._tasks:
+                await asyncio.wait(set(self._tasks), timeout=WORKER_SHUTDOWN_TIMEOUT)
+        finally:
+            heartbeat.cancel()
+            reader.shutdown(wait=False)
+
+
+class _WorkerSlot:
+    __slots__ = ("index", "process", "inbox", "heartbeat", "metrics", "restarts", "carried")
+
+    def __init__(self, index: int):
+        self.index = index
+        self.process = None
+        self.inbox = None
+        self.heartbeat = 0.0
+        self.metrics: Dict[str, Any] = {}
+        self.restarts = 0
+        # Счетчики прежних экземпляров процесса
+        self.carried = {"processed": 0, "failed": 0}
+
+    def counter(self, name: str) -> int:
+        return self.carried.get(name, 0) + self.metrics.get(name, 0)
+
+
+class Supervisor:
+    """Распределяет обновления по процессам-обработчикам по user_id.
+
+    Обновления одного пользователя всегда попадают в один процесс и в
+    порядке поступления, поэтому его состояние FSM и кэши остаются
+    согласованными. Упавший или зависший процесс перезапускается.
+    """
+
+    def __init__(self, workers: int, target: Callable):
+        self.workers = workers
+        self.target = target
+        self._context = multiprocessing.get_context("spawn")
+        self._status = self._context.Queue()
+        self._slots: List[_WorkerSlot] = [_WorkerSlot(index) for index in range(workers)]
+        self._tasks: List[asyncio.Task] = []
+        self._status_reader = ThreadPoolExecutor(max_workers=1, thread_name_prefix="status")
+        self._health_runner: Optional[web.AppRunner] = None
+
+    def _spawn(self, slot: _WorkerSlot):
+        # Очередь упавшего процесса может остаться заблокированной, поэтому
+        # каждый процесс получает новую; не принятые им обновления теряются
+        slot.inbox = self._context.Queue()
+        for name in slot.carried:
+            slot.carried[name] += slot.metrics.get(name, 0)
+        slot.metrics = {}
+
+        slot.process = self._context.Process(
+            target=self.target,
+            args=(slot.index, slot.inbox, self._status),
+            name=f"bot-worker-{slot.index}",
+            daemon=True,
+        )
+        slot.process.start()
+        slot.heartbeat = time.time() + WORKER_HEARTBEAT_TIMEOUT
+        logger.info(f"Запущен процесс-обработчик {slot.index} (pid {slot.process.pid})")
+
+    def _share_limits(self):
+        """Делит общие лимиты между процессами через их окружение"""
+        for name, value in SHARED_LIMITS.items():
+            if value > 0:
+                os.environ[name] = str(max(1, value // self.workers))
+
+    async def start(self):
+        """Запускает процессы, наблюдение за ними и сервер проверки здоровья"""
+        self._share_limits()
+        for slot in self._slots:
+            self._spawn(slot)
+
+        self._tasks.append(asyncio.create_task(self._read_status()))
+        self._tasks.append(asyncio.create_task(self._monitor()))
+
+        if SUPERVISOR_HEALTH_PORT:
+            app = web.Application()
+            app.router.add_get("/health", self._handle_health)
+            app.router.add_get("/metrics", self._handle_metrics)
+            self._health_runner = web.AppRunner(app)
+            await self._health_runner.setup()
+            await web.TCPSite(self._health_runner, "0.0.0.0", SUPERVISOR_HEALTH_PORT).start()
+
+    def dispatch(self, shard_key: int, update: Dict[str, Any]):
+        """Передает обновление процессу, отвечающему за shard_key"""
+        self._slots[shard_key % self.workers].inbox.put(update)
+
+    async def _read_status(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            metrics = await loop.run_in_executor(self._status_reader, self._status.get)
+            if metrics is None:
+                return
+
+            slot = self._slots[metrics["index"]]
+            if slot.process is not None and slot.process.pid == metrics["pid"]:
+                slot.heartbeat = metrics["time"]
+                slot.metrics = metrics
+
+    async def _monitor(self):
+        while True:
+            await asyncio.sleep(WORKER_HEARTBEAT_INTERVAL)
+            now = time.time()
+
+            for slot in self._slots:
+                if not slot.process.is_alive():
+                    logger.error(
+                        f"Процесс-обработчик {slot.index} завершился с кодом "
+                        f"{slot.process.exitcode}, перезапуск"
+                    )
+                    slot.restarts += 1
+                    self._spawn(slot)
+                elif now - slot.heartbeat > WORKER_HEARTBEAT_TIMEOUT:
+                    logger.error(f"Процесс-обработчик {slot.index} не отвечает, перезапуск")
+                    slot.process.kill()
+                    slot.process.join()
+                    slot.restarts += 1
+                    self._spawn(slot)
+
+    def _healthy(self, slot: _WorkerSlot) -> bool:
+        return (
+            slot.process.is_alive()
+            and time.time() - slot.heartbeat <= WORKER_HEARTBEAT_TIMEOUT
+        )
+
+    def metrics(self) -> Dict[str, Any]:
+        """Сводные показатели всех процессов"""
+        workers = [
+            {
+                "index": slot.index,
+                "pid": slot.process.pid,
+                "healthy": self._healthy(slot),
+                "restarts": slot.restarts,
+                "processed": slot.counter("processed"),
+                "failed": slot.counter("failed"),
+                "active": slot.metrics.get("active", 0),
+            }
+            for slot in self._slots
+        ]
+        totals = {
+            key: sum(worker[key] for worker in workers)
+            for key in ("restarts", "processed", "failed", "active")
+        }
+        return {
+            "workers": workers,
+            "healthy": all(worker["healthy"] for worker in workers),
+            **totals,
+        }
+
+    async def _handle_health(self, request: web.Request) -> web.Response:
+        healthy = all(self._healthy(slot) for slot in self._slots)
+        return web.Response(text="ok" if healthy else "degraded", status=200 if healthy else 503)
+
+    async def _handle_metrics(self, request: web.Request) -> web.Response:
+        return web.json_response(self.metrics())
+
+    async def stop(self):
+        """Останавливает процессы, дав им доработать начатые обновления"""
+        for task in self._tasks:
+            task.cancel()
+
+        if self._health_runner is not None:
+            await self._health_runner.cleanup()
+
+        for slot in self._slots:
+            slot.inbox.put(None)
+
+        loop = asyncio.get_running_loop()
+        for slot in self._slots:
+            await loop.run_in_executor(
+                None, slot.process.join, WORKER_SHUTDOWN_TIMEOUT + WORKER_HEARTBEAT_INTERVAL
+            )
+            if slot.process.is_alive():
+                logger.warning(f"Процесс-обработчик {slot.index} не завершился, остановка")
+                slot.process.terminate()
+
+        # Освобождает поток, ожидающий очередь состояний
+        self._status.put(None)
+        self._status_reader.shutdown(wait=False)
+        logger.info(f"Обработчики остановлены: {self.metrics()}")
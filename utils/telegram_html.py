@@ -0,0 +1,294 @@
+import html
+import re
+from typing import List, Optional, Tuple
+
+# Теги, которые Telegram принимает в parse_mode="HTML", и их синонимы
+_TAG_ALIASES = {
+    "b": "b",
+    "strong": "b",
+    "i": "i",
+    "em": "i",
+    "u": "u",
+    "ins": "u",
+    "s": "s",
+    "strike": "s",
+    "del": "s",
+    "code": "code",
+    "pre": "pre",
+    "a": "a",
+    "tg-spoiler": "tg-spoiler",
+    # <span> допустим только как спойлер, это проверяется по class
+    "span": "tg-spoiler",
+    "blockquote": "blockquote",
+}
+
+_MARKERS = {
+    "**": "b",
+    "__": "b",
+    "*": "i",
+    "_": "i",
+    "~~": "s",
+    "||": "tg-spoiler",
+}
+
+_SAFE_URL = re.compile(r"^(?:https?|tg)://", re.IGNORECASE)
+_HREF = re.compile(r"""\bhref\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s"'>]+))""", re.IGNORECASE)
+_SPOILER_CLASS = re.compile(r"""\bclass\s*=\s*["']?tg-spoiler\b""", re.IGNORECASE)
+_CODE_LANGUAGE = re.compile(r"""\bclass\s*=\s*["']?language-([\w+#.-]+)""", re.IGNORECASE)
+_EXPANDABLE = re.compile(r"\bexpandable\b", re.IGNORECASE)
+
+_INLINE = re.compile(
+    r"(?P<escape>\\[\\`*_~|\[\]()#>+\-.!<&])"
+    r"|(?P<fence>`+)(?P<code>.+?)(?P=fence)"
+    r"|\[(?P<label>[^\]\n]+)\]\((?P<url>[^()\s]+)\)"
+    r"|<(?P<closing>/)?(?P<tag>[a-zA-Z][\w-]*)(?P<attrs>[^<>]*)>"
+    r"|(?P<marker>\*\*|__|~~|\|\||\*|_)"
+)
+
+_CODE_FENCE = re.compile(r"^\s{0,3}```\s*([\w+#.-]*)\s*$")
+_HEADER = re.compile(r"^\s{0,3}#{1,6}\s+(.*?)(?:\s+#+)?\s*$")
+_QUOTE = re.compile(r"^\s{0,3}>\s?(.*)$")
+_RULE = re.compile(r"^\s{0,3}([-*_])(?:\s*\1){2,}\s*$")
+_BULLET = re.compile(r"^(\s*)[*+-]\s+(.*)$")
+
+
+def _escape(text: str) -> str:
+    return html.escape(text, quote=False)
+
+
+def _link(url: str) -> Optional[str]:
+    """Открывающий тег ссылки или None для небезопасного адреса"""
+    url = html.unescape(url).strip()
+    if not _SAFE_URL.match(url):
+        return None
+    return f'<a href="{html.escape(url, quote=True)}">'
+
+
+class _InlineConverter:
+    """Размечает строки, накапливая результат в pieces.
+
+    Маркеры Markdown должны закрываться в той же строке, а разрешенные
+    HTML-теги могут охватывать несколько строк. Незакрытые маркеры и
+    теги остаются текстом.
+    """
+
+    def __init__(self, links: bool = True, blocks: bool = True):
+        self.links = links
+        # Можно ли открыть <blockquote> (нельзя внутри другой разметки)
+        self.blocks = blocks
+        self.pieces: List[str] = []
+        # Открытые элементы: (ключ для закрытия, тег Telegram, индекс в pieces, исходный текст)
+        self.stack: List[Tuple[str, str, int, str]] = []
+
+    @property
+    def has_open_tags(self) -> bool:
+        return bool(self.stack)
+
+    def _as_text(self, index: int, source: str):
+        self.pieces[index] = _escape(source)
+
+    def _close(self, key: str) -> bool:
+        stack = self.stack
+        for depth in range(len(stack) - 1, -1, -1):
+            if stack[depth][0] == key:
+                # Все, что открыто внутри и не закрыто, остается текстом
+                for _, _, index, source in stack[depth + 1 :]:
+                    self._as_text(index, source)
+                self.pieces.append(f"</{stack[depth][1]}>")
+                del stack[depth:]
+                return True
+        return False
+
+    def _open(self, key: str, tag: str, opening: str, source: str):
+        self.stack.append((key, tag, len(self.pieces), source))
+        self.pieces.append(opening)
+
+    def _opening_tag(self, name: str, tag: str, attrs: str, opened: List[str]) -> Optional[str]:
+        """Открывающий тег Telegram или None, если тег здесь недопустим"""
+        if tag == "a":
+            if not self.links or "a" in opened:
+                return None
+            href = _HREF.search(attrs)
+            return _link(next(filter(None, href.groups()), "")) if href else None
+        if name == "span":
+            return "<tg-spoiler>" if _SPOILER_CLASS.search(attrs) else None
+        if tag == "blockquote":
+            if not self.blocks or opened:
+                return None
+            return "<blockquote expandable>" if _EXPANDABLE.search(attrs) else "<blockquote>"
+        if tag == "code" and opened and opened[-1] == "pre":
+            language = _CODE_LANGUAGE.search(attrs)
+            if language:
+                return f'<code class="language-{html.escape(language.group(1), quote=True)}">'
+        return f"<{tag}>"
+
+    def feed(self, line: str):
+        """Размечает строку; маркеры, не закрытые в ней, становятся текстом"""
+        pieces = self.pieces
+        position = 0
+
+        for match in _INLINE.finditer(line):
+            pieces.append(_escape(line[position : match.start()]))
+            position = match.end()
+            raw = match.group(0)
+            opened = [tag for _, tag, _, _ in self.stack]
+            verbatim = next((tag for tag in reversed(opened) if tag in ("code", "pre")), None)
+            name = (match.group("tag") or "").lower()
+            tag = _TAG_ALIASES.get(name)
+
+            # Внутри code и pre Telegram не допускает другой разметки,
+            # кроме <code class="language-..."> сразу внутри <pre>
+            if verbatim:
+                if match.group("closing"):
+                    if not (tag in ("code", "pre") and self._close(f"<{tag}>")):
+                        pieces.append(_escape(raw))
+                elif verbatim == "pre" and tag == "code":
+                    self._open("<code>", "code", self._opening_tag(name, tag, match.group("attrs"), opened), raw)
+                else:
+                    pieces.append(_escape(raw))
+            elif match.group("escape"):
+                pieces.append(_escape(raw[1]))
+            elif match.group("fence"):
+                pieces.append(f"<code>{_escape(match.group('code'))}</code>")
+            elif match.group("label"):
+                opening = _link(match.group("url")) if self.links and "a" not in opened else None
+                if opening is None:
+                    pieces.append(_escape(raw))
+                else:
+                    label = _convert_inline(match.group("label"), links=False)
+                    pieces.append(f"{opening}{label}</a>")
+            elif match.group("tag"):
+                # </span> закрывает только <span>, а не <tg-spoiler>
+                key = "<span>" if name == "span" else f"<{tag}>"
+                if tag is None:
+                    pieces.append(_escape(raw))
+                elif match.group("closing"):
+                    if not self._close(key):
+                        pieces.append(_escape(raw))
+                else:
+                    opening = self._opening_tag(name, tag, match.group("attrs"), opened)
+                    if opening is None:
+                        pieces.append(_escape(raw))
+                    else:
+                        self._open(key, tag, opening, raw)
+            else:
+                marker = match.group("marker")
+                before = line[match.start() - 1] if match.start() else " "
+                after = line[match.end()] if match.end() < len(line) else " "
+                # Подчеркивание внутри слова (snake_case) не считается разметкой
+                intraword = marker[0] == "_" and (before.isalnum() or after.isalnum())
+
+                if not before.isspace() and not (intraword and after.isalnum()) and self._close(marker):
+                    continue
+                if not after.isspace() and not (intraword and before.isalnum()):
+                    self._open(marker, _MARKERS[marker], f"<{_MARKERS[marker]}>", raw)
+                else:
+                    pieces.append(_escape(raw))
+
+        pieces.append(_escape(line[position:]))
+
+        # Маркеры Markdown не переходят на следующую строку
+        for _, _, index, source in self.stack:
+            if not source.startswith("<"):
+                self._as_text(index, source)
+        self.stack = [entry for entry in self.stack if entry[3].startswith("<")]
+
+    def finish(self) -> str:
+        """Превращает незакрытые теги в текст и возвращает результат"""
+        for _, _, index, source in self.stack:
+            self._as_text(index, source)
+        self.stack.clear()
+        return "".join(self.pieces)
+
+
+def _convert_inline(line: str, links: bool = True) -> str:
+    """Размечает одну строку; незакрытые маркеры и теги остаются текстом"""
+    converter = _InlineConverter(links=links, blocks=False)
+    converter.feed(line)
+    return converter.finish()
+
+
+def to_telegram_html(text: str) -> str:
+    """Переводит ответ модели в HTML, который Telegram гарантированно примет.
+
+    Markdown (жирный, курсив, зачеркивание, спойлер, код, ссылки,
+    заголовки, цитаты, списки) превращается в разрешенные теги, уже
+    размеченный HTML из их числа сохраняется, остальное экранируется.
+    Маркеры Markdown должны закрываться в той же строке, HTML-теги могут
+    охватывать несколько строк; внутри открытого тега блочная разметка
+    Markdown не распознается.
+    """
+    inline = _InlineConverter()
+    output = inline.pieces
+    # Строки цитаты: исходная и размеченная
+    quote: List[Tuple[str, str]] = []
+    code: Optional[List[str]] = None
+    language = ""
+
+    def new_line():
+        if output:
+            output.append("\n")
+
+    def flush_quote():
+        if not quote:
+            return
+        new_line()
+        if any(converted.strip() for _, converted in quote):
+            lines = "\n".join(converted for _, converted in quote)
+            output.append(f"<blockquote>{lines}</blockquote>")
+        else:
+            output.append("\n".join(_escape(raw) for raw, _ in quote))
+        quote.clear()
+
+    def flush_code():
+        new_line()
+        attribute = f' class="language-{language}"' if language else ""
+        body = _escape("\n".join(code))
+        output.append(f"<pre><code{attribute}>{body}</code></pre>")
+
+    for line in text.split("\n"):
+        if code is not None:
+            fence = _CODE_FENCE.match(line)
+            if fence and not fence.group(1):
+                flush_code()
+                code = None
+            else:
+                code.append(line)
+            continue
+
+        # Строка внутри HTML-тега, открытого выше, - продолжение его текста
+        if inline.has_open_tags:
+            new_line()
+            inline.feed(line)
+            continue
+
+        fence = _CODE_FENCE.match(line)
+        if fence:
+            flush_quote()
+            code, language = [], html.escape(fence.group(1), quote=True)
+            continue
+
+        quoted = _QUOTE.match(line)
+        if quoted:
+            quote.append((line, _convert_inline(quoted.group(1))))
+            continue
+        flush_quote()
+
+        new_line()
+        header = _HEADER.match(line)
+        bullet = _BULLET.match(line)
+        if header:
+            output.append(f"<b>{_convert_inline(header.group(1))}</b>")
+        elif _RULE.match(line):
+            output.append("———")
+        elif bullet:
+            output.append(f"{bullet.group(1)}• ")
+            inline.feed(bullet.group(2))
+        else:
+            inline.feed(line)
+
+    flush_quote()
+    if code is not None:
+        flush_code()
+
+    return inline.finish()
@@ -0,0 +1,118 @@
+import asyncio
+import logging
+import signal
+from typing import Any, Dict
+from aiohttp import web
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from config import (
+    WEBHOOK_URL,
+    WEBHOOK_PATH,
+    WEBHOOK_SECRET,
+    WEBHOOK_HOST,
+    WEBHOOK_PORT,
+    WEBHOOK_MAX_CONNECTIONS,
+    WEBHOOK_MAX_WORKERS,
+    WEBHOOK_KEEPALIVE,
+    WEBHOOK_DRAIN_TIMEOUT,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class DrainingRequestHandler(SimpleRequestHandler):
+    """Обрабатывает обновления в фоне, но не более max_workers одновременно.
+
+    Пока все обработчики заняты, ответ Telegram задерживается, и он сам
+    снижает темп доставки. При остановке новые обновления отклоняются с
+    кодом 503 (Telegram доставит их повторно), а текущие дорабатывают.
+    """
+
+    def __init__(
+        self,
+        dispatcher: Dispatcher,
+        bot: Bot,
+        max_workers: int,
+        drain_timeout: float,
+        **kwargs: Any,
+    ):
+        super().__init__(dispatcher, bot, handle_in_background=True, **kwargs)
+        self._workers = asyncio.Semaphore(max_workers)
+        self._drain_timeout = drain_timeout
+        self._closing = False
+
+    async def _handle_request_background(
+        self, bot: Bot, request: web.Request
+    ) -> web.Response:
+        if self._closing:
+            return web.Response(status=503)
+
+        update: Dict[str, Any] = await request.json(loads=bot.session.json_loads)
+        await self._workers.acquire()
+
+        task = asyncio.create_task(self._background_feed_update(bot=bot, update=update))
+        self._background_feed_update_tasks.add(task)
+        task.add_done_callback(self._on_update_done)
+        return web.json_response({}, dumps=bot.session.json_dumps)
+
+    def _on_update_done(self, task: asyncio.Task):
+        self._background_feed_update_tasks.discard(task)
+        self._workers.release()
+
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Ошибка обработки обновления: {task.exception()}")
+
+    async def close(self):
+        """Дожидается обработки принятых обновлений (сессию бота закрывает bot.py)"""
+        self._closing = True
+        tasks = set(self._background_feed_update_tasks)
+        if not tasks:
+            return
+
+        logger.info(f"Ожидание завершения {len(tasks)} обработчиков...")
+        _, pending = await asyncio.wait(tasks, timeout=self._drain_timeout)
+        for task in pending:
+            task.cancel()
+
+        if pending:
+            logger.warning(f"Прервано обработчиков по таймауту: {len(pending)}")
+
+
+async def run_webhook(bot: Bot, dp: Dispatcher):
+    """Запускает aiohttp-сервер для webhook и работает до SIGINT/SIGTERM"""
+
+    app = web.Application()
+    DrainingRequestHandler(
+        dp,
+        bot,
+        max_workers=WEBHOOK_MAX_WORKERS,
+        drain_timeout=WEBHOOK_DRAIN_TIMEOUT,
+        secret_token=WEBHOOK_SECRET,
+    ).register(app, path=WEBHOOK_PATH)
+    setup_application(app, dp, bot=bot)
+
+    runner = web.AppRunner(app, keepalive_timeout=WEBHOOK_KEEPALIVE)
+    await runner.setup()
+    site = web.TCPSite(runner, WEBHOOK_HOST, WEBHOOK_PORT)
+    await site.start()
+
+    # Обновления, накопившиеся за время перезапуска, не сбрасываются
+    await bot.set_webhook(
+        f"{WEBHOOK_URL.rstrip('/')}{WEBHOOK_PATH}",
+        secret_token=WEBHOOK_SECRET,
+        max_connections=WEBHOOK_MAX_CONNECTIONS,
+        allowed_updates=dp.resolve_used_update_types(),
+        drop_pending_updates=False,
+    )
+    logger.info(f"Webhook слушает {WEBHOOK_HOST}:{WEBHOOK_PORT}{WEBHOOK_PATH}")
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    try:
+        await stop.wait()
+    finally:
+        logger.info("Остановка webhook-сервера...")
+        await runner.cleanup()